@@ -0,0 +1,462 @@
+"""
+Benchmarks for the analysis hot paths.
+
+Generates synthetic review corpora shaped like bank_reviews_clean.csv
+(short, skewed review lengths, mostly 5-star ratings, ~20% stock phrases
+such as "good app") at 1K / 100K / 1M rows. It times each hot path and a
+small end-to-end run, then saves the results with environment metadata
+under benchmarks/.
+
+    python benchmark.py --sizes 1k 100k
+    python benchmark.py --sizes 1k --save-baseline
+    python benchmark.py --sizes 1k --compare benchmarks/baseline.json --threshold 0.2
+
+Runs offline. By default TextBlob, DistilBERT and spaCy are replaced with
+deterministic stubs (--models stub), so the numbers cover the code around
+the models: batching, caching, regexes, pandas and SQLite. --models local
+uses the real libraries with Hugging Face offline mode on, so the model must
+already be in the local cache. Model-bound benchmarks are capped to a row
+budget (MAX_ROWS) and report rows/sec.
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import types
+import uuid
+from contextlib import redirect_stdout
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+RESULTS_DIR = 'benchmarks'
+DEFAULT_BASELINE = os.path.join(RESULTS_DIR, 'baseline.json')
+SIZES = {'1k': 1_000, '100k': 100_000, '1m': 1_000_000}
+
+# Row budget for benchmarks that call a model once per review
+MAX_ROWS = {
+    'get_sentiment': 100_000,
+    'analyze_sentiment': 2_000,
+    'analyze_sentiment_batch': 20_000,
+    'extract_keywords': 20_000,
+    'assign_theme': 100_000,
+}
+
+BANKS = ['CBE', 'BOA', 'DASHEN']
+RATINGS = [1, 2, 3, 4, 5]
+RATING_WEIGHTS = [0.146, 0.032, 0.062, 0.092, 0.668]
+
+STOCK_PHRASES = ['good', 'nice app', 'thank you', 'very good', 'best app', 'ok',
+                 'excellent', 'not working', 'wow', 'good app']
+WORDS = ('app bank mobile banking the is it to and i not my a for this very it\'s '
+         'but with when can use time always update please fix need so service '
+         'good great nice best easy fast bad worst slow poor useless amazing '
+         'login password account access transfer transaction payment money send '
+         'crash freeze loading lag error bug support help contact response '
+         'interface design button navigation security safe feature option').split()
+
+def generate_reviews(n, seed=0):
+    """Synthetic clean reviews with the columns and rough shape of bank_reviews_clean.csv"""
+    rng = np.random.default_rng(seed)
+    lengths = np.clip(rng.lognormal(1.2, 1.1, n).astype(int), 1, 120)
+    words = np.array(WORDS, dtype=object)
+
+    texts = []
+    stock = rng.random(n) < 0.2
+    phrase_ids = rng.integers(0, len(STOCK_PHRASES), n)
+    for i in range(n):
+        if stock[i]:
+            texts.append(STOCK_PHRASES[phrase_ids[i]])
+        else:
+            texts.append(' '.join(words[rng.integers(0, len(words), lengths[i])]))
+
+    start = np.datetime64('2023-04-01')
+    days = rng.integers(0, 970, n)
+    rng_ids = np.random.default_rng(seed + 1)
+    return pd.DataFrame({
+        'review_id': [str(uuid.UUID(bytes=rng_ids.bytes(16), version=4)) for _ in range(n)],
+        'review_text': texts,
+        'rating': rng.choice(RATINGS, n, p=RATING_WEIGHTS),
+        'date': pd.to_datetime(start + days).strftime('%Y-%m-%d'),
+        'bank': rng.choice(BANKS, n),
+        'source': 'Google Play',
+    })
+
+# ---------------------------------------------------------------- stub models
+
+POSITIVE = {'good', 'great', 'nice', 'best', 'easy', 'fast', 'amazing', 'excellent', 'thank', 'wow'}
+NEGATIVE = {'bad', 'worst', 'slow', 'poor', 'useless', 'not', 'crash', 'error', 'bug'}
+STOP = {'the', 'is', 'it', 'to', 'and', 'i', 'my', 'a', 'for', 'this', 'very', 'but', 'with',
+        'when', 'can', 'so', 'not'}
+
+def _polarity(text):
+    tokens = str(text).lower().split()
+    score = sum((t in POSITIVE) - (t in NEGATIVE) for t in tokens)
+    return max(-1.0, min(1.0, score / max(len(tokens), 1) * 2))
+
+class _StubTokenizer:
+    """Whitespace "tokens" standing in for word pieces"""
+
+    model_max_length = 512
+
+    def __call__(self, texts, add_special_tokens=True, truncation=False, **kwargs):
+        ids = [str(t).split() for t in texts]
+        if truncation:
+            ids = [tokens[:510] for tokens in ids]
+        if add_special_tokens:
+            ids = [['[CLS]'] + tokens + ['[SEP]'] for tokens in ids]
+        return {'input_ids': ids}
+
+    def decode(self, ids):
+        return ' '.join(ids)
+
+class _StubSentimentPipeline:
+    """Stands in for transformers' sentiment pipeline: same call shapes, lexicon scores"""
+
+    tokenizer = _StubTokenizer()
+    model = types.SimpleNamespace(config=types.SimpleNamespace(_commit_hash='stub'))
+
+    def _score(self, text):
+        polarity = _polarity(text)
+        label = 'POSITIVE' if polarity >= 0 else 'NEGATIVE'
+        return {'label': label, 'score': 0.5 + abs(polarity) / 2}
+
+    def __call__(self, inputs, batch_size=1, truncation=True, **kwargs):
+        if isinstance(inputs, str):
+            return [self._score(inputs)]
+        return (self._score(text) for text in inputs)
+
+class _StubToken:
+    __slots__ = ('text', 'lemma_', 'is_stop', 'is_punct', 'is_alpha')
+
+    def __init__(self, text):
+        self.text = text
+        self.lemma_ = text[:-1] if text.endswith('s') and len(text) > 3 else text
+        self.is_stop = text in STOP
+        self.is_punct = not any(c.isalnum() for c in text)
+        self.is_alpha = text.isalpha()
+
+class _StubNLP:
+    pipe_names = ['tok2vec', 'tagger', 'attribute_ruler', 'lemmatizer']
+
+    def __call__(self, text):
+        return [_StubToken(t) for t in text.split()]
+
+    def pipe(self, texts, batch_size=256, n_process=1):
+        return (self(text) for text in texts)
+
+class _StubBlob:
+    def __init__(self, text):
+        self.sentiment = types.SimpleNamespace(polarity=_polarity(text))
+
+def install_stub_models():
+    """Register stub transformers / torch / spacy / textblob modules before anything imports them"""
+    transformers = types.ModuleType('transformers')
+    transformers.__version__ = 'stub'
+    transformers.pipeline = lambda task, model=None, **kwargs: _StubSentimentPipeline()
+    torch = types.ModuleType('torch')
+    torch.__version__ = 'stub'
+    torch.set_num_threads = lambda n: None
+    spacy = types.ModuleType('spacy')
+    spacy.__version__ = 'stub'
+    spacy.load = lambda model, exclude=None, **kwargs: _StubNLP()
+    textblob = types.ModuleType('textblob')
+    textblob.__version__ = 'stub'
+    textblob.TextBlob = _StubBlob
+    sys.modules.update({'transformers': transformers, 'torch': torch,
+                        'spacy': spacy, 'textblob': textblob})
+
+# ---------------------------------------------------------------- benchmarks
+# Each benchmark does its own untimed setup and returns (rows, seconds) for one timed run
+
+def _timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+def _capped(df, name):
+    return df.head(MAX_ROWS.get(name, len(df)))
+
+def bench_get_sentiment(df):
+    from complete_sentiment import get_sentiment
+
+    texts = _capped(df, 'get_sentiment')['review_text'].tolist()
+    return len(texts), _timed(lambda: [get_sentiment(t) for t in texts])
+
+def bench_analyze_sentiment(df):
+    from sentiment_models import analyze_sentiment
+
+    texts = _capped(df, 'analyze_sentiment')['review_text'].tolist()
+    return len(texts), _timed(lambda: [analyze_sentiment(t) for t in texts])
+
+def bench_analyze_sentiment_batch(df):
+    from sentiment_models import analyze_sentiment_batch
+
+    texts = _capped(df, 'analyze_sentiment_batch')['review_text'].tolist()
+    return len(texts), _timed(lambda: analyze_sentiment_batch(texts))
+
+def bench_assign_theme(df):
+    from sentiment_analysis import assign_theme
+
+    texts = _capped(df, 'assign_theme')['review_text'].tolist()
+    return len(texts), _timed(lambda: [assign_theme(t) for t in texts])
+
+def bench_theme_tag(df):
+    from sentiment_analysis import theme_matcher
+
+    return len(df), _timed(lambda: theme_matcher.tag(df['review_text']))
+
+def bench_extract_keywords(df):
+    from sentiment_models import extract_keywords
+
+    texts = _capped(df, 'extract_keywords')['review_text'].tolist()
+    return len(texts), _timed(lambda: [extract_keywords(t) for t in texts])
+
+def bench_startup(df):
+    """`sentiment_analysis.py --help` in a fresh interpreter: imports only, no model load"""
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sentiment_analysis.py')
+    return 1, _timed(lambda: subprocess.run([sys.executable, script, '--help'],
+                                            capture_output=True, check=True))
+
+def bench_preprocess_reviews(df):
+    from pipeline_storage import write_stage
+    from preprocess import preprocess_reviews
+
+    write_stage('raw', df)
+    return len(df), _timed(preprocess_reviews)
+
+def _fresh_database():
+    from database_sqlite import create_database, insert_banks_data
+    from review_repository import close_all
+
+    # Drop pooled connections to the file before deleting it
+    close_all()
+    for path in ['bank_reviews.db', 'bank_reviews.db-wal', 'bank_reviews.db-shm']:
+        if os.path.exists(path):
+            os.remove(path)
+    repo = create_database()
+    with repo.connection() as conn:
+        bank_id_map = insert_banks_data(conn)
+    return repo, bank_id_map
+
+def _analyzed(df):
+    scored = df.copy()
+    polarity = scored['review_text'].map(_polarity)
+    scored['sentiment_label'] = np.where(polarity >= 0, 'POSITIVE', 'NEGATIVE')
+    scored['sentiment_score'] = 0.5 + polarity.abs() / 2
+    scored['themes'] = 'Other'
+    return scored
+
+def bench_insert_reviews_data(df):
+    from pipeline_storage import write_stage
+    from database_sqlite import insert_reviews_data
+
+    scored = _analyzed(df)
+    write_stage('clean', df)
+    write_stage('sample', scored, ['sentiment_label', 'sentiment_score'])
+    write_stage('themes', scored, ['themes'])
+    repo, bank_id_map = _fresh_database()
+    with repo.connection() as conn:
+        seconds = _timed(lambda: insert_reviews_data(conn, bank_id_map))
+    repo.close()
+    return len(df), seconds
+
+def bench_update_database(df):
+    from review_repository import SQLiteRepository
+
+    scored = _analyzed(df)
+    _fresh_database()[0].close()
+    repo = SQLiteRepository('bank_reviews.db')
+    # Insert everything, then re-sync with a tenth of the rows re-scored
+    seconds = _timed(lambda: repo.write_reviews(scored))
+    changed = scored.copy()
+    step = max(len(changed) // 10, 1)
+    changed.loc[::step, 'sentiment_score'] = changed['sentiment_score'][::step] / 2
+    seconds += _timed(lambda: repo.write_reviews(changed))
+    repo.close()
+    return 2 * len(df), seconds
+
+def bench_end_to_end(df):
+    """Raw -> clean -> TextBlob sentiment + themes -> complete -> SQLite sync"""
+    from pipeline_storage import write_stage, read_stage
+    from preprocess import preprocess_reviews
+    from complete_sentiment import score_chunk, theme_matcher
+    from review_repository import SQLiteRepository
+
+    write_stage('raw', df)
+    _fresh_database()[0].close()
+
+    def run():
+        preprocess_reviews()
+        clean = read_stage('clean')
+        clean['sentiment_label'], clean['sentiment_score'] = score_chunk(clean['review_text'].tolist())
+        clean['themes'] = theme_matcher.tag(clean['review_text'])
+        write_stage('complete', clean, ['sentiment_label', 'sentiment_score', 'themes'])
+        repo = SQLiteRepository('bank_reviews.db')
+        repo.write_reviews(read_stage('complete'))
+        repo.close()
+
+    return len(df), _timed(run)
+
+BENCHMARKS = {
+    'get_sentiment': bench_get_sentiment,
+    'analyze_sentiment': bench_analyze_sentiment,
+    'analyze_sentiment_batch': bench_analyze_sentiment_batch,
+    'assign_theme': bench_assign_theme,
+    'theme_tag': bench_theme_tag,
+    'extract_keywords': bench_extract_keywords,
+    'startup': bench_startup,
+    'preprocess_reviews': bench_preprocess_reviews,
+    'insert_reviews_data': bench_insert_reviews_data,
+    'update_database': bench_update_database,
+    'end_to_end': bench_end_to_end,
+}
+
+# ---------------------------------------------------------------- harness
+
+def package_version(name):
+    module = sys.modules.get(name)
+    if module is None:
+        try:
+            module = __import__(name)
+        except ImportError:
+            return None
+    return getattr(module, '__version__', None)
+
+def environment(models):
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'git_commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'sqlite': sqlite3.sqlite_version,
+        'models': models,
+        'storage': os.environ.get('BANK_REVIEWS_STORAGE', 'csv'),
+        'packages': {name: package_version(name)
+                     for name in ['numpy', 'pandas', 'transformers', 'torch', 'spacy', 'textblob']},
+    }
+
+def parse_size(text):
+    text = text.lower()
+    return SIZES[text] if text in SIZES else int(text)
+
+def run_benchmarks(sizes, names, repeat=3, seed=0):
+    """Run each benchmark repeat times per size in a scratch directory; median timings"""
+    results = {}
+    workdir = tempfile.mkdtemp(prefix='bank_reviews_bench_')
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        for size in sizes:
+            print(f"\n📏 {size:,} rows")
+            df = generate_reviews(size, seed)
+            results[str(size)] = {}
+            for name in names:
+                runs = []
+                for _ in range(repeat if size <= 100_000 else 1):
+                    # The scripts' progress output would otherwise be timed too
+                    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+                        rows, seconds = BENCHMARKS[name](df)
+                    runs.append(seconds)
+                median = statistics.median(runs)
+                results[str(size)][name] = {
+                    'rows': rows,
+                    'seconds': round(median, 6),
+                    'best_seconds': round(min(runs), 6),
+                    'runs': len(runs),
+                    'rows_per_s': round(rows / median, 1) if median > 0 else None,
+                    'best_rows_per_s': round(rows / min(runs), 1) if min(runs) > 0 else None,
+                }
+                print(f"  {name:<24} {median:>9.4f}s  {rows / median if median else 0:>12,.0f} rows/s  ({rows:,} rows)")
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+def compare(current, baseline, threshold):
+    """Benchmarks whose best-run throughput fell by more than threshold relative to the baseline.
+
+    Best runs are compared rather than medians: they are the least disturbed
+    by whatever else the machine was doing.
+    """
+    regressions = []
+    print(f"\n📉 Compared with baseline from {baseline['environment'].get('timestamp')} "
+          f"(commit {str(baseline['environment'].get('git_commit'))[:8]}):")
+    for size, benches in current['results'].items():
+        for name, result in benches.items():
+            base = baseline['results'].get(size, {}).get(name)
+            if not base or not base.get('best_rows_per_s') or not result.get('best_rows_per_s'):
+                continue
+            ratio = result['best_rows_per_s'] / base['best_rows_per_s']
+            flag = '❌' if ratio < 1 - threshold else '✅'
+            print(f"  {flag} {int(size):>9,} {name:<24} {ratio:>6.2f}x baseline throughput")
+            if ratio < 1 - threshold:
+                regressions.append((size, name, ratio))
+    if current['environment']['models'] != baseline['environment'].get('models'):
+        print("  ⚠️ Baseline was recorded with a different model mode")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the review analysis hot paths")
+    parser.add_argument('--sizes', nargs='+', default=['1k', '100k'],
+                        help="Corpus sizes: 1k, 100k, 1m or a row count")
+    parser.add_argument('--bench', nargs='+', choices=list(BENCHMARKS), default=list(BENCHMARKS),
+                        help="Benchmarks to run (default: all)")
+    parser.add_argument('--models', choices=['stub', 'local'], default='stub',
+                        help="stub: deterministic stand-ins; local: real models from the local cache")
+    parser.add_argument('--repeat', type=int, default=3, help="Timed runs per benchmark (1 above 100K rows)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--save-baseline', action='store_true', help=f"Also save as {DEFAULT_BASELINE}")
+    parser.add_argument('--compare', metavar='BASELINE', help="Baseline results file to compare against")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="Allowed throughput drop before a benchmark counts as a regression")
+    args = parser.parse_args()
+
+    # Nothing may reach the network, and benchmark runs stay out of the pipeline metrics
+    os.environ['HF_HUB_OFFLINE'] = '1'
+    os.environ['TRANSFORMERS_OFFLINE'] = '1'
+    os.environ['BANK_REVIEWS_METRICS'] = 'off'
+    if args.models == 'stub':
+        install_stub_models()
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    sizes = [parse_size(s) for s in args.sizes]
+    report = {'environment': environment(args.models),
+              'results': run_benchmarks(sizes, args.bench, args.repeat, args.seed)}
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    output = os.path.join(RESULTS_DIR, f"results-{datetime.now():%Y%m%d-%H%M%S}.json")
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n✅ Results saved to: {output}")
+    if args.save_baseline:
+        shutil.copyfile(output, DEFAULT_BASELINE)
+        print(f"✅ Baseline saved to: {DEFAULT_BASELINE}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"\n❌ {len(regressions)} benchmark(s) regressed by more than {args.threshold:.0%}")
+            sys.exit(1)
+        print(f"\n✅ No regressions beyond {args.threshold:.0%}")
+
+if __name__ == "__main__":
+    main()
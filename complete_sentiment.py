@@ -1,19 +1,23 @@
-import pandas as pd
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
-from textblob import TextBlob
-
-print("Adding sentiment to ALL 1200 reviews...")
-
-# Load all 1200 reviews
-df = pd.read_csv('bank_reviews_clean.csv')
-print(f"Loaded {len(df)} reviews")
+from sentiment_cache import SentimentCache, cached_scores
+from theme_matcher import ThemeMatcher
+from theme_keywords import REPORT_THEME_KEYWORDS
+from pipeline_storage import read_stage, write_stage, stage_path
+from near_duplicates import score_per_cluster
+from instrumentation import measure, record_rows
 
 # Fast sentiment using TextBlob (good enough for requirements)
 def get_sentiment(text):
+    # Imported here so --help and --assemble don't pay for loading TextBlob/NLTK
+    from textblob import TextBlob
+
     analysis = TextBlob(str(text))
     # TextBlob gives polarity from -1 to 1
     polarity = analysis.sentiment.polarity
-    
+
     if polarity > 0.1:
         return 'POSITIVE', 0.5 + polarity/2
     elif polarity < -0.1:
@@ -21,51 +25,141 @@ def get_sentiment(text):
     else:
         return 'NEUTRAL', 0.5
 
-print("Analyzing sentiment (this takes 2-3 minutes)...")
-results = []
-for i, row in df.iterrows():
-    if i % 100 == 0:
-        print(f"  Processed {i}/{len(df)}...")
-    label, score = get_sentiment(row['review_text'])
-    results.append({'sentiment_label': label, 'sentiment_score': score})
-
-# Add to dataframe
-df['sentiment_label'] = [r['sentiment_label'] for r in results]
-df['sentiment_score'] = [r['sentiment_score'] for r in results]
-
-# Assign themes
-print("Assigning themes...")
-theme_keywords = {
-    'Login Issues': ['login', 'password', 'authenticate', 'access', 'account'],
-    'Transaction Problems': ['transfer', 'transaction', 'payment', 'send', 'money'],
-    'App Performance': ['slow', 'crash', 'freeze', 'lag', 'loading'],
-    'User Interface': ['interface', 'design', 'layout', 'button', 'navigation'],
-    'Customer Support': ['support', 'help', 'service', 'contact', 'response'],
-}
+def score_texts(texts):
+    labels, scores = [], []
+    for i, text in enumerate(texts):
+        if i % 100 == 0:
+            print(f"  Processed {i}/{len(texts)}...")
+        label, score = get_sentiment(text)
+        labels.append(label)
+        scores.append(score)
+    return labels, scores
+
+def score_chunk(texts):
+    """Worker entry point: score one chunk without progress output"""
+    results = [get_sentiment(text) for text in texts]
+    return [label for label, _ in results], [score for _, score in results]
+
+def score_texts_parallel(texts, workers):
+    """Score texts across a process pool, keeping the input order"""
+    texts = list(texts)
+    if workers <= 1 or len(texts) < 2:
+        return score_texts(texts)
+
+    # A few chunks per worker keeps the pool busy when chunk costs differ
+    chunks = np.array_split(np.array(texts, dtype=object), workers * 4)
+    chunks = [chunk.tolist() for chunk in chunks if len(chunk)]
+    print(f"  Scoring {len(texts)} texts in {len(chunks)} chunks on {workers} workers...")
+
+    # Executor.map yields chunk results in submission order, so the output
+    # is identical to the serial run
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(score_chunk, chunks))
+
+    labels = np.concatenate([np.array(chunk_labels, dtype=object) for chunk_labels, _ in results])
+    scores = np.concatenate([np.array(chunk_scores, dtype=float) for _, chunk_scores in results])
+    return labels, scores
+
+theme_keywords = REPORT_THEME_KEYWORDS
+
+theme_matcher = ThemeMatcher(theme_keywords)
 
 def assign_theme(text):
-    text_lower = str(text).lower()
-    themes = []
-    for theme, keywords in theme_keywords.items():
-        if any(keyword in text_lower for keyword in keywords):
-            themes.append(theme)
-    return ', '.join(themes) if themes else 'Other'
+    return theme_matcher.assign(text)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="TextBlob sentiment and themes for all reviews")
+    parser.add_argument('--workers', type=int, default=1,
+                        help=f"Scoring processes (1 = serial, 0 = all {os.cpu_count()} cores)")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="Re-score every review instead of reusing cached results")
+    parser.add_argument('--per-cluster', action='store_true',
+                        help="Score one review per near-duplicate cluster (needs preprocess.py --near-duplicates)")
+    parser.add_argument('--sentiment-only', action='store_true',
+                        help=f"Only score sentiment, saved to {stage_path('textblob')}")
+    parser.add_argument('--assemble', action='store_true',
+                        help="Join saved sentiment and report themes (tag_themes.py) into the complete dataset")
+    return parser.parse_args()
+
+def assemble_complete():
+    """Build the complete dataset from the textblob and report_themes stages"""
+    df = read_stage('textblob', columns=['review_id', 'sentiment_label', 'sentiment_score'])
+    themes = read_stage('report_themes', columns=['review_id', 'themes'])
+    df = df.merge(themes, on='review_id', how='left')
+    record_rows(rows_in=len(df), rows_out=len(df))
+    return write_stage('complete', df, ['sentiment_label', 'sentiment_score', 'themes'])
+
+def analyze(args, workers):
+    print("Adding sentiment to ALL 1200 reviews...")
+
+    # Load all 1200 reviews
+    columns = ['review_id', 'review_text'] + (['cluster_id'] if args.per_cluster else [])
+    df = read_stage('clean', columns=columns)
+    print(f"Loaded {len(df)} reviews")
+    record_rows(rows_in=len(df), rows_out=len(df))
+
+    def score_rows(texts):
+        return score_texts_parallel(texts, workers)
+
+    def score(texts):
+        if args.no_cache:
+            return score_rows(texts)
+        import textblob
+
+        # Bump the suffix whenever get_sentiment's thresholds change
+        cache = SentimentCache('textblob', f"{textblob.__version__}-v1")
+        results = cached_scores(cache, texts, score_rows)
+        cache.close()
+        return results
+
+    print("Analyzing sentiment (only new or edited text is scored)...")
+    with measure('score', rows_in=len(df), rows_out=len(df)):
+        if args.per_cluster:
+            labels, scores = score_per_cluster(df['review_text'], df['cluster_id'], score)
+        else:
+            labels, scores = score(df['review_text'])
+
+    # Add to dataframe
+    df['sentiment_label'] = labels
+    df['sentiment_score'] = scores
+
+    if args.sentiment_only:
+        output_file = write_stage('textblob', df, ['sentiment_label', 'sentiment_score'])
+        print(f"\n✅ Sentiment for {len(df)} reviews saved to: {output_file}")
+        return
+
+    # Assign themes
+    print("Assigning themes...")
+    with measure('themes', rows_in=len(df), rows_out=len(df)):
+        df['themes'] = theme_matcher.tag(df['review_text'])
+
+    # Save complete analyzed data
+    output_file = write_stage('complete', df, ['sentiment_label', 'sentiment_score', 'themes'])
+
+    print(f"\n✅ COMPLETED: All {len(df)} reviews analyzed!")
+    print(f"✅ Saved to: {output_file}")
+
+    # Show statistics
+    print(f"\n📊 SENTIMENT DISTRIBUTION:")
+    print(df['sentiment_label'].value_counts())
 
-df['themes'] = df['review_text'].apply(assign_theme)
+    print(f"\n🎯 THEMES DISTRIBUTION:")
+    print(df['themes'].value_counts().head(10))
 
-# Save complete analyzed data
-output_file = 'bank_reviews_completely_analyzed.csv'
-df.to_csv(output_file, index=False)
+    coverage = (df['sentiment_label'] != 'NEUTRAL').mean() * 100
+    print(f"\n📈 COVERAGE: {coverage:.1f}% of reviews have sentiment (meets 90%+ requirement!)")
 
-print(f"\n✅ COMPLETED: All {len(df)} reviews analyzed!")
-print(f"✅ Saved to: {output_file}")
+def main():
+    args = parse_args()
+    workers = args.workers or os.cpu_count()
 
-# Show statistics
-print(f"\n📊 SENTIMENT DISTRIBUTION:")
-print(df['sentiment_label'].value_counts())
+    if args.assemble:
+        with measure('assemble'):
+            print(f"✅ Complete dataset assembled: {assemble_complete()}")
+        return
 
-print(f"\n🎯 THEMES DISTRIBUTION:")
-print(df['themes'].value_counts().head(10))
+    with measure('textblob', workers=workers):
+        analyze(args, workers)
 
-coverage = (df['sentiment_label'] != 'NEUTRAL').mean() * 100
-print(f"\n📈 COVERAGE: {coverage:.1f}% of reviews have sentiment (meets 90%+ requirement!)")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
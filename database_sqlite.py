@@ -3,61 +3,101 @@ Task 3: Database Implementation for Bank Reviews Analysis
 Using SQLite for persistent data storage
 """
 
-import sqlite3
+import argparse
 import pandas as pd
+from pipeline_storage import read_stage
+from review_repository import (get_repository, create_theme_tables, sync_review_themes,
+                               create_search_index)
+from instrumentation import measure, record_rows
 from datetime import datetime
 
-def create_database():
-    """Create SQLite database with proper schema"""
+DB_PATH = 'bank_reviews.db'
+
+def create_database(path=DB_PATH):
+    """Create SQLite database with proper schema; returns its repository"""
     print("=" * 50)
     print("TASK 3: DATABASE IMPLEMENTATION")
     print("=" * 50)
     
-    # Connect to SQLite database (creates if doesn't exist)
-    conn = sqlite3.connect('bank_reviews.db')
-    cursor = conn.cursor()
-    
-    print("✅ Connected to SQLite database: bank_reviews.db")
-    
-    # Create banks table
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS banks (
-        bank_id INTEGER PRIMARY KEY AUTOINCREMENT,
-        bank_name TEXT NOT NULL,
-        app_name TEXT NOT NULL,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )
-    ''')
+    # Opens (and creates) the database through the shared storage layer
+    repo = get_repository(f'sqlite:///{path}')
+    repo.ensure_schema()
     
-    # Create reviews table
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS reviews (
-        review_id TEXT PRIMARY KEY,
-        bank_id INTEGER,
-        review_text TEXT NOT NULL,
-        rating INTEGER CHECK (rating >= 1 AND rating <= 5),
-        review_date DATE NOT NULL,
-        sentiment_label TEXT,
-        sentiment_score REAL,
-        themes TEXT,
-        source TEXT DEFAULT 'Google Play',
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (bank_id) REFERENCES banks (bank_id)
-    )
-    ''')
-    
-    # Create indexes for better query performance
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_bank_id ON reviews(bank_id)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_rating ON reviews(rating)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_sentiment ON reviews(sentiment_label)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_date ON reviews(review_date)')
-    
-    conn.commit()
+    print(f"✅ Connected to SQLite database: {path}")
     print("✅ Database tables created successfully")
     print("   - banks (bank information)")
     print("   - reviews (user reviews with sentiment analysis)")
+    print("   - themes / review_themes (one row per review and theme)")
+    print("   - reviews_fts (full-text search over review_text)")
+    print("   - review_rollup / theme_rollup (aggregates for the report queries)")
+    
+    return repo
+
+def migrate_themes_column(conn):
+    """Backfill review_themes from the legacy comma-joined reviews.themes column"""
+    create_theme_tables(conn)
+    rows = conn.execute('SELECT review_id, themes FROM reviews').fetchall()
+    linked = sync_review_themes(conn, [r[0] for r in rows], [r[1] for r in rows])
+    conn.commit()
+    print(f"✅ Migrated themes for {len(rows)} reviews ({linked} review-theme links)")
+    return linked
+
+def fts_query(text):
+    """Quote each word so user input like 'transfer-failed' can't break FTS5 syntax.
+
+    A trailing * stays outside the quotes, so 'transf*' is still a prefix query.
+    """
+    terms = []
+    for word in str(text).split():
+        prefix = word.endswith('*')
+        word = word.replace('"', '').rstrip('*')
+        if word:
+            terms.append(f'"{word}"*' if prefix else f'"{word}"')
+    return ' '.join(terms)
+
+def search_reviews(conn, query, bank=None, min_rating=None, max_rating=None,
+                   sentiment=None, date_from=None, date_to=None, limit=20, raw=False):
+    """Full-text search over reviews, ranked by BM25 with highlighted snippets.
+    
+    Every word must match (end a word with * for a prefix search, or pass raw=True to use
+    FTS5 query syntax directly). Filters narrow by bank name, rating range,
+    sentiment label and review_date range (YYYY-MM-DD, inclusive).
+    """
+    conditions = ['reviews_fts MATCH ?']
+    params = [query if raw else fts_query(query)]
     
-    return conn
+    if bank is not None:
+        conditions.append('b.bank_name = ?')
+        params.append(bank)
+    if min_rating is not None:
+        conditions.append('r.rating >= ?')
+        params.append(min_rating)
+    if max_rating is not None:
+        conditions.append('r.rating <= ?')
+        params.append(max_rating)
+    if sentiment is not None:
+        conditions.append('r.sentiment_label = ?')
+        params.append(sentiment)
+    if date_from is not None:
+        conditions.append('r.review_date >= ?')
+        params.append(date_from)
+    if date_to is not None:
+        conditions.append('r.review_date <= ?')
+        params.append(date_to)
+    params.append(limit)
+    
+    sql = f'''
+    SELECT r.review_id, b.bank_name, r.rating, r.review_date, r.sentiment_label,
+           snippet(reviews_fts, 0, '[', ']', '…', 12) as snippet,
+           bm25(reviews_fts) as rank
+    FROM reviews_fts
+    JOIN reviews r ON r.rowid = reviews_fts.rowid
+    LEFT JOIN banks b ON r.bank_id = b.bank_id
+    WHERE {' AND '.join(conditions)}
+    ORDER BY rank
+    LIMIT ?
+    '''
+    return pd.read_sql_query(sql, conn, params=params)
 
 def insert_banks_data(conn):
     """Insert bank information into banks table"""
@@ -91,8 +131,9 @@ def insert_reviews_data(conn, bank_id_map):
     print("\n📊 Loading review data...")
     
     # Load analyzed data
-    df_sample = pd.read_csv('bank_reviews_analyzed_sample.csv')
-    df_themes = pd.read_csv('bank_reviews_with_themes.csv')
+    df_sample = read_stage('sample', columns=['review_id', 'review_text', 'rating', 'date', 'bank',
+                                              'sentiment_label', 'sentiment_score'])
+    df_themes = read_stage('themes', columns=['review_id', 'themes'])
     
     # Merge data
     df_combined = df_sample.merge(df_themes[['review_id', 'themes']], on='review_id', how='left')
@@ -127,6 +168,11 @@ def insert_reviews_data(conn, bank_id_map):
     conn.commit()
     
     print(f"✅ Reviews inserted: {cursor.rowcount} records")
+    
+    # Normalized per-theme rows for index lookups
+    linked = sync_review_themes(conn, df_combined['review_id'], df_combined['themes'])
+    conn.commit()
+    print(f"✅ Review themes linked: {linked} rows")
     return len(reviews_to_insert)
 
 def run_queries(conn):
@@ -135,38 +181,48 @@ def run_queries(conn):
     print("DATABASE VERIFICATION & INSIGHTS")
     print("=" * 50)
     
+    # All report queries read the trigger-maintained rollups, so their cost
+    # depends on the number of (bank, day, sentiment, rating) groups
     queries = {
-        "Total Reviews": "SELECT COUNT(*) as total_reviews FROM reviews",
+        "Total Reviews": "SELECT IFNULL(SUM(review_count), 0) as total_reviews FROM review_rollup",
         "Reviews per Bank": """
-            SELECT b.bank_name, COUNT(*) as review_count, 
-                   AVG(r.rating) as avg_rating
-            FROM reviews r 
-            JOIN banks b ON r.bank_id = b.bank_id 
+            SELECT b.bank_name, SUM(ru.review_count) as review_count, 
+                   SUM(ru.rating_sum) * 1.0 / SUM(ru.rated_count) as avg_rating
+            FROM review_rollup ru 
+            JOIN banks b ON ru.bank_id = b.bank_id 
             GROUP BY b.bank_name
             ORDER BY avg_rating DESC
         """,
         "Sentiment Distribution": """
-            SELECT sentiment_label, COUNT(*) as count,
-                   ROUND(COUNT(*) * 100.0 / (SELECT COUNT(*) FROM reviews), 2) as percentage
-            FROM reviews 
+            SELECT NULLIF(sentiment_label, '') as sentiment_label, SUM(review_count) as count,
+                   ROUND(SUM(review_count) * 100.0 / SUM(SUM(review_count)) OVER (), 2) as percentage
+            FROM review_rollup 
             GROUP BY sentiment_label
             ORDER BY count DESC
         """,
         "Most Common Themes": """
-            SELECT themes, COUNT(*) as occurrence
-            FROM reviews 
-            WHERE themes != 'Other'
-            GROUP BY themes
+            SELECT t.theme_name, SUM(tr.review_count) as occurrence
+            FROM theme_rollup tr
+            JOIN themes t ON tr.theme_id = t.theme_id
+            GROUP BY t.theme_name
             ORDER BY occurrence DESC
             LIMIT 5
         """,
+        "Themes per Bank": """
+            SELECT b.bank_name, t.theme_name, SUM(tr.review_count) as occurrence
+            FROM theme_rollup tr
+            JOIN themes t ON tr.theme_id = t.theme_id
+            JOIN banks b ON tr.bank_id = b.bank_id
+            GROUP BY b.bank_name, t.theme_name
+            ORDER BY b.bank_name, occurrence DESC
+        """,
         "Average Rating by Bank": """
             SELECT b.bank_name, 
-                   AVG(r.rating) as avg_rating,
-                   MIN(r.rating) as min_rating,
-                   MAX(r.rating) as max_rating
-            FROM reviews r 
-            JOIN banks b ON r.bank_id = b.bank_id 
+                   SUM(ru.rating_sum) * 1.0 / SUM(ru.rated_count) as avg_rating,
+                   MIN(NULLIF(ru.rating, 0)) as min_rating,
+                   MAX(NULLIF(ru.rating, 0)) as max_rating
+            FROM review_rollup ru 
+            JOIN banks b ON ru.bank_id = b.bank_id 
             GROUP BY b.bank_name
         """
     }
@@ -183,7 +239,8 @@ def export_database_schema(conn):
     cursor = conn.cursor()
     
     # Get table schema
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
+    # Skip the FTS5 shadow tables (reviews_fts_data, _idx, ...)
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'reviews\\_fts\\_%' ESCAPE '\\'")
     tables = cursor.fetchall()
     
     schema_content = "# Database Schema Documentation\n\n"
@@ -219,26 +276,29 @@ def main():
     """Main function to run database setup"""
     try:
         # Step 1: Create database and tables
-        conn = create_database()
-        
-        # Step 2: Insert banks data
-        bank_id_map = insert_banks_data(conn)
-        
-        # Step 3: Insert reviews data
-        review_count = insert_reviews_data(conn, bank_id_map)
+        repo = create_database()
         
-        if review_count == 0:
-            print("⚠️ No reviews were inserted. Check your data files.")
-            return False
-        
-        # Step 4: Run verification queries
-        run_queries(conn)
-        
-        # Step 5: Export schema
-        export_database_schema(conn)
+        with repo.connection() as conn:
+            # Step 2: Insert banks data
+            bank_id_map = insert_banks_data(conn)
+            
+            # Step 3: Insert reviews data
+            with measure('insert_reviews'):
+                review_count = insert_reviews_data(conn, bank_id_map)
+                record_rows(rows_in=review_count, rows_out=review_count)
+            
+            if review_count == 0:
+                print("⚠️ No reviews were inserted. Check your data files.")
+                return False
+            
+            # Step 4: Run verification queries
+            run_queries(conn)
+            
+            # Step 5: Export schema
+            export_database_schema(conn)
         
-        # Step 6: Close connection
-        conn.close()
+        # Step 6: Close connections
+        repo.close()
         
         print("\n" + "=" * 50)
         print("🎉 TASK 3 COMPLETED SUCCESSFULLY!")
@@ -255,7 +315,43 @@ def main():
         return False
 
 if __name__ == "__main__":
-    success = main()
+    parser = argparse.ArgumentParser(description="Build the SQLite review database")
+    parser.add_argument('--migrate-themes', metavar='DB',
+                        help="Only backfill themes/review_themes from the themes column of an existing database")
+    parser.add_argument('--search', metavar='QUERY',
+                        help="Full-text search the reviews instead of rebuilding the database")
+    parser.add_argument('--db', default=DB_PATH, help="Database to search")
+    parser.add_argument('--bank', help="Only reviews for this bank (e.g. CBE)")
+    parser.add_argument('--min-rating', type=int)
+    parser.add_argument('--max-rating', type=int)
+    parser.add_argument('--sentiment', help="POSITIVE, NEGATIVE or NEUTRAL")
+    parser.add_argument('--date-from', help="YYYY-MM-DD")
+    parser.add_argument('--date-to', help="YYYY-MM-DD")
+    parser.add_argument('--limit', type=int, default=20)
+    args = parser.parse_args()
+    
+    if args.search:
+        repo = get_repository(f'sqlite:///{args.db}')
+        with repo.connection() as conn:
+            create_search_index(conn)
+            results = search_reviews(conn, args.search, bank=args.bank,
+                                     min_rating=args.min_rating, max_rating=args.max_rating,
+                                     sentiment=args.sentiment, date_from=args.date_from,
+                                     date_to=args.date_to, limit=args.limit)
+        print(f"🔎 {len(results)} matches for '{args.search}':")
+        print(results.to_string(index=False))
+        repo.close()
+        exit(0)
+    
+    if args.migrate_themes:
+        repo = get_repository(f'sqlite:///{args.migrate_themes}')
+        with repo.connection() as conn:
+            migrate_themes_column(conn)
+        repo.close()
+        exit(0)
+    
+    with measure('build_sqlite'):
+        success = main()
     if success:
         exit(0)
     else:
@@ -1,5 +1,7 @@
+from concurrent.futures import ThreadPoolExecutor
 from google_play_scraper import search
 import pandas as pd
+from scrape_scheduler import TokenBucket, call_with_retry
 
 # Search for Ethiopian banking apps
 banks = [
@@ -8,37 +10,49 @@ banks = [
     'Dashen Bank'
 ]
 
-def find_banking_apps():
+def search_bank(bank, limiter):
+    print(f"Searching for: {bank}")
+    results = call_with_retry(
+        lambda: search(
+            bank,
+            lang='en',
+            country='et'  # Ethiopia
+        ),
+        limiter=limiter, label=f"search '{bank}'"
+    )
+
+    app_results = []
+    for result in results[:3]:  # Top 3 results
+        app_results.append({
+            'bank': bank,
+            'app_name': result['title'],
+            'app_id': result['appId'],
+            'score': result['score'],
+            'installs': result['installs']
+        })
+        print(f"  ✅ Found: {result['title']}")
+        print(f"     ID: {result['appId']}")
+        print(f"     Rating: {result['score']}")
+    return app_results
+
+def find_banking_apps(workers=3, rate=2.0):
     app_results = []
-    
-    for bank in banks:
-        print(f"Searching for: {bank}")
-        try:
-            results = search(
-                bank,
-                lang='en',
-                country='et'  # Ethiopia
-            )
-            
-            for result in results[:3]:  # Top 3 results
-                app_results.append({
-                    'bank': bank,
-                    'app_name': result['title'],
-                    'app_id': result['appId'],
-                    'score': result['score'],
-                    'installs': result['installs']
-                })
-                print(f"  ✅ Found: {result['title']}")
-                print(f"     ID: {result['appId']}")
-                print(f"     Rating: {result['score']}")
-                
-        except Exception as e:
-            print(f"Error searching for {bank}: {e}")
-    
+    limiter = TokenBucket(rate)
+
+    # Searches run concurrently under one shared rate limit
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {bank: pool.submit(search_bank, bank, limiter) for bank in banks}
+        for bank, future in futures.items():
+            try:
+                app_results.extend(future.result())
+            except Exception as e:
+                print(f"Error searching for {bank}: {e}")
+
     return pd.DataFrame(app_results)
 
-# Run search
-print("Searching for banking apps...")
-df = find_banking_apps()
-df.to_csv('app_search_results.csv', index=False)
-print("\nSearch complete! Check app_search_results.csv")
\ No newline at end of file
+if __name__ == "__main__":
+    # Run search
+    print("Searching for banking apps...")
+    df = find_banking_apps()
+    df.to_csv('app_search_results.csv', index=False)
+    print("\nSearch complete! Check app_search_results.csv")
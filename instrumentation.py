@@ -0,0 +1,277 @@
+"""
+Timing, throughput and memory measurements for pipeline stages.
+
+Wrap a stage or sub-step in measure() (or decorate a function with
+measured()) and a JSON line is appended to the metrics file when it ends:
+
+    {"stage": "sentiment/score", "wall_s": 41.2, "cpu_s": 160.3,
+     "child_cpu_s": 0.0, "peak_rss_mb": 1873.4, "rows_in": 1200, "rows_out": 1200,
+     "rows_per_s": 29.1, "status": "ok", ...}
+
+cpu_s includes child_cpu_s, the CPU of worker processes that exited
+during the measurement. Nested measurements get slash-separated names. Peak RSS is sampled by a
+background thread while a measurement is open, so every stage reports its
+own peak and not the whole process's.
+
+Environment:
+- BANK_REVIEWS_METRICS: metrics file (default pipeline_metrics.jsonl;
+  '-' writes to stderr, 'off' disables)
+- BANK_REVIEWS_PROFILE: a stage name to run under cProfile and
+  tracemalloc; the profile is saved under profiles/ and the top allocation
+  sites go into that stage's record
+- BANK_REVIEWS_RUN_ID: groups the records of one pipeline run (pipeline.py
+  sets it for every step)
+"""
+
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+METRICS_ENV = 'BANK_REVIEWS_METRICS'
+PROFILE_ENV = 'BANK_REVIEWS_PROFILE'
+RUN_ID_ENV = 'BANK_REVIEWS_RUN_ID'
+DEFAULT_METRICS_FILE = 'pipeline_metrics.jsonl'
+PROFILE_DIR = 'profiles'
+SAMPLE_INTERVAL = 0.05
+
+RUN_ID = os.environ.get(RUN_ID_ENV) or uuid.uuid4().hex[:12]
+
+_local = threading.local()
+_write_lock = threading.Lock()
+
+def current_rss_mb():
+    """Resident set size of this process in MB"""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+
+        return psutil.Process().memory_info().rss / 2**20
+    except ImportError:
+        import resource
+
+        # Lifetime peak is the best we can do without /proc or psutil
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+def children_cpu_s():
+    """CPU seconds of this process's finished child processes (0 without resource)"""
+    try:
+        import resource
+    except ImportError:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+class _RssSampler:
+    """One daemon thread raising the peak of every open measurement"""
+
+    def __init__(self):
+        self.open = set()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def add(self, measurement):
+        with self.lock:
+            self.open.add(measurement)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+
+    def remove(self, measurement):
+        with self.lock:
+            self.open.discard(measurement)
+
+    def _run(self):
+        while True:
+            time.sleep(SAMPLE_INTERVAL)
+            with self.lock:
+                active = list(self.open)
+            if active:
+                rss = current_rss_mb()
+                for measurement in active:
+                    measurement.peak_rss_mb = max(measurement.peak_rss_mb, rss)
+
+_sampler = _RssSampler()
+
+class Measurement:
+    """Numbers collected for one stage; set rows_in / rows_out / extra while it runs"""
+
+    def __init__(self, stage, rows_in=None, rows_out=None, **extra):
+        self.stage = stage
+        self.rows_in = rows_in
+        self.rows_out = rows_out
+        self.extra = extra
+        self.peak_rss_mb = 0.0
+
+    def record(self, wall, cpu, child_cpu, rss_start, status, error=None):
+        rows = self.rows_out if self.rows_out is not None else self.rows_in
+        record = {
+            'run_id': RUN_ID,
+            'stage': self.stage,
+            'started_at': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started)),
+            'wall_s': round(wall, 4),
+            'cpu_s': round(cpu + child_cpu, 4),
+            'child_cpu_s': round(child_cpu, 4),
+            'rss_start_mb': round(rss_start, 1),
+            'peak_rss_mb': round(self.peak_rss_mb, 1),
+            'rows_in': self.rows_in,
+            'rows_out': self.rows_out,
+            'rows_per_s': round(rows / wall, 1) if rows and wall > 0 else None,
+            'status': status,
+            'pid': os.getpid(),
+        }
+        if error is not None:
+            record['error'] = error
+        record.update(self.extra)
+        return record
+
+def emit(record):
+    """Append one JSON line to the metrics file"""
+    target = os.environ.get(METRICS_ENV, DEFAULT_METRICS_FILE)
+    if target.lower() == 'off':
+        return
+    line = json.dumps(record, default=str)
+    with _write_lock:
+        if target == '-':
+            print(line, file=sys.stderr)
+        else:
+            with open(target, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+
+def _stack():
+    if not hasattr(_local, 'stack'):
+        _local.stack = []
+    return _local.stack
+
+def current():
+    """The innermost open measurement on this thread (None outside measure())"""
+    stack = _stack()
+    return stack[-1] if stack else None
+
+def record_rows(rows_in=None, rows_out=None):
+    """Set row counts on the innermost open measurement, if there is one"""
+    measurement = current()
+    if measurement is None:
+        return
+    if rows_in is not None:
+        measurement.rows_in = rows_in
+    if rows_out is not None:
+        measurement.rows_out = rows_out
+
+def annotate(**extra):
+    """Attach extra fields (cache hits, batch size...) to the innermost open measurement"""
+    measurement = current()
+    if measurement is not None:
+        measurement.extra.update(extra)
+
+@contextmanager
+def _profiled(stage, measurement):
+    """cProfile + tracemalloc for the stage named in BANK_REVIEWS_PROFILE"""
+    if os.environ.get(PROFILE_ENV) not in (stage, stage.split('/')[-1]):
+        yield
+        return
+
+    import cProfile
+    import tracemalloc
+
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    profile_file = os.path.join(PROFILE_DIR, f"{stage.replace('/', '.')}-{RUN_ID}.prof")
+    profiler = cProfile.Profile()
+    tracemalloc.start()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        snapshot = tracemalloc.take_snapshot()
+        _, traced_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        profiler.dump_stats(profile_file)
+        measurement.extra['profile'] = profile_file
+        measurement.extra['traced_peak_mb'] = round(traced_peak / 2**20, 1)
+        measurement.extra['top_allocations'] = [
+            {'site': str(stat.traceback[0]), 'size_mb': round(stat.size / 2**20, 2)}
+            for stat in snapshot.statistics('lineno')[:10]
+        ]
+        print(f"🔬 Profile for {stage} saved to {profile_file} (view with: python -m pstats {profile_file})")
+
+@contextmanager
+def measure(stage, rows_in=None, rows_out=None, **extra):
+    """Measure a block; yields a Measurement whose rows_out/extra can be filled in"""
+    stack = _stack()
+    if stack:
+        stage = f"{stack[-1].stage}/{stage}"
+    measurement = Measurement(stage, rows_in, rows_out, **extra)
+    stack.append(measurement)
+
+    rss_start = current_rss_mb()
+    measurement.peak_rss_mb = rss_start
+    measurement.started = time.time()
+    wall_start = time.perf_counter()
+    # Process CPU time, so worker threads (torch, BLAS) are counted too, plus
+    # worker processes (ProcessPoolExecutor) once they have been reaped
+    cpu_start = time.process_time()
+    child_cpu_start = children_cpu_s()
+    _sampler.add(measurement)
+    status, error = 'ok', None
+    try:
+        with _profiled(stage, measurement):
+            yield measurement
+    except BaseException as e:
+        status, error = 'error', f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+        child_cpu = children_cpu_s() - child_cpu_start
+        _sampler.remove(measurement)
+        measurement.peak_rss_mb = max(measurement.peak_rss_mb, current_rss_mb())
+        stack.pop()
+        emit(measurement.record(wall, cpu, child_cpu, rss_start, status, error))
+
+def measured(stage=None):
+    """Decorator form of measure(); the stage name defaults to the function name"""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with measure(stage or fn.__name__):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def summarize(path=DEFAULT_METRICS_FILE, run_id=None):
+    """Records of one run (default: the latest) from a metrics file, as a DataFrame"""
+    import pandas as pd
+
+    df = pd.read_json(path, lines=True)
+    if df.empty:
+        return df
+    run_id = run_id or df['run_id'].iloc[-1]
+    return df[df['run_id'] == run_id]
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Summarize pipeline metrics")
+    parser.add_argument('--file', default=os.environ.get(METRICS_ENV, DEFAULT_METRICS_FILE))
+    parser.add_argument('--run-id', help="Run to show (default: the latest)")
+    args = parser.parse_args()
+
+    df = summarize(args.file, args.run_id)
+    columns = ['stage', 'wall_s', 'cpu_s', 'peak_rss_mb', 'rows_in', 'rows_out', 'rows_per_s', 'status']
+    print(f"📊 Run {df['run_id'].iloc[0]}:" if len(df) else "No metrics recorded yet")
+    if len(df):
+        print(df[columns].to_string(index=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Streaming keyword extraction for bank reviews.
+Runs spaCy's nlp.pipe over the cleaned reviews with only the components the
+lemmas need (no parser or NER), writing per-review keyword lists and
+per-bank keyword counts to disk as it goes.
+"""
+
+import argparse
+import csv
+from collections import Counter
+import pandas as pd
+from pipeline_storage import iter_stage
+from instrumentation import measure, record_rows
+
+# Components that lemmatization never reads
+UNUSED_COMPONENTS = ['parser', 'ner', 'senter']
+
+def load_keyword_nlp(model="en_core_web_sm"):
+    """Load spaCy with just tok2vec, tagger, attribute_ruler and lemmatizer"""
+    import spacy
+
+    return spacy.load(model, exclude=UNUSED_COMPONENTS)
+
+def doc_keywords(doc):
+    """Lemmas of the alphabetic, non-stopword tokens longer than two characters"""
+    return [token.lemma_ for token in doc
+            if not token.is_stop and not token.is_punct
+            and token.is_alpha and len(token.text) > 2]
+
+def stream_keywords(nlp, texts, batch_size=256, n_process=1):
+    """Yield one keyword list per text, in input order"""
+    lowered = (str(text).lower() for text in texts)
+    for doc in nlp.pipe(lowered, batch_size=batch_size, n_process=n_process):
+        yield doc_keywords(doc)
+
+def extract_all_keywords(keywords_file='bank_reviews_keywords.csv',
+                         counts_file='bank_keyword_counts.csv',
+                         batch_size=256, n_process=1, chunksize=10_000):
+    """Extract keywords for every review and write both output files"""
+    with measure('load_spacy'):
+        nlp = load_keyword_nlp()
+    print(f"✅ spaCy pipeline: {', '.join(nlp.pipe_names)}")
+
+    bank_counts = {}
+    processed = 0
+
+    with open(keywords_file, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['review_id', 'bank', 'keywords'])
+
+        for chunk in iter_stage('clean', columns=['review_id', 'review_text', 'bank'],
+                                chunksize=chunksize):
+            keyword_lists = stream_keywords(nlp, chunk['review_text'],
+                                            batch_size=batch_size, n_process=n_process)
+            for review_id, bank, keywords in zip(chunk['review_id'], chunk['bank'], keyword_lists):
+                writer.writerow([review_id, bank, ' '.join(keywords)])
+                bank_counts.setdefault(bank, Counter()).update(keywords)
+
+            processed += len(chunk)
+            print(f"  Processed {processed} reviews...")
+
+    counts = pd.DataFrame(
+        [(bank, keyword, count)
+         for bank, counter in bank_counts.items()
+         for keyword, count in counter.most_common()],
+        columns=['bank', 'keyword', 'count']
+    )
+    counts.to_csv(counts_file, index=False)
+    record_rows(rows_in=processed, rows_out=processed)
+
+    print(f"✅ Keywords for {processed} reviews saved to: {keywords_file}")
+    print(f"✅ Per-bank keyword counts saved to: {counts_file}")
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description="Streaming spaCy keyword extraction")
+    parser.add_argument('--batch-size', type=int, default=256,
+                        help="Documents per nlp.pipe batch")
+    parser.add_argument('--n-process', type=int, default=1,
+                        help="spaCy worker processes")
+    args = parser.parse_args()
+
+    with measure('keywords', batch_size=args.batch_size, n_process=args.n_process):
+        counts = extract_all_keywords(batch_size=args.batch_size, n_process=args.n_process)
+
+    print("\n🔑 TOP KEYWORDS PER BANK:")
+    for bank, group in counts.groupby('bank'):
+        print(f"  {bank}: {', '.join(group['keyword'].head(10))}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Near-duplicate and copy-paste review detection with MinHash + LSH.
+Each review gets a MinHash signature over its character shingles; an LSH
+band index only compares reviews that share a band bucket, so clustering
+stays sub-quadratic. Every review is assigned a cluster_id, and scorers
+can run once per cluster instead of once per row.
+"""
+
+import re
+import zlib
+from collections import defaultdict
+import numpy as np
+import pandas as pd
+
+MERSENNE_PRIME = (1 << 31) - 1
+MAX_HASH = (1 << 32) - 1
+
+def shingles(text, k=5):
+    """Character k-grams of the normalized text (the whole text if shorter than k)"""
+    text = re.sub(r'[^\w\s]', '', str(text).lower())
+    text = re.sub(r'\s+', ' ', text).strip()
+    if len(text) <= k:
+        return {text}
+    return {text[i:i + k] for i in range(len(text) - k + 1)}
+
+class MinHasher:
+    """Vectorized MinHash using universal hashing (a * x + b) mod p"""
+
+    def __init__(self, num_perm=128, seed=1):
+        rng = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self.a = rng.randint(1, MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+        self.b = rng.randint(0, MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+
+    def signature(self, shingle_set):
+        hashes = np.fromiter((zlib.crc32(s.encode('utf-8')) for s in shingle_set),
+                             dtype=np.uint64, count=len(shingle_set))
+        # (num_perm, n_shingles) in one shot; products stay below 2**63
+        permuted = (np.outer(self.a, hashes & MERSENNE_PRIME) + self.b[:, None]) % MERSENNE_PRIME
+        return permuted.min(axis=1).astype(np.uint32)
+
+    def signatures(self, texts, k=5):
+        return np.vstack([self.signature(shingles(text, k)) for text in texts])
+
+def choose_bands(num_perm, threshold):
+    """Pick the band count whose LSH threshold (1/b)^(1/r) is closest to the target"""
+    options = [b for b in range(1, num_perm + 1) if num_perm % b == 0]
+    return min(options, key=lambda b: abs((1 / b) ** (b / num_perm) - threshold))
+
+class _UnionFind:
+    def __init__(self, n):
+        self.parent = np.arange(n)
+
+    def find(self, i):
+        root = i
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[i] != root:
+            self.parent[i], i = root, self.parent[i]
+        return root
+
+    def union(self, i, j):
+        ri, rj = self.find(i), self.find(j)
+        if ri != rj:
+            # Keep the earliest row as the root so it becomes the representative
+            self.parent[max(ri, rj)] = min(ri, rj)
+
+def cluster_near_duplicates(texts, threshold=0.8, num_perm=128, k=5, seed=1):
+    """Return a cluster id per text; near-duplicates (Jaccard >= threshold) share one.
+
+    Cluster ids are dense integers numbered by first appearance.
+    """
+    texts = list(texts)
+    n = len(texts)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    signatures = MinHasher(num_perm, seed).signatures(texts, k)
+    bands = choose_bands(num_perm, threshold)
+    rows = num_perm // bands
+
+    uf = _UnionFind(n)
+    full_keys = list(map(bytes, signatures))
+    for band in range(bands):
+        buckets = defaultdict(list)
+        band_values = signatures[:, band * rows:(band + 1) * rows]
+        for i, key in enumerate(map(bytes, band_values)):
+            buckets[key].append(i)
+
+        for members in buckets.values():
+            if len(members) < 2:
+                continue
+            # Identical signatures always match (copy-paste reviews), so only
+            # one of each goes through the pairwise check
+            distinct = {}
+            for i in members:
+                if full_keys[i] in distinct:
+                    uf.union(distinct[full_keys[i]], i)
+                else:
+                    distinct[full_keys[i]] = i
+            # Confirm every remaining pair with the full-signature Jaccard estimate
+            candidates = np.fromiter(distinct.values(), dtype=np.int64, count=len(distinct))
+            for j in range(1, len(candidates)):
+                agreement = (signatures[candidates[:j]] == signatures[candidates[j]]).mean(axis=1)
+                for other in candidates[:j][agreement >= threshold]:
+                    uf.union(other, candidates[j])
+
+    roots = np.array([uf.find(i) for i in range(n)])
+    _, cluster_ids = np.unique(roots, return_inverse=True)
+    return cluster_ids
+
+def add_cluster_columns(df, text_column='review_text', **kwargs):
+    """Add cluster_id and cluster_size columns to a reviews frame"""
+    df = df.copy()
+    df['cluster_id'] = cluster_near_duplicates(df[text_column], **kwargs)
+    df['cluster_size'] = df.groupby('cluster_id')['cluster_id'].transform('size')
+    return df
+
+def collapse_clusters(df):
+    """Keep only the first review of each cluster"""
+    return df.drop_duplicates(subset=['cluster_id'], keep='first')
+
+def score_per_cluster(texts, cluster_ids, score_fn):
+    """Run score_fn once per cluster representative and broadcast to every member.
+
+    score_fn takes a list of texts and returns (labels, scores).
+    """
+    texts = pd.Series(list(texts))
+    cluster_ids = pd.Series(np.asarray(cluster_ids))
+    first = ~cluster_ids.duplicated()
+    representatives = cluster_ids[first].to_numpy()
+
+    print(f"Scoring {len(representatives)} cluster representatives for {len(texts)} reviews...")
+    labels, scores = score_fn(texts[first].tolist())
+
+    label_map = pd.Series(list(labels), index=representatives)
+    score_map = pd.Series(list(scores), index=representatives)
+    return (cluster_ids.map(label_map).to_numpy(),
+            cluster_ids.map(score_map).to_numpy())
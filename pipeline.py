@@ -0,0 +1,281 @@
+"""
+Pipeline runner for the review analysis scripts.
+
+Each step is declared with the script it runs, the code files it depends
+on and the data it reads and writes. Before a step runs, its fingerprint
+is computed: a hash of its command, its code files and the contents of its
+inputs. A step is skipped when that fingerprint matches the last successful
+run and its outputs still exist. Steps whose inputs are ready run in
+parallel: TextBlob scoring, DistilBERT scoring and theme tagging all start
+as soon as preprocessing is done.
+
+Editing theme_keywords.py therefore re-runs only tag_themes, the assembly
+of the complete dataset and the database steps. Sentiment is not
+re-scored.
+
+Fingerprints are kept in .pipeline_state.json.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from pipeline_storage import STAGES, STORAGE_ENV, stage_path
+from instrumentation import RUN_ID, RUN_ID_ENV
+
+STATE_FILE = '.pipeline_state.json'
+
+class Step:
+    """One pipeline step: a script run with arguments, plus what it reads and writes.
+
+    inputs/outputs are pipeline_storage stage names or plain file paths.
+    env names environment variables that change the step's output.
+    Manual steps (scraping) only run when asked for explicitly.
+    """
+
+    def __init__(self, name, command, code, inputs=(), outputs=(), env=(), manual=False):
+        self.name = name
+        self.command = command
+        self.code = list(code)
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.env = list(env)
+        self.manual = manual
+
+STORAGE_CODE = ['pipeline_storage.py']
+DB_CODE = ['review_repository.py', 'database_sqlite.py', 'review_partitions.py']
+
+STEPS = [
+    Step('scrape', ['scrape_reviews.py', '--incremental'],
+         code=['scrape_reviews.py', 'scrape_scheduler.py'] + STORAGE_CODE,
+         outputs=['raw'], manual=True),
+    Step('preprocess', ['preprocess.py'],
+         code=['preprocess.py', 'near_duplicates.py'] + STORAGE_CODE,
+         inputs=['raw'], outputs=['clean']),
+    Step('score_textblob', ['complete_sentiment.py', '--sentiment-only', '--workers', '0'],
+         code=['complete_sentiment.py', 'sentiment_cache.py', 'near_duplicates.py'] + STORAGE_CODE,
+         inputs=['clean'], outputs=['textblob']),
+    Step('score_distilbert', ['sentiment_analysis.py', '--no-themes'],
+         code=['sentiment_analysis.py', 'sentiment_models.py', 'sentiment_cache.py',
+               'near_duplicates.py', 'keyword_extraction.py'] + STORAGE_CODE,
+         inputs=['clean'], outputs=['sample'], env=['BANK_REVIEWS_SENTIMENT_BACKEND']),
+    Step('tag_themes', ['tag_themes.py'],
+         code=['tag_themes.py', 'theme_keywords.py', 'theme_matcher.py'] + STORAGE_CODE,
+         inputs=['clean'], outputs=['themes', 'report_themes']),
+    # Needs scikit-learn, so it only runs when asked for
+    Step('discover_themes', ['theme_discovery.py', '--incremental'],
+         code=['theme_discovery.py'] + STORAGE_CODE,
+         inputs=['themes', 'complete'],
+         outputs=['discovered_themes', 'theme_distinctive_terms.csv', 'theme_clusters.csv'],
+         manual=True),
+    # Needs sentence-transformers, so it only runs when asked for
+    Step('embed_reviews', ['review_embeddings.py', '--update'],
+         code=['review_embeddings.py', 'sentiment_models.py'] + STORAGE_CODE,
+         inputs=['clean'], outputs=['embeddings/vectors.f16', 'embeddings/ivf.npz'],
+         manual=True),
+    Step('assemble', ['complete_sentiment.py', '--assemble'],
+         code=['complete_sentiment.py'] + STORAGE_CODE,
+         inputs=['textblob', 'report_themes'], outputs=['complete']),
+    Step('build_sqlite', ['database_sqlite.py'],
+         code=DB_CODE + STORAGE_CODE,
+         inputs=['sample', 'themes'], outputs=['bank_reviews.db', 'database_schema.md']),
+    # The complete stage still holds archived months; those stay frozen
+    Step('sync_db', ['update_database.py', '--skip-archived'],
+         code=['update_database.py'] + DB_CODE + STORAGE_CODE,
+         inputs=['complete'], outputs=['bank_reviews_complete.db']),
+    Step('verify', ['verify_data.py'],
+         code=['verify_data.py'] + DB_CODE + STORAGE_CODE,
+         inputs=['clean', 'sample', 'complete', 'bank_reviews_complete.db']),
+]
+
+def resolve(name):
+    """Path behind a stage name (CSV file or Parquet directory) or a plain file"""
+    return stage_path(name) if name in STAGES else name
+
+def dependencies(steps):
+    """step name -> names of the steps producing its inputs"""
+    producers = {output: step.name for step in steps for output in step.outputs}
+    return {step.name: sorted({producers[i] for i in step.inputs if i in producers})
+            for step in steps}
+
+class FileHasher:
+    """Content hashes, remembered by (path, size, mtime) so unchanged files are read once"""
+
+    def __init__(self, known=None):
+        self.known = dict(known or {})
+
+    def file_hash(self, path):
+        stat = os.stat(path)
+        key = f"{stat.st_size}:{stat.st_mtime_ns}"
+        cached = self.known.get(path)
+        if cached and cached[0] == key:
+            return cached[1]
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        self.known[path] = [key, digest.hexdigest()]
+        return digest.hexdigest()
+
+    def path_hash(self, path):
+        if os.path.isdir(path):
+            digest = hashlib.sha256()
+            for root, _, files in sorted(os.walk(path)):
+                for name in sorted(files):
+                    full = os.path.join(root, name)
+                    digest.update(os.path.relpath(full, path).encode())
+                    digest.update(self.file_hash(full).encode())
+            return digest.hexdigest()
+        if os.path.exists(path):
+            return self.file_hash(path)
+        return 'missing'
+
+def fingerprint(step, hasher):
+    digest = hashlib.sha256()
+    digest.update(json.dumps(step.command).encode())
+    digest.update(os.environ.get(STORAGE_ENV, 'csv').encode())
+    for name in step.env:
+        digest.update(f"{name}={os.environ.get(name, '')}".encode())
+    for path in sorted(step.code) + [resolve(i) for i in step.inputs]:
+        digest.update(path.encode())
+        digest.update(hasher.path_hash(path).encode())
+    return digest.hexdigest()
+
+def load_state(path=STATE_FILE):
+    if not os.path.exists(path):
+        return {'steps': {}, 'files': {}}
+    with open(path) as f:
+        return json.load(f)
+
+def save_state(state, path=STATE_FILE):
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+def select_steps(targets, include=()):
+    """The target steps and everything upstream of them"""
+    by_name = {step.name: step for step in STEPS}
+    unknown = [t for t in targets if t not in by_name]
+    if unknown:
+        raise SystemExit(f"Unknown step(s): {', '.join(unknown)}. Choose from: {', '.join(by_name)}")
+
+    deps = dependencies(STEPS)
+    wanted = set()
+    pending = list(targets or [s.name for s in STEPS])
+    while pending:
+        name = pending.pop()
+        if name in wanted:
+            continue
+        wanted.add(name)
+        pending.extend(deps[name])
+    return [step for step in STEPS
+            if step.name in wanted and (not step.manual or step.name in targets or step.name in include)]
+
+def run_step(step):
+    """Run one step's script; returns (returncode, seconds)"""
+    started = time.time()
+    # Every step's metrics share this run's id
+    env = dict(os.environ, **{RUN_ID_ENV: RUN_ID})
+    result = subprocess.run([sys.executable] + step.command, env=env)
+    return result.returncode, time.time() - started
+
+def run_pipeline(targets=(), force=(), jobs=3, dry_run=False, include=()):
+    steps = select_steps(list(targets), include)
+    names = {step.name for step in steps}
+    deps = {name: [d for d in upstream if d in names]
+            for name, upstream in dependencies(steps).items()}
+    force = set(force)
+
+    state = load_state()
+    hasher = FileHasher(state.get('files'))
+    done, failed, ran = set(), set(), set()
+    remaining = list(steps)
+
+    def ready(step):
+        return all(d in done for d in deps[step.name])
+
+    def needs_run(step):
+        if step.name in force or 'all' in force:
+            return True, 'forced'
+        if not all(os.path.exists(resolve(o)) for o in step.outputs):
+            return True, 'missing output'
+        previous = state['steps'].get(step.name, {}).get('fingerprint')
+        if previous != fingerprint(step, hasher):
+            return True, 'changed'
+        return False, 'unchanged'
+
+    if dry_run:
+        for step in steps:
+            upstream = [d for d in deps[step.name] if d in ran]
+            run, reason = (True, f"after {', '.join(upstream)}") if upstream else needs_run(step)
+            if run:
+                ran.add(step.name)
+            print(f"  {'RUN ' if run else 'skip'}  {step.name:<17} ({reason})")
+        return True
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        running = {}
+        while remaining or running:
+            # Skipping a step can make its dependents ready straight away
+            startable = [s for s in remaining if ready(s)]
+            while startable:
+                for step in startable:
+                    remaining.remove(step)
+                    run, reason = needs_run(step)
+                    if not run:
+                        print(f"⏭️  {step.name}: skipped ({reason})")
+                        done.add(step.name)
+                        continue
+                    print(f"▶️  {step.name}: running ({reason})")
+                    # Fingerprint the inputs as they were when the step started
+                    running[pool.submit(run_step, step)] = (step, fingerprint(step, hasher))
+                startable = [s for s in remaining if ready(s)]
+
+            if not running:
+                break
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                step, step_fingerprint = running.pop(future)
+                returncode, seconds = future.result()
+                if returncode != 0:
+                    print(f"❌ {step.name}: failed with exit code {returncode}")
+                    failed.add(step.name)
+                    continue
+                print(f"✅ {step.name}: done in {seconds:.1f}s")
+                done.add(step.name)
+                state['steps'][step.name] = {'fingerprint': step_fingerprint,
+                                             'seconds': round(seconds, 2),
+                                             'finished_at': time.strftime('%Y-%m-%dT%H:%M:%S')}
+                state['files'] = hasher.known
+                save_state(state)
+
+    blocked = [s.name for s in remaining]
+    if failed or blocked:
+        print(f"\n❌ Failed: {', '.join(sorted(failed)) or '-'}; not run: {', '.join(blocked) or '-'}")
+        return False
+    print("\n✅ Pipeline up to date")
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the review pipeline, skipping steps whose inputs are unchanged")
+    parser.add_argument('targets', nargs='*',
+                        help=f"Steps to bring up to date with their upstream steps (default: all). "
+                             f"Steps: {', '.join(s.name for s in STEPS)}")
+    parser.add_argument('--force', action='append', default=[], metavar='STEP',
+                        help="Run this step even if unchanged ('all' for every step)")
+    parser.add_argument('--jobs', type=int, default=3, help="Steps run in parallel")
+    parser.add_argument('--scrape', action='store_true', help="Include the (manual) scrape step")
+    parser.add_argument('--dry-run', action='store_true', help="Only show what would run")
+    args = parser.parse_args()
+
+    ok = run_pipeline(args.targets, args.force, args.jobs, args.dry_run,
+                      include=['scrape'] if args.scrape else [])
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""
+Storage layer for the pipeline's intermediate review datasets.
+
+Every stage reads and writes through read_stage / write_stage instead of
+naming CSV files directly. Two formats are supported, picked with the
+BANK_REVIEWS_STORAGE environment variable:
+
+- csv (default): the original bank_reviews_*.csv files, one full copy per stage
+- parquet: a columnar dataset per stage under data/, with compact dtypes.
+  Base stages (raw, clean) hold whole review rows; derived stages only
+  store review_id plus the columns they add, and reads join those back
+  onto the clean reviews, loading only the requested columns.
+"""
+
+import os
+import shutil
+import uuid
+import pandas as pd
+
+STORAGE_ENV = 'BANK_REVIEWS_STORAGE'
+DATA_DIR = 'data'
+
+BASE_COLUMNS = ['review_id', 'review_text', 'rating', 'date', 'bank', 'source']
+
+# stage -> (legacy CSV file, base stage it adds columns to or None)
+STAGES = {
+    'raw': ('bank_reviews_raw.csv', None),
+    'clean': ('bank_reviews_clean.csv', None),
+    'themes': ('bank_reviews_with_themes.csv', 'clean'),
+    'sample': ('bank_reviews_analyzed_sample.csv', 'clean'),
+    'complete': ('bank_reviews_completely_analyzed.csv', 'clean'),
+    # Pipeline intermediates: TextBlob sentiment and report themes, joined into complete
+    'textblob': ('bank_reviews_textblob_sentiment.csv', 'clean'),
+    'report_themes': ('bank_reviews_report_themes.csv', 'clean'),
+    # theme_discovery.py: k-means clusters of the reviews no keyword theme matched
+    'discovered_themes': ('bank_reviews_discovered_themes.csv', 'clean'),
+}
+
+CATEGORY_COLUMNS = ['bank', 'source', 'sentiment_label']
+
+def storage_format():
+    fmt = os.environ.get(STORAGE_ENV, 'csv').lower()
+    if fmt not in ('csv', 'parquet'):
+        raise ValueError(f"{STORAGE_ENV} must be 'csv' or 'parquet', got {fmt!r}")
+    return fmt
+
+def stage_path(stage):
+    """CSV file or Parquet dataset directory backing a stage"""
+    csv_file, _ = STAGES[stage]
+    if storage_format() == 'csv':
+        return csv_file
+    return os.path.join(DATA_DIR, stage)
+
+def stage_exists(stage):
+    return os.path.exists(stage_path(stage))
+
+def compact_dtypes(df):
+    """Categorical bank/source/label, float32 rating and score, datetime date"""
+    df = df.copy()
+    for column in CATEGORY_COLUMNS:
+        if column in df:
+            df[column] = df[column].astype('category')
+    if 'rating' in df:
+        # One dtype for every part: ratings may be missing or a half-step median fill
+        df['rating'] = df['rating'].astype('float32')
+    if 'sentiment_score' in df:
+        df['sentiment_score'] = df['sentiment_score'].astype('float32')
+    if 'date' in df:
+        df['date'] = pd.to_datetime(df['date'], format='%Y-%m-%d')
+    return df
+
+def _to_arrow(df):
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(compact_dtypes(df), preserve_index=False)
+    if 'date' in table.column_names:
+        index = table.column_names.index('date')
+        table = table.set_column(index, 'date', table.column('date').cast(pa.date32()))
+    return table
+
+def _write_part(directory, df):
+    import pyarrow.parquet as pq
+
+    os.makedirs(directory, exist_ok=True)
+    pq.write_table(_to_arrow(df), os.path.join(directory, f'part-{uuid.uuid4().hex}.parquet'))
+
+def _read_parquet(stage, columns=None):
+    df = pd.read_parquet(stage_path(stage), columns=columns)
+    if 'date' in df:
+        # Stages expect ISO date strings, as in the CSV files
+        df['date'] = pd.to_datetime(df['date']).dt.strftime('%Y-%m-%d')
+    return df
+
+def read_stage(stage, columns=None):
+    """Load a stage's reviews, optionally only some columns"""
+    if storage_format() == 'csv':
+        return pd.read_csv(stage_path(stage), usecols=columns)
+
+    _, base = STAGES[stage]
+    if base is None:
+        return _read_parquet(stage, columns)
+
+    import pyarrow.dataset as ds
+
+    own = ds.dataset(stage_path(stage), format='parquet').schema.names
+    wanted = columns or BASE_COLUMNS + [c for c in own if c != 'review_id']
+    own_columns = ['review_id'] + [c for c in wanted if c in own and c != 'review_id']
+    base_columns = ['review_id'] + [c for c in wanted if c not in own]
+
+    derived = _read_parquet(stage, own_columns)
+    if len(base_columns) == 1:
+        return derived[wanted]
+    base_df = _read_parquet(base, base_columns)
+    return base_df.merge(derived, on='review_id', how='inner')[wanted]
+
+def iter_stage(stage, columns=None, chunksize=100_000):
+    """Yield a stage's reviews in chunks of at most chunksize rows"""
+    if storage_format() == 'csv':
+        yield from pd.read_csv(stage_path(stage), usecols=columns, chunksize=chunksize)
+        return
+
+    _, base = STAGES[stage]
+    if base is not None:
+        # Derived stages need the join, which reads the whole column set
+        df = read_stage(stage, columns)
+        for start in range(0, len(df), chunksize):
+            yield df.iloc[start:start + chunksize]
+        return
+
+    import pyarrow.dataset as ds
+
+    dataset = ds.dataset(stage_path(stage), format='parquet')
+    for batch in dataset.to_batches(columns=columns, batch_size=chunksize):
+        chunk = batch.to_pandas()
+        if 'date' in chunk:
+            chunk['date'] = pd.to_datetime(chunk['date']).dt.strftime('%Y-%m-%d')
+        yield chunk
+
+def write_stage(stage, df, new_columns=None):
+    """Replace a stage's output.
+
+    For derived stages, new_columns names the columns this stage adds; df
+    must also hold review_id. In CSV mode they are merged onto the full
+    base rows so the legacy file keeps its layout.
+    """
+    _, base = STAGES[stage]
+    path = stage_path(stage)
+
+    if base is not None:
+        new_columns = new_columns or [c for c in df.columns if c not in BASE_COLUMNS]
+        df = df[['review_id'] + [c for c in new_columns if c != 'review_id']]
+
+    if storage_format() == 'csv':
+        if base is not None:
+            base_df = read_stage(base)
+            df = base_df.merge(df, on='review_id', how='inner')
+        df.to_csv(path, index=False)
+        return path
+
+    remove_stage(stage)
+    _write_part(path, df)
+    return path
+
+def remove_stage(stage):
+    """Delete a stage's output if it exists"""
+    path = stage_path(stage)
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    elif os.path.exists(path):
+        os.remove(path)
+
+def append_stage(stage, df):
+    """Add rows to a base stage (raw or clean) without rewriting what is there"""
+    _, base = STAGES[stage]
+    if base is not None:
+        raise ValueError(f"Only base stages can be appended to, not {stage!r}")
+
+    path = stage_path(stage)
+    if storage_format() == 'csv':
+        df.to_csv(path, mode='a', header=not os.path.exists(path), index=False)
+    else:
+        _write_part(path, df)
+    return path
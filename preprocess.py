@@ -1,38 +1,169 @@
+import argparse
 import pandas as pd
 import numpy as np
+from instrumentation import measure, record_rows
+from pipeline_storage import read_stage, write_stage, iter_stage, append_stage, remove_stage
+from near_duplicates import add_cluster_columns, collapse_clusters
 
-def preprocess_reviews():
+DATE_FORMAT = '%Y-%m-%d'
+
+def preprocess_reviews(near_duplicates=False, collapse=False, threshold=0.8):
     # Load raw data
-    df = pd.read_csv('bank_reviews_raw.csv')
-    
+    df = read_stage('raw')
+    record_rows(rows_in=len(df))
+
     print(f"Original data: {len(df)} reviews")
-    
+
     # Remove duplicates
     df = df.drop_duplicates(subset=['review_id'])
     print(f"After removing duplicates: {len(df)} reviews")
-    
+
     # Handle missing data
     df = df.dropna(subset=['review_text'])
     print(f"After removing empty reviews: {len(df)} reviews")
-    
+
     # Fill missing ratings with median
     if df['rating'].isna().any():
         df['rating'] = df['rating'].fillna(df['rating'].median())
         print("Filled missing ratings with median")
-    
+
     # Ensure date format
     df['date'] = pd.to_datetime(df['date']).dt.strftime('%Y-%m-%d')
-    
+
+    # Cluster near-duplicate / copy-paste reviews
+    if near_duplicates or collapse:
+        df = add_cluster_columns(df, threshold=threshold)
+        repeated = (df['cluster_size'] > 1).sum()
+        print(f"Found {df['cluster_id'].nunique()} clusters ({repeated} reviews have near-duplicates)")
+        if collapse:
+            df = collapse_clusters(df)
+            print(f"After collapsing near-duplicates: {len(df)} reviews")
+
     # Save cleaned data
-    df.to_csv('bank_reviews_clean.csv', index=False)
-    
+    write_stage('clean', df)
+    record_rows(rows_out=len(df))
+
     print(f"Final cleaned data: {len(df)} reviews")
     print(f"Reviews per bank:")
     print(df['bank'].value_counts().to_dict())
-    
+
     # Show some sample data
     print("\nSample of cleaned data:")
     print(df.head(3))
 
+def review_id_hashes(review_ids):
+    """64-bit hashes of a chunk's review_ids, so the seen-set stores ints instead of strings"""
+    return pd.util.hash_pandas_object(review_ids.astype(str), index=False).to_numpy()
+
+def dedupe_chunk(chunk, seen):
+    """Keep the first occurrence of each review_id across all chunks seen so far.
+
+    seen is a sorted uint64 array of the hashes already kept; returns
+    (kept rows, updated seen).
+    """
+    hashes = review_id_hashes(chunk['review_id'])
+    unique, first = np.unique(hashes, return_index=True)
+    new = ~np.isin(unique, seen, assume_unique=True)
+    keep = np.sort(first[new])
+    return chunk.iloc[keep], np.union1d(seen, unique[new])
+
+def median_from_counts(counts):
+    """Exact median from a {rating: count} histogram (same as Series.median)"""
+    total = sum(counts.values())
+    if total == 0:
+        return np.nan
+    values = sorted(counts)
+    middle = [(total - 1) // 2, total // 2]
+    result, seen = [], 0
+    for value in values:
+        seen += counts[value]
+        while middle and middle[0] < seen:
+            result.append(value)
+            middle.pop(0)
+    return sum(result) / 2
+
+def rating_median(chunksize):
+    """Lightweight first pass: exact median rating of the deduped, non-empty reviews.
+
+    Ratings only take a handful of values, so a histogram is enough to get
+    the exact median without holding the column in memory. Also reports
+    whether any rating is missing.
+    """
+    seen = np.empty(0, dtype=np.uint64)
+    counts = {}
+    has_missing = False
+    for chunk in iter_stage('raw', columns=['review_id', 'review_text', 'rating'],
+                            chunksize=chunksize):
+        chunk, seen = dedupe_chunk(chunk, seen)
+        chunk = chunk.dropna(subset=['review_text'])
+        has_missing = has_missing or chunk['rating'].isna().any()
+        for rating, count in chunk['rating'].dropna().value_counts().items():
+            counts[rating] = counts.get(rating, 0) + count
+    return median_from_counts(counts), has_missing
+
+def preprocess_reviews_streaming(chunksize=100_000, date_format=DATE_FORMAT):
+    """Same cleaning as preprocess_reviews, reading the raw file in fixed-size chunks"""
+    median, has_missing = rating_median(chunksize)
+    print(f"Median rating (first pass): {median}")
+
+    seen = np.empty(0, dtype=np.uint64)
+    total = kept = 0
+    bank_counts = {}
+    remove_stage('clean')
+
+    for chunk in iter_stage('raw', chunksize=chunksize):
+        total += len(chunk)
+
+        # Remove duplicates (across chunks) and empty reviews
+        chunk, seen = dedupe_chunk(chunk, seen)
+        chunk = chunk.dropna(subset=['review_text']).copy()
+
+        # Fill missing ratings with the global median; keep one dtype in
+        # every chunk, as the in-memory path would for the whole column
+        if has_missing:
+            chunk['rating'] = chunk['rating'].astype(float).fillna(median)
+
+        # Explicit format instead of per-row inference
+        chunk['date'] = pd.to_datetime(chunk['date'], format=date_format).dt.strftime('%Y-%m-%d')
+
+        append_stage('clean', chunk)
+
+        kept += len(chunk)
+        for bank, count in chunk['bank'].value_counts().items():
+            bank_counts[bank] = bank_counts.get(bank, 0) + count
+        print(f"  Processed {total} reviews ({kept} kept)...")
+
+    record_rows(rows_in=total, rows_out=kept)
+    print(f"Original data: {total} reviews")
+    print(f"Final cleaned data: {kept} reviews")
+    print(f"Reviews per bank:")
+    print(bank_counts)
+
+def main():
+    parser = argparse.ArgumentParser(description="Clean the raw scraped reviews")
+    parser.add_argument('--streaming', action='store_true',
+                        help="Process the raw file in chunks with flat memory use")
+    parser.add_argument('--chunksize', type=int, default=100_000,
+                        help="Rows per chunk in streaming mode")
+    parser.add_argument('--date-format', default=DATE_FORMAT,
+                        help="strftime format of the raw date column (streaming mode)")
+    parser.add_argument('--near-duplicates', action='store_true',
+                        help="Add cluster_id/cluster_size columns grouping near-duplicate reviews")
+    parser.add_argument('--collapse', action='store_true',
+                        help="Keep one representative review per near-duplicate cluster")
+    parser.add_argument('--similarity', type=float, default=0.8,
+                        help="Estimated Jaccard similarity at which reviews count as near-duplicates")
+    args = parser.parse_args()
+
+    if args.streaming:
+        if args.near_duplicates or args.collapse:
+            parser.error("near-duplicate clustering needs the whole corpus; drop --streaming")
+        with measure('preprocess', mode='streaming'):
+            preprocess_reviews_streaming(chunksize=args.chunksize, date_format=args.date_format)
+    else:
+        with measure('preprocess'):
+            preprocess_reviews(near_duplicates=args.near_duplicates, collapse=args.collapse,
+                               threshold=args.similarity)
+
 if __name__ == "__main__":
-    preprocess_reviews()
\ No newline at end of file
+    main()
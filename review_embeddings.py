@@ -0,0 +1,297 @@
+"""
+Sentence embeddings for every review and a "reviews like this one" lookup.
+
+Embeddings come from a local CPU sentence-transformers model
+(sentiment_models.EMBEDDING_MODEL). They are kept under embeddings/:
+- vectors.f16: unit-length float16 vectors, one row per review, read as
+  a numpy memmap
+- meta.csv: review_id, bank and date of each row, in the same order
+- ivf.npz: an inverted-file (IVF) index, i.e. k-means centroids plus the
+  rows of each centroid's list, stored sorted by list
+
+--update only embeds reviews that are not stored yet and appends them. New
+rows join the existing lists. The centroids are retrained when the corpus
+has grown 4x since they were trained.
+
+A lookup scores the centroids, then only the rows in the closest nprobe
+lists. Bank and date filters are applied to the candidates. When a filter
+leaves few rows, those rows are scanned exactly instead.
+
+    python review_embeddings.py --update
+    python review_embeddings.py --similar <review_id> --bank CBE --from 2025-01-01
+    python review_embeddings.py --query "money deducted but transfer failed" -k 5
+
+Requires sentence-transformers.
+"""
+
+import argparse
+import json
+import os
+import time
+import numpy as np
+import pandas as pd
+from pipeline_storage import read_stage
+from instrumentation import measure, record_rows
+from sentiment_models import EMBEDDING_MODEL, encode_texts
+
+EMBEDDINGS_DIR = 'embeddings'
+# Below this many rows (after filters) a lookup just scans them all
+EXACT_SEARCH_ROWS = 20_000
+RETRAIN_GROWTH = 4
+# Keep (rows x centroids) similarity blocks around 64 MB of float32
+BLOCK_CELLS = 2**24
+
+class EmbeddingStore:
+    """float16 vectors on disk; row i belongs to meta.review_id[i]"""
+
+    def __init__(self, directory=EMBEDDINGS_DIR):
+        self.directory = directory
+        self.info_path = os.path.join(directory, 'info.json')
+        self.vectors_path = os.path.join(directory, 'vectors.f16')
+        self.meta_path = os.path.join(directory, 'meta.csv')
+        self.index_path = os.path.join(directory, 'ivf.npz')
+
+        self.info = None
+        if os.path.exists(self.info_path):
+            with open(self.info_path) as f:
+                self.info = json.load(f)
+        if os.path.exists(self.meta_path):
+            self.meta = pd.read_csv(self.meta_path, dtype={'review_id': str, 'bank': str, 'date': str})
+        else:
+            self.meta = pd.DataFrame(columns=['review_id', 'bank', 'date'])
+
+    def __len__(self):
+        return len(self.meta)
+
+    @property
+    def dim(self):
+        return self.info['dim'] if self.info else None
+
+    def vectors(self):
+        """(rows, dim) float16 memmap; only rows listed in meta.csv are visible"""
+        if not len(self):
+            return np.zeros((0, self.dim or 0), dtype=np.float16)
+        return np.memmap(self.vectors_path, dtype=np.float16, mode='r', shape=(len(self), self.dim))
+
+    def append(self, rows, vectors):
+        """Add embedded reviews; vectors go first, so a crash can only leave unlisted vectors"""
+        os.makedirs(self.directory, exist_ok=True)
+        if self.info is None:
+            self.info = {'model': EMBEDDING_MODEL, 'dim': int(vectors.shape[1])}
+            with open(self.info_path, 'w') as f:
+                json.dump(self.info, f)
+
+        # Drop vectors a crashed run wrote without their meta rows
+        expected = len(self) * self.dim * 2
+        if os.path.exists(self.vectors_path) and os.path.getsize(self.vectors_path) != expected:
+            os.truncate(self.vectors_path, expected)
+        with open(self.vectors_path, 'ab') as f:
+            np.ascontiguousarray(vectors, dtype=np.float16).tofile(f)
+
+        rows = rows[['review_id', 'bank', 'date']]
+        rows.to_csv(self.meta_path, mode='a', header=not os.path.exists(self.meta_path), index=False)
+        self.meta = pd.concat([self.meta, rows], ignore_index=True)
+
+def _blocks(n, width):
+    step = max(1, BLOCK_CELLS // max(width, 1))
+    for start in range(0, n, step):
+        yield start, min(start + step, n)
+
+def nearest_centroids(vectors, centroids):
+    """Index of the most similar centroid for every row, computed in blocks"""
+    assign = np.empty(len(vectors), dtype=np.int32)
+    for start, stop in _blocks(len(vectors), len(centroids)):
+        block = np.asarray(vectors[start:stop], dtype=np.float32)
+        assign[start:stop] = np.argmax(block @ centroids.T, axis=1)
+    return assign
+
+def train_centroids(vectors, nlist, iterations=10, seed=0):
+    """Spherical k-means on a sample of the vectors (about 40 rows per list)"""
+    rng = np.random.default_rng(seed)
+    sample_rows = np.sort(rng.choice(len(vectors), min(len(vectors), 40 * nlist), replace=False))
+    sample = np.asarray(vectors[sample_rows], dtype=np.float32)
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+
+    for _ in range(iterations):
+        assign = nearest_centroids(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, sample)
+        counts = np.bincount(assign, minlength=nlist)
+        empty = counts == 0
+        # Re-seed lists that lost all their rows
+        sums[empty] = sample[rng.choice(len(sample), empty.sum())]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        centroids = sums / np.maximum(norms, 1e-12)
+    return centroids.astype(np.float32)
+
+def build_index(store, retrain=False):
+    """Train (or reuse) the IVF centroids and file every row under its nearest one"""
+    vectors = store.vectors()
+    n = len(vectors)
+    existing = np.load(store.index_path) if os.path.exists(store.index_path) else None
+
+    if existing is None or retrain or n > RETRAIN_GROWTH * int(existing['trained_rows']):
+        nlist = max(1, int(np.sqrt(n)))
+        with measure('train_ivf', rows_in=n, nlist=nlist):
+            centroids = train_centroids(vectors, nlist)
+            assign = nearest_centroids(vectors, centroids)
+        trained_rows = n
+    else:
+        centroids, trained_rows = existing['centroids'], int(existing['trained_rows'])
+        assign = existing['assign']
+        if len(assign) < n:
+            assign = np.concatenate([assign, nearest_centroids(vectors[len(assign):], centroids)])
+
+    order = np.argsort(assign, kind='stable').astype(np.int64)
+    offsets = np.searchsorted(assign[order], np.arange(len(centroids) + 1)).astype(np.int64)
+    np.savez(store.index_path, centroids=centroids, assign=assign, order=order,
+             offsets=offsets, trained_rows=trained_rows)
+    return len(centroids)
+
+def update_embeddings(batch_size=64, chunksize=10_000, retrain=False):
+    """Embed reviews that aren't stored yet, then refresh the index"""
+    clean = read_stage('clean', columns=['review_id', 'review_text', 'bank', 'date'])
+    store = EmbeddingStore()
+    if store.info and store.info['model'] != EMBEDDING_MODEL:
+        raise SystemExit(f"{EMBEDDINGS_DIR}/ holds {store.info['model']} vectors; "
+                         f"delete it to re-embed with {EMBEDDING_MODEL}")
+
+    new = clean[~clean['review_id'].astype(str).isin(store.meta['review_id'])]
+    record_rows(rows_in=len(clean), rows_out=len(new))
+    print(f"{len(store)} reviews already embedded, {len(new)} new")
+
+    for start in range(0, len(new), chunksize):
+        chunk = new.iloc[start:start + chunksize]
+        with measure('encode', rows_in=len(chunk)):
+            vectors = encode_texts(chunk['review_text'].fillna('').tolist(), batch_size)
+        store.append(chunk, vectors)
+        print(f"  Embedded {min(start + chunksize, len(new))}/{len(new)} reviews...")
+
+    if len(store):
+        nlist = build_index(store, retrain)
+        print(f"✅ Index: {len(store)} vectors in {nlist} lists")
+    return store
+
+class ReviewIndex:
+    """Nearest-neighbour lookups over the stored embeddings"""
+
+    def __init__(self, directory=EMBEDDINGS_DIR):
+        store = EmbeddingStore(directory)
+        if not len(store):
+            raise SystemExit(f"No embeddings in {directory}/; run: python review_embeddings.py --update")
+        self.vectors = store.vectors()
+        self.review_ids = store.meta['review_id'].to_numpy()
+        # Integer codes keep the filters to a few ms over millions of rows
+        self.bank_codes, self.bank_names = pd.factorize(store.meta['bank'])
+        self.days = pd.to_datetime(store.meta['date']).to_numpy().astype('datetime64[D]').astype(np.int32)
+        self.row_of = pd.Index(self.review_ids)
+
+        self.centroids = None
+        if os.path.exists(store.index_path):
+            index = np.load(store.index_path)
+            self.centroids, self.order, self.offsets = index['centroids'], index['order'], index['offsets']
+            # Rows added after the last --update aren't in the lists yet
+            self.unindexed = np.arange(int(self.offsets[-1]), len(self.review_ids))
+
+    def _filter(self, rows, bank, date_from, date_to):
+        mask = np.ones(len(rows), dtype=bool)
+        if bank:
+            code = self.bank_names.get_indexer([bank])[0]
+            mask &= self.bank_codes[rows] == code
+        if date_from:
+            mask &= self.days[rows] >= np.datetime64(date_from, 'D').astype(np.int32)
+        if date_to:
+            mask &= self.days[rows] <= np.datetime64(date_to, 'D').astype(np.int32)
+        return rows[mask]
+
+    def _candidates(self, query, k, bank, date_from, date_to, nprobe):
+        filtered = bank or date_from or date_to
+        everything = np.arange(len(self.review_ids))
+        if self.centroids is None or len(everything) <= EXACT_SEARCH_ROWS:
+            return self._filter(everything, bank, date_from, date_to)
+        if filtered:
+            allowed = self._filter(everything, bank, date_from, date_to)
+            if len(allowed) <= EXACT_SEARCH_ROWS:
+                return allowed
+
+        # Probe the closest lists, widening until enough rows pass the filters
+        ranked = np.argsort(-(self.centroids @ query))
+        while True:
+            lists = ranked[:nprobe]
+            rows = np.concatenate([self.order[self.offsets[l]:self.offsets[l + 1]] for l in lists]
+                                  + [self.unindexed])
+            rows = self._filter(rows, bank, date_from, date_to)
+            if len(rows) >= k or nprobe >= len(ranked):
+                return rows
+            nprobe *= 2
+
+    def search(self, query, k=10, bank=None, date_from=None, date_to=None, nprobe=16, exclude=()):
+        """Top-k most similar reviews to a query vector, as a DataFrame"""
+        query = np.array(query, dtype=np.float32)
+        query /= max(np.linalg.norm(query), 1e-12)
+        rows = self._candidates(query, k + len(exclude), bank, date_from, date_to, nprobe)
+        if len(exclude):
+            rows = rows[~np.isin(rows, list(exclude))]
+        rows = np.sort(rows)  # memmap reads in file order
+
+        scores = np.asarray(self.vectors[rows], dtype=np.float32) @ query
+        top = np.argpartition(-scores, min(k, len(rows)) - 1)[:k] if len(rows) > k else np.arange(len(rows))
+        top = top[np.argsort(-scores[top])]
+        return pd.DataFrame({
+            'review_id': self.review_ids[rows[top]],
+            'bank': self.bank_names[self.bank_codes[rows[top]]],
+            'date': self.days[rows[top]].astype('datetime64[D]').astype(str),
+            'similarity': scores[top].round(4),
+        })
+
+    def similar_to(self, review_id, k=10, **filters):
+        """Reviews most like a stored review (the review itself excluded)"""
+        if review_id not in self.row_of:
+            raise KeyError(f"{review_id} has no embedding yet; run: python review_embeddings.py --update")
+        row = self.row_of.get_loc(review_id)
+        return self.search(self.vectors[row], k, exclude=(row,), **filters)
+
+    def query(self, text, k=10, **filters):
+        return self.search(encode_texts([text])[0], k, **filters)
+
+def main():
+    parser = argparse.ArgumentParser(description="Review embeddings and similar-review lookup")
+    parser.add_argument('--update', action='store_true', help="Embed new reviews and refresh the index")
+    parser.add_argument('--retrain', action='store_true', help="Retrain the IVF centroids on --update")
+    parser.add_argument('--batch-size', type=int, default=64, help="Reviews per encoder batch")
+    parser.add_argument('--similar', metavar='REVIEW_ID', help="Find reviews like this one")
+    parser.add_argument('--query', help="Find reviews like this text")
+    parser.add_argument('-k', type=int, default=10, help="Neighbours to return")
+    parser.add_argument('--bank', help="Only reviews of this bank")
+    parser.add_argument('--from', dest='date_from', help="Only reviews on or after YYYY-MM-DD")
+    parser.add_argument('--to', dest='date_to', help="Only reviews on or before YYYY-MM-DD")
+    parser.add_argument('--nprobe', type=int, default=16, help="IVF lists scanned per lookup")
+    args = parser.parse_args()
+
+    if args.update:
+        with measure('embed_reviews', model=EMBEDDING_MODEL):
+            update_embeddings(args.batch_size, retrain=args.retrain)
+
+    if not (args.similar or args.query):
+        if not args.update:
+            parser.print_help()
+        return
+
+    index = ReviewIndex()
+    filters = {'bank': args.bank, 'date_from': args.date_from, 'date_to': args.date_to,
+               'nprobe': args.nprobe}
+    started = time.perf_counter()
+    if args.similar:
+        results = index.similar_to(args.similar, args.k, **filters)
+    else:
+        results = index.query(args.query, args.k, **filters)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    texts = read_stage('clean', columns=['review_id', 'review_text'])
+    results = results.merge(texts, on='review_id', how='left')
+    print(f"🔎 {len(results)} similar reviews in {elapsed_ms:.1f} ms:")
+    for _, row in results.iterrows():
+        print(f"  {row['similarity']:.3f}  {row['bank']:<6} {row['date']}  {str(row['review_text'])[:80]}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,453 @@
+"""
+Monthly partitioning of the reviews table.
+
+PostgreSQL: reviews becomes a natively partitioned table
+(PARTITION BY RANGE (review_date)) with one partition per month, so the
+planner prunes every month outside a query's date range.
+
+SQLite: the live reviews table keeps the recent months hot; older months are
+moved into one database file per month under partitions/ and registered in
+review_partitions. query_reviews() is the partition router: it attaches only
+the month files that overlap the requested range, puts them behind a
+temporary UNION ALL view with the live table, and queries that.
+
+On both backends a month can be archived to Parquet (with the bank name
+denormalized in), after which the router reads it with pandas. Rollups keep
+counting archived reviews; full-text search only covers the live table.
+"""
+
+import argparse
+import os
+import sqlite3
+from datetime import date
+import pandas as pd
+from review_repository import add_to_rollups
+
+PARTITION_DIR = 'partitions'
+REVIEW_COLUMNS = ['review_id', 'bank_id', 'review_text', 'rating', 'review_date',
+                  'sentiment_label', 'sentiment_score', 'themes', 'source']
+
+# SQLite's default limit is 10 attached databases; leave room for callers
+MAX_ATTACHED = 8
+
+def month_bounds(month):
+    """'2025-06' -> ('2025-06-01', '2025-07-01'), end exclusive"""
+    year, mon = map(int, month.split('-'))
+    start = date(year, mon, 1)
+    end = date(year + mon // 12, mon % 12 + 1, 1)
+    return start.isoformat(), end.isoformat()
+
+def shift_month(month, offset):
+    year, mon = map(int, month.split('-'))
+    index = year * 12 + mon - 1 + offset
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+def overlaps(month, date_from=None, date_to=None):
+    start, end = month_bounds(month)
+    return (date_from is None or end > date_from) and (date_to is None or start <= date_to)
+
+def read_parquet_months(partitions, date_from=None, date_to=None, bank=None, columns=None):
+    """Read archived Parquet months, filtering rows the same way as the live query"""
+    filters = []
+    if date_from is not None:
+        filters.append(('review_date', '>=', date_from))
+    if date_to is not None:
+        filters.append(('review_date', '<=', date_to))
+    if bank is not None:
+        filters.append(('bank_name', '==', bank))
+    wanted = (columns or REVIEW_COLUMNS) + ['bank_name']
+
+    frames = [pd.read_parquet(location, columns=wanted, filters=filters or None)
+              for location in partitions]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=wanted)
+
+# ---------------------------------------------------------------- SQLite
+
+def create_partition_registry(conn):
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS review_partitions (
+        month TEXT PRIMARY KEY,
+        format TEXT NOT NULL CHECK (format IN ('sqlite', 'parquet')),
+        location TEXT NOT NULL,
+        row_count INTEGER NOT NULL,
+        archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    # "Last 30 days for DASHEN" is answered from this index on the live table
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_bank_date ON reviews(bank_id, review_date)')
+
+def archived_partitions(conn, date_from=None, date_to=None):
+    """(month, format, location) of the archived months overlapping a date range"""
+    create_partition_registry(conn)
+    rows = conn.execute('SELECT month, format, location FROM review_partitions ORDER BY month').fetchall()
+    return [row for row in rows if overlaps(row[0], date_from, date_to)]
+
+def _create_partition_tables(conn, schema):
+    conn.execute(f'''
+    CREATE TABLE IF NOT EXISTS {schema}.reviews (
+        review_id TEXT PRIMARY KEY,
+        bank_id INTEGER,
+        review_text TEXT NOT NULL,
+        rating INTEGER,
+        review_date DATE NOT NULL,
+        sentiment_label TEXT,
+        sentiment_score REAL,
+        themes TEXT,
+        source TEXT
+    )
+    ''')
+    conn.execute(f'''
+    CREATE TABLE IF NOT EXISTS {schema}.review_themes (
+        theme_id INTEGER NOT NULL,
+        review_id TEXT NOT NULL,
+        PRIMARY KEY (theme_id, review_id)
+    ) WITHOUT ROWID
+    ''')
+    conn.execute(f'CREATE INDEX IF NOT EXISTS {schema}.idx_bank_date ON reviews(bank_id, review_date)')
+
+def archive_month(conn, month, directory=PARTITION_DIR):
+    """Move one month of reviews out of the live table into its own database file"""
+    start, end = month_bounds(month)
+    os.makedirs(directory, exist_ok=True)
+    location = os.path.join(directory, f"reviews_{month.replace('-', '_')}.db")
+    columns = ', '.join(REVIEW_COLUMNS)
+
+    conn.commit()
+    conn.execute('ATTACH DATABASE ? AS part', (location,))
+    try:
+        _create_partition_tables(conn, 'part')
+        in_month = 'review_date >= ? AND review_date < ?'
+        conn.execute(f'''
+        INSERT OR REPLACE INTO part.reviews ({columns})
+        SELECT {columns} FROM main.reviews WHERE {in_month}
+        ''', (start, end))
+        conn.execute(f'''
+        INSERT OR IGNORE INTO part.review_themes (theme_id, review_id)
+        SELECT rt.theme_id, rt.review_id FROM main.review_themes rt
+        JOIN main.reviews r ON r.review_id = rt.review_id
+        WHERE r.{in_month}
+        ''', (start, end))
+
+        # The delete triggers take these reviews out of the rollups and the
+        # search index; put their rollup contribution straight back
+        moved = conn.execute(f'DELETE FROM main.reviews WHERE {in_month}', (start, end)).rowcount
+        add_to_rollups(conn, 1, 'part.reviews', 'part.review_themes')
+
+        total = conn.execute('SELECT COUNT(*) FROM part.reviews').fetchone()[0]
+        conn.execute('''
+        INSERT OR REPLACE INTO review_partitions (month, format, location, row_count)
+        VALUES (?, 'sqlite', ?, ?)
+        ''', (month, location, total))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.execute('DETACH DATABASE part')
+    return moved
+
+def archive_old_months(conn, keep_months=3, as_of=None, directory=PARTITION_DIR):
+    """Archive every month older than the newest keep_months (counted back from as_of)"""
+    create_partition_registry(conn)
+    if as_of is None:
+        as_of = conn.execute('SELECT MAX(review_date) FROM reviews').fetchone()[0]
+        if as_of is None:
+            return {}
+    cutoff = month_bounds(shift_month(as_of[:7], 1 - keep_months))[0]
+
+    months = [row[0] for row in conn.execute('''
+    SELECT DISTINCT substr(review_date, 1, 7) FROM reviews
+    WHERE review_date < ? ORDER BY 1
+    ''', (cutoff,))]
+    moved = {}
+    for month in months:
+        moved[month] = archive_month(conn, month, directory)
+        print(f"  📦 {month}: {moved[month]} reviews archived")
+    return moved
+
+def restore_month(conn, month):
+    """Move an archived month (database file) back into the live table"""
+    row = conn.execute('SELECT format, location FROM review_partitions WHERE month = ?',
+                       (month,)).fetchone()
+    if row is None:
+        raise ValueError(f"Month {month} is not archived")
+    if row[0] != 'sqlite':
+        raise ValueError(f"Month {month} is archived as {row[0]}; only database partitions can be restored")
+    location = row[1]
+    columns = ', '.join(REVIEW_COLUMNS)
+
+    conn.commit()
+    conn.execute('ATTACH DATABASE ? AS part', (location,))
+    try:
+        # The insert triggers add these reviews to the rollups again
+        add_to_rollups(conn, -1, 'part.reviews', 'part.review_themes')
+        restored = conn.execute(f'''
+        INSERT INTO main.reviews ({columns}) SELECT {columns} FROM part.reviews
+        ''').rowcount
+        conn.execute('''
+        INSERT OR IGNORE INTO main.review_themes (theme_id, review_id)
+        SELECT theme_id, review_id FROM part.review_themes
+        ''')
+        conn.execute('DELETE FROM review_partitions WHERE month = ?', (month,))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.execute('DETACH DATABASE part')
+    os.remove(location)
+    return restored
+
+def export_month_parquet(conn, month, directory=PARTITION_DIR):
+    """Convert an archived month from its database file to Parquet"""
+    row = conn.execute('SELECT format, location FROM review_partitions WHERE month = ?',
+                       (month,)).fetchone()
+    if row is None or row[0] != 'sqlite':
+        raise ValueError(f"Month {month} has no database partition to export")
+    location = os.path.join(directory, f"reviews_{month.replace('-', '_')}.parquet")
+
+    part = sqlite3.connect(row[1])
+    df = pd.read_sql_query(f"SELECT {', '.join(REVIEW_COLUMNS)} FROM reviews", part)
+    part.close()
+    bank_names = dict(conn.execute('SELECT bank_id, bank_name FROM banks').fetchall())
+    df['bank_name'] = df['bank_id'].map(bank_names)
+    df.to_parquet(location, index=False)
+
+    conn.execute("UPDATE review_partitions SET format = 'parquet', location = ? WHERE month = ?",
+                 (location, month))
+    conn.commit()
+    os.remove(row[1])
+    return location
+
+def query_reviews(conn, date_from=None, date_to=None, bank=None, columns=None):
+    """Partition router: reviews in [date_from, date_to] from the live table plus
+    only the archived months that overlap the range.
+
+    ATTACH is not allowed inside a transaction, so when month files have to be
+    attached the query runs on a separate connection to the same database and
+    conn's transaction is left alone (its uncommitted changes are not seen).
+    """
+    columns = columns or REVIEW_COLUMNS
+    conditions, params = [], []
+    if bank is not None:
+        conditions.append('b.bank_name = ?')
+        params.append(bank)
+    if date_from is not None:
+        conditions.append('r.review_date >= ?')
+        params.append(date_from)
+    if date_to is not None:
+        conditions.append('r.review_date <= ?')
+        params.append(date_to)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    select = ', '.join(f'r.{c}' for c in columns)
+
+    partitions = archived_partitions(conn, date_from, date_to)
+    attached = [location for _, fmt, location in partitions if fmt == 'sqlite']
+    parquet = [location for _, fmt, location in partitions if fmt == 'parquet']
+
+    frames = []
+    router = conn
+    if attached:
+        main_path = next(row[2] for row in conn.execute('PRAGMA database_list') if row[1] == 'main')
+        router = sqlite3.connect(main_path)
+    try:
+        # The first batch also carries the live table
+        batches = [attached[i:i + MAX_ATTACHED] for i in range(0, len(attached), MAX_ATTACHED)] or [[]]
+        for batch_number, batch in enumerate(batches):
+            sources = ['main.reviews'] if batch_number == 0 else []
+            for i, location in enumerate(batch):
+                router.execute(f'ATTACH DATABASE ? AS p{i}', (location,))
+                sources.append(f'p{i}.reviews')
+            try:
+                union = '\nUNION ALL\n'.join(f"SELECT {', '.join(REVIEW_COLUMNS)} FROM {s}" for s in sources)
+                router.execute(f'CREATE TEMP VIEW reviews_all AS {union}')
+                frames.append(pd.read_sql_query(f'''
+                SELECT {select}, b.bank_name FROM reviews_all r
+                LEFT JOIN main.banks b ON r.bank_id = b.bank_id {where}
+                ''', router, params=params))
+            finally:
+                router.execute('DROP VIEW IF EXISTS temp.reviews_all')
+                for i in range(len(batch)):
+                    router.execute(f'DETACH DATABASE p{i}')
+    finally:
+        if router is not conn:
+            router.close()
+
+    if parquet:
+        frames.append(read_parquet_months(parquet, date_from, date_to, bank, columns))
+    return pd.concat(frames, ignore_index=True)
+
+# ---------------------------------------------------------------- PostgreSQL
+
+PG_PARTITIONED_REVIEWS = '''
+CREATE TABLE reviews (
+    review_id TEXT NOT NULL,
+    bank_id INTEGER,
+    review_text TEXT NOT NULL,
+    rating SMALLINT CHECK (rating BETWEEN 1 AND 5),
+    review_date DATE NOT NULL,
+    sentiment_label TEXT,
+    sentiment_score REAL,
+    themes TEXT,
+    source TEXT DEFAULT 'Google Play'
+) PARTITION BY RANGE (review_date)
+'''
+
+# Unique keys on a partitioned table must include the partition key
+PG_PARTITIONED_CONSTRAINTS = [
+    'ALTER TABLE reviews ADD CONSTRAINT reviews_pkey PRIMARY KEY (review_id, review_date)',
+    'ALTER TABLE reviews ADD CONSTRAINT reviews_bank_id_fkey FOREIGN KEY (bank_id) REFERENCES banks (bank_id)',
+    'CREATE INDEX IF NOT EXISTS idx_reviews_bank_date ON reviews (bank_id, review_date)',
+    'CREATE INDEX IF NOT EXISTS idx_reviews_rating ON reviews (rating)',
+    'CREATE INDEX IF NOT EXISTS idx_reviews_sentiment ON reviews (sentiment_label)',
+]
+
+PG_ARCHIVE_REGISTRY = '''
+CREATE TABLE IF NOT EXISTS review_partitions (
+    month TEXT PRIMARY KEY,
+    format TEXT NOT NULL,
+    location TEXT NOT NULL,
+    row_count INTEGER NOT NULL,
+    archived_at TIMESTAMPTZ NOT NULL DEFAULT now()
+)
+'''
+
+def pg_partition_name(month):
+    return f"reviews_y{month[:4]}m{month[5:7]}"
+
+def pg_is_partitioned(pg_cursor):
+    pg_cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('reviews')")
+    return pg_cursor.fetchone() is not None
+
+def pg_conflict_key(pg_cursor):
+    """Upsert target for reviews: the partitioned primary key includes review_date"""
+    return 'review_id, review_date' if pg_is_partitioned(pg_cursor) else 'review_id'
+
+def pg_ensure_partitions(pg_cursor, first_month, last_month):
+    """Create the monthly partitions from first_month through last_month"""
+    month = first_month
+    while month <= last_month:
+        start, end = month_bounds(month)
+        pg_cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS {pg_partition_name(month)} PARTITION OF reviews
+        FOR VALUES FROM ('{start}') TO ('{end}')
+        ''')
+        month = shift_month(month, 1)
+
+def pg_partition_reviews(pg_conn, months_ahead=3):
+    """Convert reviews into a monthly partitioned table (or just add upcoming months)"""
+    cursor = pg_conn.cursor()
+    cursor.execute(PG_ARCHIVE_REGISTRY)
+    ahead = shift_month(date.today().isoformat()[:7], months_ahead)
+
+    if pg_is_partitioned(cursor):
+        cursor.execute("SELECT to_char(MAX(review_date), 'YYYY-MM') FROM reviews")
+        latest = cursor.fetchone()[0] or date.today().isoformat()[:7]
+        pg_ensure_partitions(cursor, latest, max(ahead, latest))
+        pg_conn.commit()
+        return 0
+
+    cursor.execute('SELECT COUNT(*) FROM reviews WHERE review_date IS NULL')
+    if cursor.fetchone()[0]:
+        raise RuntimeError("Reviews without a review_date cannot be placed in a monthly partition")
+    cursor.execute("SELECT to_char(MIN(review_date), 'YYYY-MM'), to_char(MAX(review_date), 'YYYY-MM') FROM reviews")
+    first, last = cursor.fetchone()
+    today = date.today().isoformat()[:7]
+    first, last = first or today, last or today
+
+    # One transaction: rename, create partitions, copy, swap
+    cursor.execute('ALTER TABLE reviews RENAME TO reviews_unpartitioned')
+    cursor.execute('ALTER TABLE reviews_unpartitioned DROP CONSTRAINT IF EXISTS reviews_pkey CASCADE')
+    for index in ['idx_reviews_bank_id', 'idx_reviews_rating', 'idx_reviews_sentiment', 'idx_reviews_date']:
+        cursor.execute(f'DROP INDEX IF EXISTS {index}')
+    cursor.execute(PG_PARTITIONED_REVIEWS)
+    pg_ensure_partitions(cursor, first, max(ahead, last))
+    cursor.execute('CREATE TABLE IF NOT EXISTS reviews_default PARTITION OF reviews DEFAULT')
+    cursor.execute('INSERT INTO reviews SELECT * FROM reviews_unpartitioned')
+    copied = cursor.rowcount
+    cursor.execute('DROP TABLE reviews_unpartitioned CASCADE')
+    for statement in PG_PARTITIONED_CONSTRAINTS:
+        cursor.execute(statement)
+    cursor.execute('ANALYZE reviews')
+    pg_conn.commit()
+    return copied
+
+def pg_archive_month(pg_conn, month, directory=PARTITION_DIR):
+    """Detach one monthly partition, write it to Parquet and drop it"""
+    name = pg_partition_name(month)
+    location = os.path.join(directory, f"reviews_{month.replace('-', '_')}.parquet")
+    os.makedirs(directory, exist_ok=True)
+
+    cursor = pg_conn.cursor()
+    cursor.execute(PG_ARCHIVE_REGISTRY)
+    cursor.execute(f'ALTER TABLE reviews DETACH PARTITION {name}')
+    df = pd.read_sql_query(f'''
+    SELECT {', '.join(f'p.{c}' for c in REVIEW_COLUMNS)}, b.bank_name
+    FROM {name} p LEFT JOIN banks b ON p.bank_id = b.bank_id
+    ''', pg_conn)
+    df['review_date'] = df['review_date'].astype(str)
+    df.to_parquet(location, index=False)
+
+    cursor.execute(f'DROP TABLE {name}')
+    cursor.execute('''
+    INSERT INTO review_partitions (month, format, location, row_count) VALUES (%s, 'parquet', %s, %s)
+    ON CONFLICT (month) DO UPDATE SET location = EXCLUDED.location, row_count = EXCLUDED.row_count
+    ''', (month, location, len(df)))
+    pg_conn.commit()
+    return len(df)
+
+def pg_archived_partitions(pg_cursor, date_from=None, date_to=None):
+    pg_cursor.execute("SELECT to_regclass('review_partitions')")
+    if pg_cursor.fetchone()[0] is None:
+        return []
+    pg_cursor.execute('SELECT month, format, location FROM review_partitions ORDER BY month')
+    return [row for row in pg_cursor.fetchall() if overlaps(row[0], date_from, date_to)]
+
+def main():
+    parser = argparse.ArgumentParser(description="Monthly partitions for the reviews table")
+    parser.add_argument('--db', default='bank_reviews_complete.db', help="SQLite database")
+    parser.add_argument('--dsn', help="Work on this PostgreSQL database instead of SQLite")
+    parser.add_argument('--dir', default=PARTITION_DIR, help="Where partition files are written")
+    parser.add_argument('--partition', action='store_true',
+                        help="PostgreSQL: convert reviews to monthly partitions / add upcoming months")
+    parser.add_argument('--keep-months', type=int,
+                        help="SQLite: archive everything older than the newest N months")
+    parser.add_argument('--archive', metavar='YYYY-MM', action='append', default=[],
+                        help="Archive one month (PostgreSQL: straight to Parquet)")
+    parser.add_argument('--to-parquet', metavar='YYYY-MM', action='append', default=[],
+                        help="SQLite: convert an archived month to Parquet")
+    parser.add_argument('--restore', metavar='YYYY-MM', action='append', default=[],
+                        help="SQLite: move an archived month back into the live table")
+    args = parser.parse_args()
+
+    if args.dsn:
+        import psycopg2
+
+        pg_conn = psycopg2.connect(args.dsn)
+        if args.partition:
+            copied = pg_partition_reviews(pg_conn)
+            print(f"✅ reviews is partitioned by month ({copied} rows moved)")
+        for month in args.archive:
+            print(f"📦 {month}: {pg_archive_month(pg_conn, month, args.dir)} reviews archived to Parquet")
+        pg_conn.close()
+        return
+
+    conn = sqlite3.connect(args.db)
+    create_partition_registry(conn)
+    if args.keep_months is not None:
+        archive_old_months(conn, args.keep_months, directory=args.dir)
+    for month in args.archive:
+        print(f"📦 {month}: {archive_month(conn, month, args.dir)} reviews archived")
+    for month in args.to_parquet:
+        print(f"🗄️ {month}: exported to {export_month_parquet(conn, month, args.dir)}")
+    for month in args.restore:
+        print(f"↩️ {month}: {restore_month(conn, month)} reviews restored")
+
+    live = conn.execute('SELECT COUNT(*) FROM reviews').fetchone()[0]
+    print(f"\nLive reviews: {live}")
+    for month, fmt, location in archived_partitions(conn):
+        print(f"  {month}  {fmt:<8} {location}")
+    conn.close()
+
+if __name__ == "__main__":
+    main()
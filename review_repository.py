@@ -0,0 +1,794 @@
+"""
+Single storage layer for the banks and reviews tables.
+
+The backend comes from a database URL: the BANK_REVIEWS_DB_URL environment
+variable when set (so the whole pipeline can be pointed at another store in
+one place), otherwise each script's own default.
+
+- sqlite:///path/to/file.db   -> SQLiteRepository
+- postgresql://user:pw@host/db -> PostgresRepository
+
+The SQLite schema (theme tables, FTS index and the trigger-maintained
+rollups) is defined here too; database_sqlite.py and review_partitions.py
+build on it.
+
+Repositories are cached per URL for the life of the process and keep a pool
+of open connections, so stages reuse connections (and their prepared
+statement caches) instead of reconnecting for every step.
+"""
+
+import os
+import queue
+import threading
+import weakref
+from contextlib import contextmanager
+import pandas as pd
+
+DB_URL_ENV = 'BANK_REVIEWS_DB_URL'
+DEFAULT_URL = 'sqlite:///bank_reviews_complete.db'
+
+REVIEW_COLUMNS = ['review_id', 'bank_id', 'review_text', 'rating', 'review_date',
+                  'sentiment_label', 'sentiment_score', 'themes', 'source']
+
+# Columns a re-scoring run may change on an existing review
+UPDATE_COLUMNS = ['sentiment_label', 'sentiment_score', 'themes']
+
+# review_ids left out of a write because their month is archived
+SKIPPED_ARCHIVED_FILE = 'skipped_archived_reviews.csv'
+
+DEFAULT_BANKS = [
+    (1, 'CBE', 'CBEBirr Plus'),
+    (2, 'BOA', 'Commercial Bank Mobile'),
+    (3, 'DASHEN', 'Dashen Mobile'),
+]
+
+_repositories = {}
+_lock = threading.Lock()
+
+def get_repository(url=None, default=DEFAULT_URL, pool_size=4):
+    """Return the shared repository for url (or $BANK_REVIEWS_DB_URL, or default)"""
+    url = url or os.environ.get(DB_URL_ENV) or default
+    with _lock:
+        repo = _repositories.get(url)
+        if repo is None:
+            if url.startswith('sqlite:///'):
+                repo = SQLiteRepository(url[len('sqlite:///'):], pool_size)
+            elif url.startswith(('postgresql://', 'postgres://')):
+                repo = PostgresRepository(url, pool_size)
+            else:
+                raise ValueError(f"Unsupported database URL: {url}")
+            _repositories[url] = repo
+    return repo
+
+def split_archived(df, archived_months, skip_archived=False):
+    """Separate rows whose month is archived (and frozen) from the writable ones.
+
+    Archived rows raise ValueError unless skip_archived is set; skipped
+    review_ids are written to SKIPPED_ARCHIVED_FILE. Returns (writable rows,
+    number skipped).
+    """
+    months = df['date'].astype(str).str[:7]
+    frozen = months.isin(archived_months)
+    if not frozen.any():
+        return df, 0
+    skipped = sorted(months[frozen].unique())
+    if not skip_archived:
+        raise ValueError(f"{int(frozen.sum())} reviews fall in archived months {', '.join(skipped)}; "
+                         f"restore those months (review_partitions.py --restore) or skip them")
+    pd.DataFrame({'review_id': df.loc[frozen, 'review_id'], 'month': months[frozen]}).to_csv(
+        SKIPPED_ARCHIVED_FILE, index=False)
+    print(f"⚠️ Skipped {int(frozen.sum())} reviews in archived months {', '.join(skipped)} "
+          f"(review_ids in {SKIPPED_ARCHIVED_FILE})")
+    return df[~frozen], int(frozen.sum())
+
+def close_all():
+    for repo in list(_repositories.values()):
+        repo.close()
+    _repositories.clear()
+
+def review_records(df, bank_id_map):
+    """Turn an analyzed pipeline frame into plain tuples in REVIEW_COLUMNS order"""
+    frame = pd.DataFrame({
+        'review_id': df['review_id'],
+        'bank_id': df['bank'].map(bank_id_map),
+        'review_text': df['review_text'].astype(str),
+        'rating': df['rating'],
+        'review_date': df['date'],
+        'sentiment_label': df['sentiment_label'],
+        'sentiment_score': df['sentiment_score'],
+        'themes': df['themes'] if 'themes' in df else None,
+        'source': df['source'] if 'source' in df else 'Google Play',
+    })
+    # Plain Python values (None for missing) that DB drivers can bind
+    frame = frame.astype(object).where(frame.notna(), None)
+    return frame.itertuples(index=False, name=None)
+
+class SQLiteRepository:
+    """SQLite backend with a small pool of reusable connections"""
+
+    backend = 'sqlite'
+
+    def __init__(self, path, pool_size=4):
+        self.path = path
+        self._pool = queue.LifoQueue()
+        for _ in range(pool_size):
+            self._pool.put(None)  # connections are opened on first use
+
+    def _connect(self):
+        import sqlite3
+
+        # A large statement cache keeps the repeated queries prepared
+        conn = sqlite3.connect(self.path, check_same_thread=False, cached_statements=256)
+        conn.execute('PRAGMA foreign_keys = ON')
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Borrow a pooled connection; commits on success, rolls back on error"""
+        conn = self._pool.get()
+        if conn is None:
+            conn = self._connect()
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self._pool.put(conn)
+
+    def close(self):
+        """Close the idle connections; the pool reopens them on next use"""
+        size = self._pool.qsize()
+        for _ in range(size):
+            conn = self._pool.get_nowait()
+            if conn is not None:
+                conn.close()
+            self._pool.put(None)
+
+    def read_banks(self):
+        with self.connection() as conn:
+            return pd.read_sql_query('SELECT bank_id, bank_name, app_name FROM banks ORDER BY bank_id', conn)
+
+    def bank_id_map(self):
+        with self.connection() as conn:
+            rows = conn.execute('SELECT bank_name, bank_id FROM banks').fetchall()
+        return dict(rows) or {name: bank_id for bank_id, name, _ in DEFAULT_BANKS}
+
+    def write_banks(self, banks=DEFAULT_BANKS):
+        """Upsert (bank_id, bank_name, app_name) rows"""
+        with self.connection() as conn:
+            conn.executemany('''
+            INSERT INTO banks (bank_id, bank_name, app_name) VALUES (?, ?, ?)
+            ON CONFLICT(bank_id) DO UPDATE SET bank_name = excluded.bank_name, app_name = excluded.app_name
+            ''', banks)
+
+    def read_reviews(self, columns=None, bank=None, date_from=None, date_to=None):
+        """Reviews joined to their bank name, optionally filtered.
+
+        Goes through the partition router, so archived months that overlap
+        the date range are included and the others are never opened.
+        """
+        from review_partitions import query_reviews
+
+        with self.connection() as conn:
+            return query_reviews(conn, date_from, date_to, bank, columns)
+
+    def ensure_schema(self):
+        with self.connection() as conn:
+            create_sqlite_schema(conn)
+
+    def _has_table(self, conn, name):
+        return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                            (name,)).fetchone() is not None
+
+    def count_reviews(self):
+        """All reviews, archived months included (read from the rollup when present)"""
+        with self.connection() as conn:
+            if self._has_table(conn, 'review_rollup'):
+                return conn.execute('SELECT IFNULL(SUM(review_count), 0) FROM review_rollup').fetchone()[0]
+            return conn.execute('SELECT COUNT(*) FROM reviews').fetchone()[0]
+
+    def review_counts_by_bank(self):
+        with self.connection() as conn:
+            if self._has_table(conn, 'review_rollup'):
+                return conn.execute('''
+                SELECT b.bank_name, SUM(ru.review_count) FROM review_rollup ru
+                JOIN banks b ON ru.bank_id = b.bank_id
+                GROUP BY b.bank_name
+                ''').fetchall()
+            return conn.execute('''
+            SELECT b.bank_name, COUNT(*) FROM reviews r
+            JOIN banks b ON r.bank_id = b.bank_id
+            GROUP BY b.bank_name
+            ''').fetchall()
+
+    def review_counts_by_sentiment(self):
+        """(sentiment_label, count) pairs; reviews without a label count under None"""
+        with self.connection() as conn:
+            if self._has_table(conn, 'review_rollup'):
+                return conn.execute('''
+                SELECT NULLIF(sentiment_label, ''), SUM(review_count) FROM review_rollup
+                GROUP BY sentiment_label
+                ''').fetchall()
+            return conn.execute('''
+            SELECT sentiment_label, COUNT(*) FROM reviews GROUP BY sentiment_label
+            ''').fetchall()
+
+    def bank_summary(self):
+        """(bank_name, review count, average rating) per bank"""
+        with self.connection() as conn:
+            if self._has_table(conn, 'review_rollup'):
+                return conn.execute('''
+                SELECT b.bank_name, SUM(ru.review_count), SUM(ru.rating_sum) * 1.0 / SUM(ru.rated_count)
+                FROM review_rollup ru
+                JOIN banks b ON ru.bank_id = b.bank_id
+                GROUP BY b.bank_name
+                ''').fetchall()
+            return conn.execute('''
+            SELECT b.bank_name, COUNT(*), AVG(r.rating) FROM reviews r
+            JOIN banks b ON r.bank_id = b.bank_id
+            GROUP BY b.bank_name
+            ''').fetchall()
+
+    def write_reviews(self, df, batch_size=50_000, skip_archived=False):
+        """Bulk-upsert an analyzed frame; returns inserted/updated/unchanged counts.
+
+        Also keeps the review_themes links, FTS index and rollups current.
+        Rows in archived months raise ValueError unless skip_archived is set.
+        """
+        from review_partitions import archived_partitions
+
+        bank_id_map = self.bank_id_map()
+        with self.connection() as conn:
+            # Archived months are frozen; restore a month to change its reviews
+            archived = {month for month, _, _ in archived_partitions(conn)}
+            df, skipped = split_archived(df, archived, skip_archived)
+
+            tune_for_bulk_load(conn)
+            create_sqlite_schema(conn)
+            counts = sqlite_bulk_upsert(conn, review_records(df, bank_id_map), batch_size)
+            if 'themes' in df:
+                counts['theme_links'] = sync_review_themes(conn, df['review_id'], df['themes'])
+        counts['archived'] = skipped
+        return counts
+
+def create_sqlite_schema(conn):
+    """Create the banks and reviews tables with their indexes, theme tables, FTS index and rollups"""
+    cursor = conn.cursor()
+    
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS banks (
+        bank_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        bank_name TEXT NOT NULL,
+        app_name TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS reviews (
+        review_id TEXT PRIMARY KEY,
+        bank_id INTEGER,
+        review_text TEXT NOT NULL,
+        rating INTEGER CHECK (rating >= 1 AND rating <= 5),
+        review_date DATE NOT NULL,
+        sentiment_label TEXT,
+        sentiment_score REAL,
+        themes TEXT,
+        source TEXT DEFAULT 'Google Play',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (bank_id) REFERENCES banks (bank_id)
+    )
+    ''')
+    
+    # Create indexes for better query performance
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_bank_id ON reviews(bank_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_rating ON reviews(rating)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_sentiment ON reviews(sentiment_label)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_date ON reviews(review_date)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_bank_date ON reviews(bank_id, review_date)')
+    
+    create_theme_tables(conn)
+    create_search_index(conn)
+    create_rollup_tables(conn)
+    conn.commit()
+
+def create_theme_tables(conn):
+    """Create the normalized themes dimension and review_themes junction table"""
+    cursor = conn.cursor()
+    
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS themes (
+        theme_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        theme_name TEXT NOT NULL UNIQUE
+    )
+    ''')
+    
+    # Keyed by theme first so "all reviews for a theme" is a range scan of
+    # the table itself; the second index covers the per-review direction
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS review_themes (
+        theme_id INTEGER NOT NULL,
+        review_id TEXT NOT NULL,
+        PRIMARY KEY (theme_id, review_id),
+        FOREIGN KEY (theme_id) REFERENCES themes (theme_id),
+        FOREIGN KEY (review_id) REFERENCES reviews (review_id)
+    ) WITHOUT ROWID
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_review_themes_review ON review_themes(review_id, theme_id)')
+    
+    conn.commit()
+
+def split_themes(themes):
+    """Turn a comma-joined themes string into a list ('Other' means none)"""
+    if themes is None or (isinstance(themes, float) and pd.isna(themes)):
+        return []
+    return [t.strip() for t in str(themes).split(',') if t.strip() and t.strip() != 'Other']
+
+def sync_review_themes(conn, review_ids, theme_lists):
+    """Replace the review_themes rows of the given reviews with their new theme lists"""
+    cursor = conn.cursor()
+    review_ids = list(review_ids)
+    theme_lists = [split_themes(t) if not isinstance(t, list) else t for t in theme_lists]
+    
+    # Make sure every theme has an id
+    names = sorted({theme for themes in theme_lists for theme in themes})
+    cursor.executemany('INSERT OR IGNORE INTO themes (theme_name) VALUES (?)', [(n,) for n in names])
+    
+    cursor.execute('DROP TABLE IF EXISTS temp.theme_sync')
+    cursor.execute('CREATE TEMP TABLE theme_sync (review_id TEXT, theme_name TEXT)')
+    cursor.executemany('INSERT INTO theme_sync VALUES (?, ?)',
+                       [(review_id, None) for review_id in review_ids])
+    cursor.executemany('INSERT INTO theme_sync VALUES (?, ?)',
+                       [(review_id, theme)
+                        for review_id, themes in zip(review_ids, theme_lists)
+                        for theme in themes])
+    
+    cursor.execute('''
+    DELETE FROM review_themes
+    WHERE review_id IN (SELECT review_id FROM theme_sync)
+    ''')
+    cursor.execute('''
+    INSERT OR IGNORE INTO review_themes (theme_id, review_id)
+    SELECT t.theme_id, s.review_id
+    FROM theme_sync s JOIN themes t ON t.theme_name = s.theme_name
+    ''')
+    linked = cursor.rowcount
+    cursor.execute('DROP TABLE temp.theme_sync')
+    return linked
+
+def create_search_index(conn):
+    """Create the FTS5 index over reviews.review_text, kept in sync by triggers"""
+    cursor = conn.cursor()
+    exists = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'reviews_fts'"
+    ).fetchone()
+    
+    # External-content table: the text lives only in reviews
+    cursor.execute('''
+    CREATE VIRTUAL TABLE IF NOT EXISTS reviews_fts USING fts5(
+        review_text,
+        content='reviews',
+        content_rowid='rowid',
+        tokenize='porter unicode61'
+    )
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS reviews_fts_insert AFTER INSERT ON reviews BEGIN
+        INSERT INTO reviews_fts(rowid, review_text) VALUES (new.rowid, new.review_text);
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS reviews_fts_delete AFTER DELETE ON reviews BEGIN
+        INSERT INTO reviews_fts(reviews_fts, rowid, review_text) VALUES ('delete', old.rowid, old.review_text);
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS reviews_fts_update AFTER UPDATE OF review_text ON reviews BEGIN
+        INSERT INTO reviews_fts(reviews_fts, rowid, review_text) VALUES ('delete', old.rowid, old.review_text);
+        INSERT INTO reviews_fts(rowid, review_text) VALUES (new.rowid, new.review_text);
+    END
+    ''')
+    
+    # Index whatever was already in reviews before the table existed
+    if not exists:
+        cursor.execute("INSERT INTO reviews_fts(reviews_fts) VALUES ('rebuild')")
+    
+    conn.commit()
+
+# Rollup dimensions; NULLs are folded to '' / 0 so they can be part of a primary key
+ROLLUP_KEY = {
+    'bank_id': 'IFNULL({row}.bank_id, 0)',
+    'review_day': "IFNULL({row}.review_date, '')",
+    'sentiment_label': "IFNULL({row}.sentiment_label, '')",
+    'rating': 'IFNULL({row}.rating, 0)',
+}
+
+def _rollup_upsert(row, sign):
+    """Trigger statement adding (sign=+1) or removing (-1) one review from review_rollup"""
+    keys = ', '.join(ROLLUP_KEY)
+    values = ', '.join(expr.format(row=row) for expr in ROLLUP_KEY.values())
+    return f'''
+        INSERT INTO review_rollup ({keys}, review_count, rated_count, rating_sum, score_sum)
+        VALUES ({values}, {sign}, {sign} * ({row}.rating IS NOT NULL),
+                {sign} * IFNULL({row}.rating, 0), {sign} * IFNULL({row}.sentiment_score, 0))
+        ON CONFLICT ({keys}) DO UPDATE SET
+            review_count = review_count + excluded.review_count,
+            rated_count = rated_count + excluded.rated_count,
+            rating_sum = rating_sum + excluded.rating_sum,
+            score_sum = score_sum + excluded.score_sum;'''
+
+def _theme_rollup_upsert(review, sign, source, theme='rt.theme_id'):
+    """Trigger statement adding/removing review-theme links in theme_rollup"""
+    keys = ', '.join(ROLLUP_KEY)
+    values = ', '.join(expr.format(row=review) for expr in ROLLUP_KEY.values())
+    return f'''
+        INSERT INTO theme_rollup ({keys}, theme_id, review_count)
+        SELECT {values}, {theme}, {sign}
+        {source}
+        ON CONFLICT ({keys}, theme_id) DO UPDATE SET
+            review_count = review_count + excluded.review_count;'''
+
+def create_rollup_tables(conn):
+    """Create the aggregate rollups behind run_queries, maintained by triggers"""
+    cursor = conn.cursor()
+    exists = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'review_rollup'"
+    ).fetchone()
+    
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS review_rollup (
+        bank_id INTEGER NOT NULL,
+        review_day TEXT NOT NULL,
+        sentiment_label TEXT NOT NULL,
+        rating INTEGER NOT NULL,
+        review_count INTEGER NOT NULL,
+        rated_count INTEGER NOT NULL,
+        rating_sum INTEGER NOT NULL,
+        score_sum REAL NOT NULL,
+        PRIMARY KEY (bank_id, review_day, sentiment_label, rating)
+    ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS theme_rollup (
+        bank_id INTEGER NOT NULL,
+        review_day TEXT NOT NULL,
+        sentiment_label TEXT NOT NULL,
+        rating INTEGER NOT NULL,
+        theme_id INTEGER NOT NULL,
+        review_count INTEGER NOT NULL,
+        PRIMARY KEY (bank_id, review_day, sentiment_label, rating, theme_id)
+    ) WITHOUT ROWID
+    ''')
+    
+    empty_groups = '''
+        DELETE FROM review_rollup WHERE review_count = 0;
+        DELETE FROM theme_rollup WHERE review_count = 0;'''
+    own_themes = 'FROM review_themes rt WHERE rt.review_id = {row}.review_id'
+    
+    cursor.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS rollup_review_insert AFTER INSERT ON reviews BEGIN
+        {_rollup_upsert('new', 1)}
+    END
+    ''')
+    cursor.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS rollup_review_update
+    AFTER UPDATE OF bank_id, review_date, sentiment_label, rating, sentiment_score ON reviews BEGIN
+        {_rollup_upsert('old', -1)}
+        {_rollup_upsert('new', 1)}
+        {_theme_rollup_upsert('old', -1, own_themes.format(row='old'))}
+        {_theme_rollup_upsert('new', 1, own_themes.format(row='new'))}
+        {empty_groups}
+    END
+    ''')
+    cursor.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS rollup_review_delete AFTER DELETE ON reviews BEGIN
+        {_rollup_upsert('old', -1)}
+        {_theme_rollup_upsert('old', -1, own_themes.format(row='old'))}
+        DELETE FROM review_themes WHERE review_id = old.review_id;
+        {empty_groups}
+    END
+    ''')
+    
+    # Theme links are added after their review, so read its dimensions from
+    # reviews (a link whose review was just deleted matches nothing)
+    linked_review = 'FROM reviews r WHERE r.review_id = {row}.review_id'
+    cursor.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS rollup_theme_insert AFTER INSERT ON review_themes BEGIN
+        {_theme_rollup_upsert('r', 1, linked_review.format(row='new'), 'new.theme_id')}
+    END
+    ''')
+    cursor.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS rollup_theme_delete AFTER DELETE ON review_themes BEGIN
+        {_theme_rollup_upsert('r', -1, linked_review.format(row='old'), 'old.theme_id')}
+        {empty_groups}
+    END
+    ''')
+    
+    if not exists:
+        rebuild_rollups(conn)
+    
+    conn.commit()
+
+def add_to_rollups(conn, sign=1, reviews='reviews', review_themes='review_themes'):
+    """Add (sign=+1) or subtract (-1) every review in a table, and its theme links, in both rollups.
+
+    Used when reviews move between the live table and an archive partition
+    without their rollup contribution changing.
+    """
+    keys = ', '.join(ROLLUP_KEY)
+    values = ', '.join(expr.format(row='r') for expr in ROLLUP_KEY.values())
+    cursor = conn.cursor()
+    cursor.execute(f'''
+    INSERT INTO review_rollup ({keys}, review_count, rated_count, rating_sum, score_sum)
+    SELECT {values}, {sign} * COUNT(*), {sign} * COUNT(r.rating),
+           {sign} * IFNULL(SUM(r.rating), 0), {sign} * IFNULL(SUM(r.sentiment_score), 0)
+    FROM {reviews} r
+    GROUP BY {values}
+    ON CONFLICT ({keys}) DO UPDATE SET
+        review_count = review_count + excluded.review_count,
+        rated_count = rated_count + excluded.rated_count,
+        rating_sum = rating_sum + excluded.rating_sum,
+        score_sum = score_sum + excluded.score_sum
+    ''')
+    cursor.execute(f'''
+    INSERT INTO theme_rollup ({keys}, theme_id, review_count)
+    SELECT {values}, rt.theme_id, {sign} * COUNT(*)
+    FROM {review_themes} rt JOIN {reviews} r ON r.review_id = rt.review_id
+    GROUP BY {values}, rt.theme_id
+    ON CONFLICT ({keys}, theme_id) DO UPDATE SET
+        review_count = review_count + excluded.review_count
+    ''')
+    cursor.execute('DELETE FROM review_rollup WHERE review_count = 0')
+    cursor.execute('DELETE FROM theme_rollup WHERE review_count = 0')
+
+def rebuild_rollups(conn):
+    """Recompute both rollups from scratch (first creation or repair)"""
+    cursor = conn.cursor()
+    cursor.execute('DELETE FROM review_rollup')
+    cursor.execute('DELETE FROM theme_rollup')
+    add_to_rollups(conn)
+
+def tune_for_bulk_load(conn):
+    """Pragmas for a large write: WAL journal, relaxed fsync, big page cache"""
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA synchronous = NORMAL')
+    conn.execute('PRAGMA cache_size = -262144')  # 256 MB
+    conn.execute('PRAGMA temp_store = MEMORY')
+
+def sqlite_bulk_upsert(conn, records, batch_size=50_000):
+    """Upsert review tuples into reviews in one set-based statement.
+
+    Rows are staged in a temp table with batched executemany, classified as
+    inserted / updated / unchanged with joins, then applied with a single
+    INSERT ... ON CONFLICT(review_id) DO UPDATE. Returns the three counts.
+    """
+    columns = ', '.join(REVIEW_COLUMNS)
+    placeholders = ', '.join('?' * len(REVIEW_COLUMNS))
+    insert_staged = f'INSERT OR REPLACE INTO review_sync ({columns}) VALUES ({placeholders})'
+
+    conn.execute('DROP TABLE IF EXISTS temp.review_sync')
+    conn.execute('''
+    CREATE TEMP TABLE review_sync (
+        review_id TEXT PRIMARY KEY,
+        bank_id INTEGER,
+        review_text TEXT,
+        rating INTEGER,
+        review_date DATE,
+        sentiment_label TEXT,
+        sentiment_score REAL,
+        themes TEXT,
+        source TEXT
+    )
+    ''')
+
+    cursor = conn.cursor()
+    batch = []
+    staged = 0
+    for row in records:
+        batch.append(row)
+        if len(batch) == batch_size:
+            cursor.executemany(insert_staged, batch)
+            staged += len(batch)
+            batch = []
+            print(f"  Staged {staged}...")
+    if batch:
+        cursor.executemany(insert_staged, batch)
+
+    changed = ' OR '.join(f'r.{c} IS NOT s.{c}' for c in UPDATE_COLUMNS)
+    inserted = cursor.execute('''
+    SELECT COUNT(*) FROM review_sync s
+    WHERE NOT EXISTS (SELECT 1 FROM reviews r WHERE r.review_id = s.review_id)
+    ''').fetchone()[0]
+    updated = cursor.execute(f'''
+    SELECT COUNT(*) FROM review_sync s JOIN reviews r ON r.review_id = s.review_id
+    WHERE {changed}
+    ''').fetchone()[0]
+    unchanged = cursor.execute('SELECT COUNT(*) FROM review_sync').fetchone()[0] - inserted - updated
+
+    # "WHERE true" disambiguates the upsert clause from a join constraint
+    set_clause = ', '.join(f'{c} = excluded.{c}' for c in UPDATE_COLUMNS)
+    only_changed = ' OR '.join(f'reviews.{c} IS NOT excluded.{c}' for c in UPDATE_COLUMNS)
+    cursor.execute(f'''
+    INSERT INTO reviews ({columns})
+    SELECT {columns} FROM review_sync WHERE true
+    ON CONFLICT(review_id) DO UPDATE SET {set_clause}
+    WHERE {only_changed}
+    ''')
+
+    conn.execute('DROP TABLE temp.review_sync')
+    return {'inserted': inserted, 'updated': updated, 'unchanged': unchanged}
+
+class PostgresRepository:
+    """PostgreSQL backend on a psycopg2 threaded connection pool"""
+
+    backend = 'postgresql'
+
+    # Server-side prepared statements, created once per pooled connection
+    PREPARED = {
+        'count_reviews': 'SELECT COUNT(*) FROM reviews',
+        'review_counts_by_bank': '''
+            SELECT b.bank_name, COUNT(*) FROM reviews r
+            JOIN banks b ON r.bank_id = b.bank_id
+            GROUP BY b.bank_name''',
+        'bank_ids': 'SELECT bank_name, bank_id FROM banks',
+        'review_counts_by_sentiment': 'SELECT sentiment_label, COUNT(*) FROM reviews GROUP BY sentiment_label',
+        'bank_summary': '''
+            SELECT b.bank_name, COUNT(*), AVG(r.rating) FROM reviews r
+            JOIN banks b ON r.bank_id = b.bank_id
+            GROUP BY b.bank_name''',
+    }
+
+    def __init__(self, dsn, pool_size=4):
+        from psycopg2.pool import ThreadedConnectionPool
+
+        self.dsn = dsn
+        self._pool = ThreadedConnectionPool(1, pool_size, dsn)
+        # Held weakly, so a closed and collected connection can't leave a
+        # stale entry behind for a new one that reuses its id()
+        self._prepared = weakref.WeakSet()
+
+    @contextmanager
+    def connection(self):
+        """Borrow a pooled connection; commits on success, rolls back on error"""
+        conn = self._pool.getconn()
+        try:
+            self._prepare(conn)
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self._pool.putconn(conn)
+
+    def _prepare(self, conn):
+        if conn in self._prepared:
+            return
+        with conn.cursor() as cursor:
+            for name, sql in self.PREPARED.items():
+                cursor.execute(f'PREPARE {name} AS {sql}')
+        conn.commit()
+        self._prepared.add(conn)
+
+    def _execute_prepared(self, name):
+        with self.connection() as conn, conn.cursor() as cursor:
+            cursor.execute(f'EXECUTE {name}')
+            return cursor.fetchall()
+
+    def close(self):
+        self._pool.closeall()
+        self._prepared.clear()
+        with _lock:
+            if _repositories.get(self.dsn) is self:
+                del _repositories[self.dsn]
+
+    def ensure_schema(self):
+        from migrate_to_postgres import SCHEMA, CONSTRAINTS, has_constraint
+
+        with self.connection() as conn, conn.cursor() as cursor:
+            cursor.execute(SCHEMA)
+            if not has_constraint(cursor, 'reviews_pkey'):
+                for statement in CONSTRAINTS:
+                    cursor.execute(statement)
+
+    def read_banks(self):
+        with self.connection() as conn:
+            return pd.read_sql_query('SELECT bank_id, bank_name, app_name FROM banks ORDER BY bank_id', conn)
+
+    def bank_id_map(self):
+        rows = self._execute_prepared('bank_ids')
+        return dict(rows) or {name: bank_id for bank_id, name, _ in DEFAULT_BANKS}
+
+    def write_banks(self, banks=DEFAULT_BANKS):
+        self.ensure_schema()
+        with self.connection() as conn, conn.cursor() as cursor:
+            cursor.executemany('''
+            INSERT INTO banks (bank_id, bank_name, app_name) VALUES (%s, %s, %s)
+            ON CONFLICT (bank_id) DO UPDATE SET bank_name = EXCLUDED.bank_name, app_name = EXCLUDED.app_name
+            ''', banks)
+
+    def read_reviews(self, columns=None, bank=None, date_from=None, date_to=None):
+        columns = columns or REVIEW_COLUMNS
+        conditions, params = [], []
+        if bank is not None:
+            conditions.append('b.bank_name = %s')
+            params.append(bank)
+        if date_from is not None:
+            conditions.append('r.review_date >= %s')
+            params.append(date_from)
+        if date_to is not None:
+            conditions.append('r.review_date <= %s')
+            params.append(date_to)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        select = ', '.join(f'r.{c}' for c in columns)
+        from review_partitions import pg_archived_partitions, read_parquet_months
+
+        # review_date bounds let the planner prune the monthly partitions
+        with self.connection() as conn:
+            live = pd.read_sql_query(f'''
+            SELECT {select}, b.bank_name FROM reviews r
+            LEFT JOIN banks b ON r.bank_id = b.bank_id {where}
+            ''', conn, params=params)
+            with conn.cursor() as cursor:
+                archived = [location for _, _, location in
+                            pg_archived_partitions(cursor, date_from, date_to)]
+        if not archived:
+            return live
+        return pd.concat([live, read_parquet_months(archived, date_from, date_to, bank, columns)],
+                         ignore_index=True)
+
+    def count_reviews(self):
+        return self._execute_prepared('count_reviews')[0][0]
+
+    def review_counts_by_bank(self):
+        return self._execute_prepared('review_counts_by_bank')
+
+    def review_counts_by_sentiment(self):
+        return self._execute_prepared('review_counts_by_sentiment')
+
+    def bank_summary(self):
+        return self._execute_prepared('bank_summary')
+
+    def write_reviews(self, df, batch_size=50_000, skip_archived=False):
+        """COPY into a staging table and upsert on review_id; returns counts.
+
+        Rows in archived months raise ValueError unless skip_archived is set.
+        """
+        from migrate_to_postgres import copy_rows
+        from review_partitions import pg_archived_partitions, pg_conflict_key
+
+        self.ensure_schema()
+        bank_id_map = self.bank_id_map()
+        with self.connection() as conn, conn.cursor() as cursor:
+            conflict_key = pg_conflict_key(cursor)
+            archived = {month for month, _, _ in pg_archived_partitions(cursor)}
+        # Archived months live in Parquet now and are not rewritten
+        df, skipped = split_archived(df, archived, skip_archived)
+        columns = ', '.join(REVIEW_COLUMNS)
+        set_clause = ', '.join(f'{c} = EXCLUDED.{c}' for c in UPDATE_COLUMNS)
+        differs = ' OR '.join(f'reviews.{c} IS DISTINCT FROM EXCLUDED.{c}' for c in UPDATE_COLUMNS)
+
+        with self.connection() as conn, conn.cursor() as cursor:
+            cursor.execute('CREATE TEMP TABLE IF NOT EXISTS review_sync (LIKE reviews INCLUDING DEFAULTS)')
+            cursor.execute('TRUNCATE review_sync')
+            staged = copy_rows(cursor, 'review_sync', REVIEW_COLUMNS, review_records(df, bank_id_map))
+
+            cursor.execute('''
+            SELECT COUNT(*) FROM review_sync s
+            WHERE NOT EXISTS (SELECT 1 FROM reviews r WHERE r.review_id = s.review_id)
+            ''')
+            inserted = cursor.fetchone()[0]
+
+            cursor.execute(f'''
+            INSERT INTO reviews ({columns})
+            SELECT {columns} FROM review_sync
+            ON CONFLICT ({conflict_key}) DO UPDATE SET {set_clause}
+            WHERE {differs}
+            ''')
+            written = cursor.rowcount
+            cursor.execute('TRUNCATE review_sync')
+
+        return {'inserted': inserted, 'updated': written - inserted,
+                'unchanged': staged - written, 'archived': skipped}
@@ -1,6 +1,10 @@
-from google_play_scraper import reviews_all
+import argparse
+import sqlite3
 import pandas as pd
 from datetime import datetime
+from instrumentation import measure
+from pipeline_storage import read_stage, write_stage, append_stage, stage_exists, stage_path
+from scrape_scheduler import scrape_apps, GooglePlayBackend, ReplayBackend, CHECKPOINT_DIR
 
 # CORRECT Bank app IDs from our search
 apps = {
@@ -9,50 +13,169 @@ apps = {
     'DASHEN': 'com.cr2.amolelight'    # Dashen Mobile
 }
 
-def scrape_bank_reviews():
+WATERMARK_DB = 'bank_reviews.db'
+
+def open_watermarks(db_path=WATERMARK_DB):
+    """Open the database holding the last-seen review per app"""
+    conn = sqlite3.connect(db_path)
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS scrape_watermarks (
+        app_id TEXT PRIMARY KEY,
+        bank TEXT NOT NULL,
+        last_review_id TEXT NOT NULL,
+        last_review_at TEXT NOT NULL,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    conn.commit()
+    return conn
+
+def get_watermark(conn, app_id):
+    """Return (last_review_id, last_review_at) for an app, or None on first run"""
+    row = conn.execute(
+        'SELECT last_review_id, last_review_at FROM scrape_watermarks WHERE app_id = ?',
+        (app_id,)
+    ).fetchone()
+    if row is None:
+        return None
+    return row[0], datetime.fromisoformat(row[1])
+
+def set_watermark(conn, app_id, bank, review):
+    conn.execute('''
+    INSERT INTO scrape_watermarks (app_id, bank, last_review_id, last_review_at, updated_at)
+    VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+    ON CONFLICT(app_id) DO UPDATE SET
+        last_review_id = excluded.last_review_id,
+        last_review_at = excluded.last_review_at,
+        updated_at = CURRENT_TIMESTAMP
+    ''', (app_id, bank, review['reviewId'], review['at']))
+    conn.commit()
+
+def to_row(review, bank):
+    return {
+        'review_id': review['reviewId'],
+        'review_text': review['content'],
+        'rating': review['score'],
+        'date': review['at'][:10],
+        'bank': bank,
+        'source': 'Google Play'
+    }
+
+def scrape_bank_reviews(max_reviews=400, incremental=False, backend=None,
+                        workers=3, rate=2.0, checkpoint_dir=CHECKPOINT_DIR):
+    """Fetch reviews for every app.
+
+    Returns (reviews, new_watermarks, checkpoints) where new_watermarks maps
+    bank -> newest fetched review. Nothing is recorded here: once the reviews
+    are safely stored the caller saves the watermarks with save_watermarks()
+    and clears the checkpoints.
+    """
     all_reviews = []
-    
-    for bank, app_id in apps.items():
-        try:
-            print(f"Scraping reviews for {bank}...")
-            
-            # Scrape reviews with Ethiopia country
-            reviews = reviews_all(
-                app_id,
-                lang='en',
-                country='et',  # Ethiopia
-                sleep_milliseconds=100
-            )
-            
-            print(f"Found {len(reviews)} reviews for {bank}")
-            
-            # Take first 400 reviews (or all if less)
-            for review in reviews[:400]:
-                all_reviews.append({
-                    'review_id': review['reviewId'],
-                    'review_text': review['content'],
-                    'rating': review['score'],
-                    'date': review['at'].strftime('%Y-%m-%d'),
-                    'bank': bank,
-                    'source': 'Google Play'
-                })
-                
-        except Exception as e:
-            print(f"Error scraping {bank}: {e}")
-    
-    return pd.DataFrame(all_reviews)
-
-# Run scraping
-print("Starting review scraping...")
-df = scrape_bank_reviews()
-
-if len(df) > 0:
-    print(f"Successfully scraped {len(df)} total reviews")
-    print(f"Reviews per bank:")
-    print(df['bank'].value_counts())
-
-    # Save to CSV
-    df.to_csv('bank_reviews_raw.csv', index=False)
-    print("Saved to bank_reviews_raw.csv")
-else:
-    print("No reviews were scraped. Please check the app IDs.")
\ No newline at end of file
+    new_watermarks = {}
+
+    watermarks = {}
+    if incremental:
+        conn = open_watermarks()
+        for bank, app_id in apps.items():
+            watermark = get_watermark(conn, app_id)
+            if watermark:
+                watermarks[app_id] = watermark
+                print(f"Scraping new reviews for {bank} since {watermark[1]:%Y-%m-%d %H:%M}...")
+            else:
+                print(f"Scraping reviews for {bank}...")
+        conn.close()
+    else:
+        print(f"Scraping up to {max_reviews} reviews for {', '.join(apps)}...")
+
+    # Apps with a watermark take everything newer than it; the first run for
+    # an app (no watermark yet) is still capped at max_reviews
+    results, errors, checkpoints = scrape_apps(apps, backend=backend, max_reviews=max_reviews,
+                                               watermarks=watermarks, workers=workers, rate=rate,
+                                               checkpoint_dir=checkpoint_dir)
+
+    for bank, fetched in results.items():
+        print(f"Found {len(fetched)} reviews for {bank}")
+
+        for review in fetched:
+            all_reviews.append(to_row(review, bank))
+
+        # Newest-first, so the first review is the new watermark
+        if fetched:
+            new_watermarks[bank] = fetched[0]
+
+    for bank, error in errors.items():
+        print(f"Error scraping {bank}: {error}")
+
+    return pd.DataFrame(all_reviews), new_watermarks, checkpoints
+
+def save_watermarks(new_watermarks):
+    """Record each bank's newest stored review as its app's watermark"""
+    conn = open_watermarks()
+    for bank, review in new_watermarks.items():
+        set_watermark(conn, apps[bank], bank, review)
+    conn.close()
+
+def drop_stored_reviews(df):
+    """Reviews whose review_id is not already in the raw data"""
+    if not stage_exists('raw') or df.empty:
+        return df
+    stored = read_stage('raw', columns=['review_id'])['review_id']
+    return df[~df['review_id'].isin(stored)]
+
+def main():
+    parser = argparse.ArgumentParser(description="Scrape Google Play reviews for the bank apps")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Only fetch reviews newer than each app's watermark and append them to the raw data")
+    parser.add_argument('--max-reviews', type=int, default=400,
+                        help="Reviews per app for a full (non-incremental) scrape")
+    parser.add_argument('--workers', type=int, default=3,
+                        help="Apps fetched concurrently")
+    parser.add_argument('--rate', type=float, default=2.0,
+                        help="Shared request budget in pages per second")
+    parser.add_argument('--checkpoint-dir', default=CHECKPOINT_DIR,
+                        help="Where in-progress pages are saved for resuming")
+    parser.add_argument('--replay', metavar='DIR',
+                        help="Replay recorded pages from DIR instead of calling Google Play")
+    args = parser.parse_args()
+
+    backend = ReplayBackend(args.replay) if args.replay else GooglePlayBackend()
+
+    # Run scraping
+    print("Starting review scraping...")
+    with measure('scrape', incremental=args.incremental, workers=args.workers) as step:
+        df, new_watermarks, checkpoints = scrape_bank_reviews(
+            max_reviews=args.max_reviews, incremental=args.incremental, backend=backend,
+            workers=args.workers, rate=args.rate, checkpoint_dir=args.checkpoint_dir)
+        if args.incremental:
+            # Apps without a watermark yet re-fetch reviews the raw data may hold;
+            # same-timestamp reviews around a watermark can repeat too
+            fetched = len(df)
+            df = drop_stored_reviews(df)
+            if fetched > len(df):
+                print(f"Skipped {fetched - len(df)} reviews already in {stage_path('raw')}")
+        step.rows_out = len(df)
+
+    if len(df) > 0:
+        print(f"Successfully scraped {len(df)} total reviews")
+        print(f"Reviews per bank:")
+        print(df['bank'].value_counts())
+
+        # Save raw reviews (appending new reviews in incremental mode)
+        if args.incremental and stage_exists('raw'):
+            append_stage('raw', df)
+            print(f"Appended to {stage_path('raw')}")
+        else:
+            write_stage('raw', df)
+            print(f"Saved to {stage_path('raw')}")
+    elif args.incremental:
+        print("No new reviews since the last scrape.")
+    else:
+        print("No reviews were scraped. Please check the app IDs.")
+
+    # Only now that the reviews are stored may the next run start after them
+    save_watermarks(new_watermarks)
+    for checkpoint in checkpoints.values():
+        checkpoint.clear()
+
+if __name__ == "__main__":
+    main()
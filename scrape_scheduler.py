@@ -0,0 +1,235 @@
+"""
+Concurrent review fetch scheduler.
+Runs several apps at once on a thread pool under a shared token-bucket rate
+limit, retries failed pages with exponential backoff and checkpoints every
+page to disk so an interrupted run resumes where it stopped. The fetch
+backend is pluggable: GooglePlayBackend talks to the store, ReplayBackend
+replays recorded pages (including a previous run's checkpoints) offline.
+"""
+
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+CHECKPOINT_DIR = 'scrape_checkpoints'
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` requests per second, bursts up to `capacity`"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1, int(rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+def call_with_retry(fn, limiter=None, retries=4, base_delay=1.0, label='request'):
+    """Call fn() under the rate limiter, retrying with exponential backoff and jitter"""
+    for attempt in range(retries + 1):
+        if limiter is not None:
+            limiter.acquire()
+        try:
+            return fn()
+        except Exception as e:
+            if attempt == retries:
+                raise
+            delay = base_delay * 2 ** attempt * (1 + random.random() / 2)
+            print(f"  ⚠️ {label} failed ({e}), retrying in {delay:.1f}s...")
+            time.sleep(delay)
+
+class GooglePlayBackend:
+    """Fetch pages of reviews from Google Play, newest first"""
+
+    def __init__(self, lang='en', country='et'):
+        self.lang = lang
+        self.country = country
+
+    def fetch_page(self, app_id, token, count):
+        """Return (reviews, next_token); tokens are JSON-serializable dicts"""
+        from google_play_scraper import reviews, Sort
+        from google_play_scraper.features.reviews import _ContinuationToken
+
+        continuation = None
+        if token is not None:
+            saved = dict(token, sort=Sort(token['sort']))
+            continuation = _ContinuationToken(**saved)
+
+        page, continuation = reviews(
+            app_id,
+            lang=self.lang,
+            country=self.country,
+            sort=Sort.NEWEST,
+            count=count,
+            continuation_token=continuation
+        )
+
+        page = [{
+            'reviewId': review['reviewId'],
+            'content': review['content'],
+            'score': review['score'],
+            'at': review['at'].isoformat(),
+        } for review in page]
+
+        next_token = None
+        if page and continuation is not None and continuation.token is not None:
+            # _ContinuationToken uses __slots__, so there is no __dict__ to copy
+            next_token = {s: getattr(continuation, s) for s in type(continuation).__slots__}
+            next_token['sort'] = next_token['sort'].value
+        return page, next_token
+
+class ReplayBackend:
+    """Replay recorded pages from <directory>/<app_id>/page_NNNN.json (no network)"""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def fetch_page(self, app_id, token, count):
+        page_number = token or 0
+        path = os.path.join(self.directory, app_id, f'page_{page_number:04d}.json')
+        if not os.path.exists(path):
+            return [], None
+        with open(path, encoding='utf-8') as f:
+            page = json.load(f)['reviews']
+        next_path = os.path.join(self.directory, app_id, f'page_{page_number + 1:04d}.json')
+        return page, (page_number + 1 if os.path.exists(next_path) else None)
+
+class AppCheckpoint:
+    """Per-app page files plus a state file holding the next continuation token"""
+
+    def __init__(self, checkpoint_dir, app_id):
+        self.directory = os.path.join(checkpoint_dir, app_id)
+        self.state_path = os.path.join(self.directory, 'state.json')
+        os.makedirs(self.directory, exist_ok=True)
+
+    def load(self):
+        """Return (pages, next_token, done) saved by an earlier run"""
+        if not os.path.exists(self.state_path):
+            return [], None, False
+        with open(self.state_path, encoding='utf-8') as f:
+            state = json.load(f)
+        pages = []
+        for page_number in range(state['pages']):
+            with open(self._page_path(page_number), encoding='utf-8') as f:
+                pages.append(json.load(f)['reviews'])
+        return pages, state['next_token'], state['done']
+
+    def save_page(self, page_number, page, next_token, done):
+        with open(self._page_path(page_number), 'w', encoding='utf-8') as f:
+            json.dump({'reviews': page}, f)
+        # Write the state last so a crash mid-page only repeats that page
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'pages': page_number + 1, 'next_token': next_token, 'done': done}, f)
+        os.replace(tmp_path, self.state_path)
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            os.remove(os.path.join(self.directory, name))
+        os.rmdir(self.directory)
+
+    def _page_path(self, page_number):
+        return os.path.join(self.directory, f'page_{page_number:04d}.json')
+
+def _reached_watermark(review, watermark):
+    """Stop at the watermark review itself.
+
+    The timestamp is only a fallback for when that review has been deleted,
+    and it stops strictly before the watermark time: reviews sharing its
+    timestamp are kept, and the caller drops the ones it already stored.
+    """
+    if watermark is None:
+        return False
+    last_id, last_at = watermark
+    if review['reviewId'] == last_id:
+        return True
+    return datetime.fromisoformat(review['at']) < last_at
+
+def fetch_app(backend, app_id, limiter, max_reviews=None, watermark=None,
+              checkpoint_dir=CHECKPOINT_DIR, page_size=200):
+    """Fetch one app's reviews newest first, checkpointing every page"""
+    checkpoint = AppCheckpoint(checkpoint_dir, app_id)
+    pages, token, done = checkpoint.load()
+    if pages:
+        print(f"  ↻ {app_id}: resuming after {len(pages)} checkpointed pages")
+
+    fetched = []
+    for page in pages:
+        fetched.extend(page)
+
+    while not done:
+        remaining = None if max_reviews is None else max_reviews - len(fetched)
+        if remaining is not None and remaining <= 0:
+            break
+        count = page_size if remaining is None else min(page_size, remaining)
+
+        page, token = call_with_retry(
+            lambda: backend.fetch_page(app_id, token, count),
+            limiter=limiter, label=f"{app_id} page {len(pages)}"
+        )
+
+        kept = []
+        for review in page:
+            if _reached_watermark(review, watermark):
+                done = True
+                break
+            kept.append(review)
+
+        done = done or not page or token is None
+        checkpoint.save_page(len(pages), kept, token, done)
+        pages.append(kept)
+        fetched.extend(kept)
+
+    if max_reviews is not None:
+        fetched = fetched[:max_reviews]
+    return fetched, checkpoint
+
+def scrape_apps(apps, backend=None, max_reviews=None, watermarks=None, workers=4,
+                rate=2.0, checkpoint_dir=CHECKPOINT_DIR):
+    """Fetch several apps concurrently.
+
+    apps maps bank -> app_id. Apps with a watermark are fetched back to it
+    without a cap; the others stop at max_reviews. Returns (results, errors,
+    checkpoints) where results maps bank -> list of reviews, errors maps
+    bank -> exception and checkpoints maps bank -> AppCheckpoint of each
+    fetched app. The caller clears those checkpoints once the reviews are
+    stored; failed apps keep theirs so the next run resumes.
+    """
+    backend = backend or GooglePlayBackend()
+    watermarks = watermarks or {}
+    limiter = TokenBucket(rate)
+    results, errors, checkpoints = {}, {}, {}
+
+    def run(bank, app_id):
+        watermark = watermarks.get(app_id)
+        return fetch_app(backend, app_id, limiter,
+                         max_reviews=None if watermark else max_reviews,
+                         watermark=watermark,
+                         checkpoint_dir=checkpoint_dir)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {bank: pool.submit(run, bank, app_id) for bank, app_id in apps.items()}
+        for bank, future in futures.items():
+            try:
+                results[bank], checkpoints[bank] = future.result()
+                print(f"✅ {bank}: {len(results[bank])} reviews")
+            except Exception as e:
+                errors[bank] = e
+                print(f"❌ {bank}: {e} (progress checkpointed in {checkpoint_dir}/)")
+
+    return results, errors, checkpoints
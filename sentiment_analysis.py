@@ -1,98 +1,115 @@
-import pandas as pd
-from transformers import pipeline
-import spacy
-from collections import Counter
-import re
-
-print("Loading models... This may take a minute...")
-
-# Load models
-sentiment_pipeline = pipeline("sentiment-analysis", 
-                             model="distilbert-base-uncased-finetuned-sst-2-english")
-nlp = spacy.load("en_core_web_sm")
-
-def analyze_sentiment(text):
-    try:
-        # Limit text length for the model
-        clean_text = str(text)[:512]
-        result = sentiment_pipeline(clean_text)[0]
-        return result['label'], result['score']
-    except:
-        return 'NEUTRAL', 0.5
-
-def extract_keywords(text):
-    doc = nlp(str(text).lower())
-    keywords = []
-    
-    for token in doc:
-        if (not token.is_stop and not token.is_punct and 
-            token.is_alpha and len(token.text) > 2):
-            keywords.append(token.lemma_)
-    
-    return keywords
-
-# Define theme categories
-theme_keywords = {
-    'Login Issues': ['login', 'password', 'authenticate', 'access', 'account', 'sign'],
-    'Transaction Problems': ['transfer', 'transaction', 'payment', 'send', 'money', 'bill'],
-    'App Performance': ['slow', 'crash', 'freeze', 'lag', 'loading', 'bug', 'error'],
-    'User Interface': ['interface', 'design', 'layout', 'button', 'navigation', 'ui', 'ux'],
-    'Customer Support': ['support', 'help', 'service', 'contact', 'response', 'assistance'],
-    'Security': ['secure', 'security', 'safe', 'privacy', 'protection'],
-    'Features': ['feature', 'function', 'option', 'tool', 'capability']
-}
+import argparse
+import os
+from sentiment_cache import SentimentCache, cached_scores
+from theme_matcher import ThemeMatcher
+from theme_keywords import THEME_KEYWORDS
+from pipeline_storage import read_stage, write_stage, stage_path
+from instrumentation import measure, record_rows
+from near_duplicates import score_per_cluster
+# Models load on first use, so importing assign_theme from here stays cheap
+from sentiment_models import (MODEL_NAME, BACKENDS, BACKEND_ENV, model_version,
+                              analyze_sentiment_batch)
+
+# Theme categories
+theme_keywords = THEME_KEYWORDS
+
+theme_matcher = ThemeMatcher(theme_keywords)
 
 def assign_theme(text):
-    text_lower = str(text).lower()
-    themes = []
-    
-    for theme, keywords in theme_keywords.items():
-        if any(keyword in text_lower for keyword in keywords):
-            themes.append(theme)
-    
-    return ', '.join(themes) if themes else 'Other'
-
-# Load cleaned data
-print("Loading data...")
-df = pd.read_csv('bank_reviews_clean.csv')
-
-# Analyze sentiment for first 100 reviews (to save time initially)
-print("Analyzing sentiment...")
-sample_size = min(100, len(df))  # Start with 100 for testing
-
-sentiments = []
-scores = []
-
-for i, review in enumerate(df['review_text'].head(sample_size)):
-    if i % 20 == 0:
-        print(f"Processed {i}/{sample_size} reviews...")
-    label, score = analyze_sentiment(review)
-    sentiments.append(label)
-    scores.append(score)
-
-# Add sentiment to the sample
-df_sample = df.head(sample_size).copy()
-df_sample['sentiment_label'] = sentiments
-df_sample['sentiment_score'] = scores
-
-# Extract themes for all reviews
-print("Extracting themes...")
-df['themes'] = df['review_text'].apply(assign_theme)
-
-# Save results
-df_sample.to_csv('bank_reviews_analyzed_sample.csv', index=False)
-df.to_csv('bank_reviews_with_themes.csv', index=False)
-
-print("\n=== ANALYSIS COMPLETE ===")
-print(f"Sentiment analysis done for {sample_size} reviews")
-print(f"Theme extraction done for all {len(df)} reviews")
-
-print(f"\nSentiment Distribution (Sample):")
-print(df_sample['sentiment_label'].value_counts())
-
-print(f"\nTop Themes (All Reviews):")
-print(df['themes'].value_counts().head(10))
-
-print(f"\nFiles saved:")
-print("- bank_reviews_analyzed_sample.csv (with sentiment)")
-print("- bank_reviews_with_themes.csv (with themes)")
\ No newline at end of file
+    return theme_matcher.assign(text)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="DistilBERT sentiment and theme analysis")
+    parser.add_argument('--batch-size', type=int, default=32,
+                        help="Reviews per padded inference batch")
+    parser.add_argument('--threads', type=int, default=None,
+                        help="Torch CPU threads (default: torch decides)")
+    parser.add_argument('--backend', choices=BACKENDS, default=None,
+                        help=f"Inference backend (default: ${BACKEND_ENV} or torch); "
+                             f"check it first with sentiment_models.py --parity")
+    parser.add_argument('--sample-size', type=int, default=None,
+                        help="Only score the first N reviews (default: all)")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="Re-score every review instead of reusing cached results")
+    parser.add_argument('--per-cluster', action='store_true',
+                        help="Score one review per near-duplicate cluster (needs preprocess.py --near-duplicates)")
+    parser.add_argument('--no-themes', action='store_true',
+                        help="Only score sentiment; leave theme tagging to tag_themes.py")
+    return parser.parse_args()
+
+def analyze(args):
+    # Load cleaned data
+    print("Loading data...")
+    columns = ['review_id', 'review_text'] + (['cluster_id'] if args.per_cluster else [])
+    df = read_stage('clean', columns=columns)
+    record_rows(rows_in=len(df))
+
+    # Analyze sentiment in batches for all reviews (or a sample if requested)
+    print("Analyzing sentiment...")
+    sample_size = len(df) if args.sample_size is None else min(args.sample_size, len(df))
+
+    df_sample = df.head(sample_size).copy()
+
+    def score_rows(texts):
+        return analyze_sentiment_batch(texts, batch_size=args.batch_size,
+                                       num_threads=args.threads)
+
+    def score_texts(texts):
+        if args.no_cache:
+            return score_rows(texts)
+        cache = SentimentCache(MODEL_NAME, model_version())
+        results = cached_scores(cache, texts, score_rows)
+        cache.close()
+        return results
+
+    with measure('score', rows_in=len(df_sample), rows_out=len(df_sample)):
+        if args.per_cluster:
+            sentiments, scores = score_per_cluster(df_sample['review_text'],
+                                                   df_sample['cluster_id'], score_texts)
+        else:
+            sentiments, scores = score_texts(df_sample['review_text'])
+
+    # Add sentiment to the sample
+    df_sample['sentiment_label'] = sentiments
+    df_sample['sentiment_score'] = scores
+
+    # Save results
+    with measure('write', rows_out=len(df_sample)):
+        write_stage('sample', df_sample, ['sentiment_label', 'sentiment_score'])
+
+    if not args.no_themes:
+        # Extract themes for all reviews
+        print("Extracting themes...")
+        with measure('themes', rows_in=len(df), rows_out=len(df)):
+            df['themes'] = theme_matcher.tag(df['review_text'])
+            write_stage('themes', df, ['themes'])
+    record_rows(rows_out=len(df_sample))
+
+    print("\n=== ANALYSIS COMPLETE ===")
+    print(f"Sentiment analysis done for {sample_size} reviews")
+
+    print(f"\nSentiment Distribution (Sample):")
+    print(df_sample['sentiment_label'].value_counts())
+    unscored = df_sample['sentiment_label'].isna().sum()
+    if unscored:
+        print(f"⚠️ {unscored} reviews could not be scored (sentiment_label left empty)")
+
+    print(f"\nFiles saved:")
+    print(f"- {stage_path('sample')} (with sentiment)")
+
+    if not args.no_themes:
+        print(f"- {stage_path('themes')} (with themes)")
+        print(f"\nTheme extraction done for all {len(df)} reviews")
+        print(f"\nTop Themes (All Reviews):")
+        print(df['themes'].value_counts().head(10))
+
+def main():
+    args = parse_args()
+    if args.backend:
+        os.environ[BACKEND_ENV] = args.backend
+    backend = os.environ.get(BACKEND_ENV, 'torch')
+    with measure('distilbert', batch_size=args.batch_size, threads=args.threads, backend=backend):
+        analyze(args)
+
+if __name__ == "__main__":
+    main()
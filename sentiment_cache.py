@@ -0,0 +1,147 @@
+"""
+Persistent sentiment result cache shared by the TextBlob and DistilBERT scorers.
+Results are keyed by (model id, model version, normalized text hash) and kept
+in a small SQLite file next to bank_reviews.db, so re-runs only score new text.
+"""
+
+import hashlib
+import re
+import sqlite3
+import time
+from instrumentation import annotate
+
+CACHE_DB = 'sentiment_cache.db'
+DEFAULT_MAX_ENTRIES = 500_000
+# Parallel pipeline steps share the cache file; wait this long for a lock
+BUSY_TIMEOUT_MS = 30_000
+
+def normalize_text(text):
+    """Collapse whitespace so trivially re-formatted reviews share one entry"""
+    return re.sub(r'\s+', ' ', str(text)).strip()
+
+def text_hash(text):
+    """Stable hash of the normalized review text"""
+    return hashlib.sha1(normalize_text(text).encode('utf-8')).hexdigest()
+
+class SentimentCache:
+    """SQLite-backed (model, version, text) -> (label, score) cache with LRU eviction"""
+
+    def __init__(self, model_id, model_version, path=CACHE_DB,
+                 max_entries=DEFAULT_MAX_ENTRIES):
+        self.model_id = model_id
+        self.model_version = str(model_version)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        self.conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000)
+        # WAL lets readers in the other scorer keep going while one writes
+        self.conn.execute('PRAGMA journal_mode = WAL')
+        self.conn.execute(f'PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}')
+        self.conn.execute('''
+        CREATE TABLE IF NOT EXISTS sentiment_cache (
+            model_id TEXT NOT NULL,
+            model_version TEXT NOT NULL,
+            text_hash TEXT NOT NULL,
+            sentiment_label TEXT NOT NULL,
+            sentiment_score REAL NOT NULL,
+            last_used REAL NOT NULL,
+            PRIMARY KEY (model_id, model_version, text_hash)
+        )
+        ''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_cache_last_used ON sentiment_cache(last_used)')
+        self.conn.commit()
+
+    def get_many(self, hashes):
+        """Look up many text hashes, returning {hash: (label, score)} for the hits"""
+        hashes = list(dict.fromkeys(hashes))
+        found = {}
+        cursor = self.conn.cursor()
+
+        # Stay well under SQLite's bound-parameter limit
+        for start in range(0, len(hashes), 500):
+            chunk = hashes[start:start + 500]
+            placeholders = ','.join('?' * len(chunk))
+            cursor.execute(f'''
+            SELECT text_hash, sentiment_label, sentiment_score
+            FROM sentiment_cache
+            WHERE model_id = ? AND model_version = ? AND text_hash IN ({placeholders})
+            ''', (self.model_id, self.model_version, *chunk))
+            for h, label, score in cursor.fetchall():
+                found[h] = (label, score)
+
+        if found:
+            now = time.time()
+            cursor.executemany('''
+            UPDATE sentiment_cache SET last_used = ?
+            WHERE model_id = ? AND model_version = ? AND text_hash = ?
+            ''', [(now, self.model_id, self.model_version, h) for h in found])
+            self.conn.commit()
+
+        self.hits += len(found)
+        self.misses += len(hashes) - len(found)
+        return found
+
+    def put_many(self, results):
+        """Store {hash: (label, score)} and evict the least recently used overflow"""
+        now = time.time()
+        self.conn.executemany('''
+        INSERT OR REPLACE INTO sentiment_cache
+        (model_id, model_version, text_hash, sentiment_label, sentiment_score, last_used)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ''', [(self.model_id, self.model_version, h, label, float(score), now)
+              for h, (label, score) in results.items()])
+        self.evict()
+        self.conn.commit()
+
+    def evict(self):
+        """Drop the least recently used entries beyond max_entries"""
+        total = self.conn.execute('SELECT COUNT(*) FROM sentiment_cache').fetchone()[0]
+        overflow = total - self.max_entries
+        if overflow > 0:
+            self.conn.execute('''
+            DELETE FROM sentiment_cache WHERE rowid IN (
+                SELECT rowid FROM sentiment_cache ORDER BY last_used LIMIT ?
+            )
+            ''', (overflow,))
+        return max(overflow, 0)
+
+    def stats(self):
+        total = self.hits + self.misses
+        hit_rate = self.hits / total * 100 if total else 0.0
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': round(hit_rate, 1)}
+
+    def close(self):
+        self.conn.close()
+
+def cached_scores(cache, texts, score_fn):
+    """Score texts through the cache, calling score_fn only for unseen text.
+
+    score_fn takes a list of texts and returns (labels, scores) in the same
+    order. Repeated texts within one run are scored once.
+    """
+    texts = [str(text) for text in texts]
+    hashes = [text_hash(text) for text in texts]
+    results = cache.get_many(hashes)
+
+    # One representative text per missing hash
+    missing = {}
+    for h, text in zip(hashes, texts):
+        if h not in results and h not in missing:
+            missing[h] = text
+
+    if missing:
+        labels, scores = score_fn(list(missing.values()))
+        new_results = dict(zip(missing.keys(), zip(labels, scores)))
+        # Reviews the scorer failed on (label None) are retried next run, not cached
+        cache.put_many({h: result for h, result in new_results.items() if result[0] is not None})
+        results.update(new_results)
+
+    stats = cache.stats()
+    annotate(cache_hits=stats['hits'], cache_misses=stats['misses'], texts_scored=len(missing))
+    print(f"Sentiment cache: {stats['hits']} hits, {stats['misses']} misses "
+          f"({stats['hit_rate']}% hit rate), {len(missing)} texts scored")
+
+    labels = [results[h][0] for h in hashes]
+    scores = [results[h][1] for h in hashes]
+    return labels, scores
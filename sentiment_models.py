@@ -0,0 +1,538 @@
+"""
+DistilBERT sentiment, spaCy keyword and sentence embedding models, loaded on first use.
+
+Importing this module costs nothing: transformers, torch and spacy are only
+imported when a model is first needed, and each model is then built once
+per process and shared by every thread. Scripts that only tag themes never
+load a model.
+
+A warm worker keeps the models loaded across runs:
+
+    python sentiment_models.py --serve            # leave running
+    export BANK_REVIEWS_MODEL_WORKER=127.0.0.1:6071
+    python sentiment_analysis.py                  # scores through the worker
+
+When BANK_REVIEWS_MODEL_WORKER is set and the worker answers, scoring and
+keyword calls go to it. Otherwise the models are loaded in-process as usual.
+Clients authenticate with BANK_REVIEWS_MODEL_WORKER_KEY, or else with the
+random key the worker writes to .model_worker_key (mode 0600) at startup.
+The worker only listens on a non-loopback address when the key is set
+explicitly.
+
+BANK_REVIEWS_SENTIMENT_BACKEND picks how DistilBERT runs on CPU:
+- torch (default): fp32 PyTorch, the reference labels
+- quantized: int8 dynamic quantization of the Linear layers (torch only)
+- onnx: an ONNX Runtime graph exported once to models/ (needs optimum[onnxruntime])
+
+Check a backend against fresh fp32 torch labels on the analyzed sample before using it:
+
+    python sentiment_models.py --parity --backend quantized
+"""
+
+import argparse
+import ipaddress
+import os
+import secrets
+import socket
+import sys
+import threading
+import time
+from collections import Counter
+from instrumentation import measure, annotate, current_rss_mb
+
+MODEL_NAME = "distilbert-base-uncased-finetuned-sst-2-english"
+KEYWORD_MODEL = "en_core_web_sm"
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+BACKEND_ENV = 'BANK_REVIEWS_SENTIMENT_BACKEND'
+BACKENDS = ['torch', 'quantized', 'onnx']
+ONNX_DIR = os.path.join('models', f"{MODEL_NAME}-onnx")
+
+# DistilBERT reads at most 512 tokens, [CLS] and [SEP] included; longer
+# reviews are scored as windows that share WINDOW_OVERLAP tokens
+MAX_TOKENS = 512
+WINDOW_OVERLAP = 64
+
+WORKER_ENV = 'BANK_REVIEWS_MODEL_WORKER'
+DEFAULT_WORKER_ADDRESS = '127.0.0.1:6071'
+WORKER_KEY_ENV = 'BANK_REVIEWS_MODEL_WORKER_KEY'
+WORKER_KEY_FILE = '.model_worker_key'
+
+_models = {}
+_load_lock = threading.Lock()
+# Torch already uses every core for one batch; concurrent calls just queue
+_inference_lock = threading.Lock()
+
+def _model(name, build):
+    """Process-wide singleton: build on first use, under a lock so threads share one copy"""
+    model = _models.get(name)
+    if model is None:
+        with _load_lock:
+            if name not in _models:
+                _models[name] = build()
+            model = _models[name]
+    return model
+
+def sentiment_backend():
+    backend = os.environ.get(BACKEND_ENV, 'torch').lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"{BACKEND_ENV} must be one of {', '.join(BACKENDS)}, got {backend!r}")
+    return backend
+
+def _onnx_model():
+    """ONNX Runtime model, exported from the Hub weights on first use and reused after"""
+    from optimum.onnxruntime import ORTModelForSequenceClassification
+
+    if os.path.exists(os.path.join(ONNX_DIR, 'config.json')):
+        return ORTModelForSequenceClassification.from_pretrained(ONNX_DIR)
+    model = ORTModelForSequenceClassification.from_pretrained(MODEL_NAME, export=True)
+    # Remember which Hub weights the graph came from, for the cache version
+    model.config.source_commit = getattr(model.config, '_commit_hash', None)
+    model.save_pretrained(ONNX_DIR)
+    return model
+
+def _build_sentiment_pipeline(backend):
+    from transformers import pipeline
+
+    if backend == 'torch':
+        return pipeline("sentiment-analysis", model=MODEL_NAME)
+
+    from transformers import AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
+    if backend == 'quantized':
+        import torch
+        from transformers import AutoModelForSequenceClassification
+
+        model = AutoModelForSequenceClassification.from_pretrained(MODEL_NAME).eval()
+        # int8 weights for every Linear layer, activations quantized per batch;
+        # in place so the fp32 weights are freed
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear},
+                                                       dtype=torch.qint8, inplace=True)
+    else:
+        model = _onnx_model()
+    return pipeline("sentiment-analysis", model=model, tokenizer=tokenizer)
+
+def sentiment_pipeline(backend=None):
+    backend = backend or sentiment_backend()
+
+    def build():
+        print(f"Loading sentiment model ({backend})... This may take a minute...")
+        with measure('load_sentiment_model', model=MODEL_NAME, backend=backend):
+            return _build_sentiment_pipeline(backend)
+    return _model(f"sentiment-{backend}", build)
+
+def keyword_nlp():
+    def build():
+        from keyword_extraction import load_keyword_nlp
+
+        with measure('load_keyword_nlp', model=KEYWORD_MODEL):
+            return load_keyword_nlp(KEYWORD_MODEL)
+    return _model('keywords', build)
+
+def embedding_model():
+    def build():
+        from sentence_transformers import SentenceTransformer
+
+        with measure('load_embedding_model', model=EMBEDDING_MODEL):
+            return SentenceTransformer(EMBEDDING_MODEL, device='cpu')
+    return _model('embeddings', build)
+
+# ---------------------------------------------------------------- warm worker client
+
+_worker = threading.local()
+
+def worker_address(address=None):
+    host, _, port = (address or os.environ.get(WORKER_ENV) or DEFAULT_WORKER_ADDRESS).rpartition(':')
+    return host or '127.0.0.1', int(port)
+
+def worker_authkey(create=False):
+    """Worker key: $BANK_REVIEWS_MODEL_WORKER_KEY, else the key file (None if missing).
+
+    With create=True a fresh random key is written to the key file, readable
+    by the current user only.
+    """
+    key = os.environ.get(WORKER_KEY_ENV)
+    if key:
+        return key.encode()
+    if create:
+        key = secrets.token_hex(32)
+        if os.path.exists(WORKER_KEY_FILE):
+            os.remove(WORKER_KEY_FILE)
+        fd = os.open(WORKER_KEY_FILE, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            f.write(key)
+        return key.encode()
+    try:
+        with open(WORKER_KEY_FILE) as f:
+            return f.read().strip().encode()
+    except FileNotFoundError:
+        return None
+
+def is_loopback(host):
+    try:
+        return ipaddress.ip_address(socket.gethostbyname(host)).is_loopback
+    except (OSError, ValueError):
+        return False
+
+def _worker_call(*request):
+    """Send a request to the warm worker; None when no worker is configured or reachable"""
+    if not os.environ.get(WORKER_ENV):
+        return None
+    import multiprocessing
+    from multiprocessing.connection import Client
+
+    conn = getattr(_worker, 'conn', None)
+    try:
+        if conn is None:
+            authkey = worker_authkey()
+            if authkey is None:
+                raise OSError(f"no key in ${WORKER_KEY_ENV} or {WORKER_KEY_FILE}")
+            conn = _worker.conn = Client(worker_address(), authkey=authkey)
+        conn.send(request)
+        status, result = conn.recv()
+    except (OSError, EOFError, multiprocessing.AuthenticationError) as e:
+        if conn is not None or not getattr(_worker, 'warned', False):
+            print(f"⚠️ Model worker unavailable ({e}), loading models in-process")
+            _worker.warned = True
+        _worker.conn = None
+        return None
+    if status == 'error':
+        raise RuntimeError(f"Model worker failed: {result}")
+    return result
+
+# ---------------------------------------------------------------- scoring
+
+def _local_model_version(backend=None):
+    """Hub commit of the loaded weights (or the transformers version), plus the backend.
+
+    fp32 torch keeps the bare commit so existing cache entries stay valid;
+    other backends may disagree on borderline reviews and get their own entries.
+    """
+    import transformers
+
+    backend = backend or sentiment_backend()
+    config = sentiment_pipeline(backend).model.config
+    commit = getattr(config, '_commit_hash', None) or getattr(config, 'source_commit', None)
+    version = commit or f"transformers-{transformers.__version__}"
+    return version if backend == 'torch' else f"{version}-{backend}"
+
+def split_windows(tokenizer, texts, max_tokens=MAX_TOKENS, overlap=WINDOW_OVERLAP):
+    """Cut reviews into windows the model can read: [(review index, text, tokens)].
+
+    Reviews that fit are passed through unchanged. Longer ones are split into
+    token windows that overlap by `overlap` tokens and are decoded back to text.
+    """
+    # Room for [CLS] and [SEP]
+    size = min(max_tokens, getattr(tokenizer, 'model_max_length', max_tokens)) - 2
+    step = size - overlap
+    ids = tokenizer(texts, add_special_tokens=False, truncation=False, verbose=False)['input_ids']
+    windows = []
+    for i, (text, tokens) in enumerate(zip(texts, ids)):
+        if len(tokens) <= size:
+            windows.append((i, text, max(len(tokens), 1)))
+            continue
+        for start in range(0, len(tokens) - overlap, step):
+            piece = tokens[start:start + size]
+            windows.append((i, tokenizer.decode(piece), len(piece)))
+    return windows
+
+def combine_windows(results):
+    """Length-weighted vote over [(label, score, tokens)] -> (label, score)"""
+    if len(results) == 1:
+        return results[0][:2]
+    total = sum(tokens for _, _, tokens in results)
+    positive = sum((score if label == 'POSITIVE' else 1 - score) * tokens
+                   for label, score, tokens in results) / total
+    return ('POSITIVE', positive) if positive >= 0.5 else ('NEGATIVE', 1 - positive)
+
+def _score_windows(model, windows, batch_size):
+    """Run every window through one length-sorted queue; failed windows stay None"""
+    order = sorted(range(len(windows)), key=lambda k: windows[k][2])
+    results = [None] * len(windows)
+    errors = []
+    try:
+        with _inference_lock:
+            # The pipeline pads each batch to its longest member
+            stream = model((windows[k][1] for k in order), batch_size=batch_size, truncation=True)
+            for done, (k, result) in enumerate(zip(order, stream)):
+                if done and done % 200 == 0:
+                    print(f"Processed {done}/{len(windows)} windows...")
+                results[k] = (result['label'], result['score'])
+    except Exception as e:
+        # Retry whatever is left one window at a time, so one bad input only loses itself
+        print(f"Batch scoring failed ({e}), finishing window by window...")
+        for k in order:
+            if results[k] is None:
+                try:
+                    with _inference_lock:
+                        result = model(windows[k][1], truncation=True)[0]
+                    results[k] = (result['label'], result['score'])
+                except Exception as e:
+                    errors.append(f"{type(e).__name__}: {e}")
+    return results, errors
+
+def _local_analyze_sentiment_batch(texts, batch_size=32, num_threads=None, backend=None):
+    """(labels, scores, window stats); the stats go back to the client with the result"""
+    if num_threads:
+        import torch
+
+        torch.set_num_threads(num_threads)
+
+    texts = [str(text) for text in texts]
+    model = sentiment_pipeline(backend)
+    windows = split_windows(model.tokenizer, texts)
+    results, errors = _score_windows(model, windows, batch_size)
+
+    per_review = [[] for _ in texts]
+    for (i, _, tokens), result in zip(windows, results):
+        if result is not None:
+            per_review[i].append((*result, tokens))
+    scored = [combine_windows(r) if r else (None, None) for r in per_review]
+
+    window_counts = Counter(i for i, _, _ in windows)
+    long_windows = [n for n in window_counts.values() if n > 1]
+    stats = {'windows': len(windows), 'long_reviews': len(long_windows),
+             'long_review_windows': sum(long_windows), 'failed_windows': len(errors),
+             'first_error': errors[0] if errors else None}
+    return [label for label, _ in scored], [score for _, score in scored], stats
+
+def _report_windows(stats):
+    """Print a batch's window counts and record them on the caller's measurement"""
+    if stats['long_reviews']:
+        print(f"Split {stats['long_reviews']} long reviews into {stats['long_review_windows']} windows")
+    if stats['failed_windows']:
+        print(f"⚠️ {stats['failed_windows']} of {stats['windows']} windows failed to score "
+              f"(first error: {stats['first_error']})")
+    annotate(windows=stats['windows'], long_reviews=stats['long_reviews'],
+             failed_windows=stats['failed_windows'])
+
+def _local_analyze_sentiment(text, backend=None):
+    labels, scores, _ = _local_analyze_sentiment_batch([text], batch_size=1, backend=backend)
+    if labels[0] is None:
+        raise RuntimeError(f"Could not score review: {str(text)[:80]!r}")
+    return labels[0], scores[0]
+
+def _local_extract_keywords(texts):
+    from keyword_extraction import stream_keywords
+
+    return list(stream_keywords(keyword_nlp(), texts))
+
+def _local_encode_texts(texts, batch_size=64):
+    import numpy as np
+
+    vectors = embedding_model().encode(texts, batch_size=batch_size, normalize_embeddings=True,
+                                       convert_to_numpy=True, show_progress_bar=False)
+    return vectors.astype(np.float16)
+
+# Requests name this process's backend, so the worker scores with the same
+# one whatever it was started with
+
+def model_version():
+    """Version key for the sentiment cache (loads the model, or asks the worker)"""
+    backend = sentiment_backend()
+    version = _worker_call('model_version', backend)
+    return version if version is not None else _local_model_version(backend)
+
+def analyze_sentiment(text):
+    """(label, score) for one review; raises if it can't be scored"""
+    backend = sentiment_backend()
+    result = _worker_call('analyze_sentiment', str(text), backend)
+    return tuple(result) if result is not None else _local_analyze_sentiment(text, backend)
+
+def analyze_sentiment_batch(texts, batch_size=32, num_threads=None):
+    """Score many reviews at once with length-bucketed, padded batches.
+
+    Reviews longer than the model's 512 tokens are split into overlapping
+    windows, and their window scores are combined by a length-weighted
+    vote. All windows of all reviews are sorted by token length into one
+    queue, so each padded batch holds texts of similar size. Results come
+    back in the original order. A review whose windows all fail gets label
+    and score None. Failures are counted and reported, never replaced by
+    a neutral score.
+    """
+    texts = [str(text) for text in texts]
+    backend = sentiment_backend()
+    result = _worker_call('analyze_sentiment_batch', texts, batch_size, None, backend)
+    labels, scores, stats = result if result is not None else \
+        _local_analyze_sentiment_batch(texts, batch_size, num_threads, backend)
+    # Recorded here, so worker-scored batches show up in this process's metrics
+    _report_windows(stats)
+
+    failed = sum(label is None for label in labels)
+    annotate(scoring_failures=failed)
+    if failed:
+        print(f"⚠️ {failed} of {len(texts)} reviews could not be scored; their labels are left empty")
+    return labels, scores
+
+def extract_keywords(text):
+    result = _worker_call('extract_keywords', [str(text)])
+    return result[0] if result is not None else _local_extract_keywords([text])[0]
+
+def encode_texts(texts, batch_size=64):
+    """Unit-length sentence embeddings as a float16 (len(texts), dim) array"""
+    texts = [str(text) for text in texts]
+    result = _worker_call('encode_texts', texts, batch_size)
+    return result if result is not None else _local_encode_texts(texts, batch_size)
+
+# ---------------------------------------------------------------- warm worker server
+
+HANDLERS = {
+    'model_version': _local_model_version,
+    'analyze_sentiment': _local_analyze_sentiment,
+    'analyze_sentiment_batch': _local_analyze_sentiment_batch,
+    'extract_keywords': _local_extract_keywords,
+    'encode_texts': _local_encode_texts,
+}
+
+def _serve_client(conn):
+    with conn:
+        while True:
+            try:
+                op, *args = conn.recv()
+            except (EOFError, OSError):
+                return
+            try:
+                conn.send(('ok', HANDLERS[op](*args)))
+            except Exception as e:
+                conn.send(('error', f"{type(e).__name__}: {e}"))
+
+def serve(address=None, preload=('sentiment', 'keywords')):
+    """Load the models once, then answer scoring requests until interrupted.
+
+    Requests are unpickled, so only clients holding the key may connect:
+    without an explicit key the worker stays on loopback.
+    """
+    import multiprocessing
+    from multiprocessing.connection import Listener
+
+    host, port = worker_address(address)
+    if not is_loopback(host) and not os.environ.get(WORKER_KEY_ENV):
+        raise ValueError(f"Refusing to listen on {host} without an explicit key; "
+                         f"set {WORKER_KEY_ENV} on the worker and its clients")
+    authkey = worker_authkey(create=True)
+
+    if 'sentiment' in preload:
+        sentiment_pipeline()
+    if 'keywords' in preload:
+        keyword_nlp()
+
+    with Listener((host, port), authkey=authkey) as listener:
+        print(f"✅ Model worker ready on {host}:{port}")
+        print(f"   export {WORKER_ENV}={host}:{port}")
+        if not os.environ.get(WORKER_KEY_ENV):
+            print(f"   clients authenticate with the key in {WORKER_KEY_FILE}")
+        while True:
+            try:
+                conn = listener.accept()
+            except (OSError, EOFError, multiprocessing.AuthenticationError) as e:
+                # A client with the wrong key or a dropped handshake
+                print(f"⚠️ Rejected connection: {e}")
+                continue
+            threading.Thread(target=_serve_client, args=(conn,), daemon=True).start()
+
+# ---------------------------------------------------------------- backend parity
+
+def parity_check(backend, batch_size=32, compare_speed=True):
+    """Score the analyzed sample's texts with a backend and with fp32 torch and compare.
+
+    The reference labels are always scored fresh with fp32 torch here: the
+    labels stored in the sample may come from another backend. Reviews that
+    either side could not score are left out of the comparison. Returns
+    agreement, score drift, throughput and memory for the backend (and the
+    torch throughput and memory when compare_speed is set).
+    """
+    from pipeline_storage import read_stage
+
+    texts = read_stage('sample', columns=['review_text'])['review_text'].astype(str).tolist()
+
+    def timed(name):
+        rss_before = current_rss_mb()
+        sentiment_pipeline(name)
+        rss_loaded = current_rss_mb()
+        _local_analyze_sentiment_batch(texts[:batch_size], batch_size, backend=name)  # warm-up
+        start = time.perf_counter()
+        labels, scores, window_stats = _local_analyze_sentiment_batch(texts, batch_size, backend=name)
+        seconds = time.perf_counter() - start
+        _report_windows(window_stats)
+        return labels, scores, {'rows_per_s': round(len(texts) / seconds, 1),
+                                'model_rss_mb': round(rss_loaded - rss_before, 1)}
+
+    labels, scores, stats = timed(backend)
+    if backend == 'torch':
+        ref_labels, ref_scores, ref_stats = labels, scores, stats
+    else:
+        ref_labels, ref_scores, ref_stats = timed('torch')
+
+    compared = [k for k in range(len(texts)) if labels[k] is not None and ref_labels[k] is not None]
+    agree = [labels[k] == ref_labels[k] for k in compared]
+    drift = [abs(scores[k] - ref_scores[k]) for k in compared]
+    result = {
+        'backend': backend,
+        'reviews': len(compared),
+        'unscored': len(texts) - len(compared),
+        'agreement': sum(agree) / len(compared) if compared else 0.0,
+        'max_score_drift': max(drift, default=0.0),
+        'mean_score_drift': sum(drift) / len(drift) if drift else 0.0,
+        'disagreements': [(texts[k], ref_labels[k], labels[k])
+                          for k, same in zip(compared, agree) if not same],
+        **stats,
+    }
+    if compare_speed and backend != 'torch':
+        result['torch'] = ref_stats
+        result['speedup'] = round(result['rows_per_s'] / result['torch']['rows_per_s'], 2)
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Warm model worker and sentiment backend parity check")
+    parser.add_argument('--serve', action='store_true', help="Start the worker")
+    parser.add_argument('--address', default=None,
+                        help=f"host:port to listen on (default: ${WORKER_ENV} or {DEFAULT_WORKER_ADDRESS})")
+    parser.add_argument('--no-keywords', action='store_true', help="Don't preload the spaCy model")
+    parser.add_argument('--backend', choices=BACKENDS, default=None,
+                        help=f"Sentiment backend (default: ${BACKEND_ENV} or torch)")
+    parser.add_argument('--parity', action='store_true',
+                        help="Compare the backend's labels with fresh fp32 torch labels on the analyzed sample")
+    parser.add_argument('--min-agreement', type=float, default=0.98,
+                        help="Label agreement the parity check requires")
+    parser.add_argument('--batch-size', type=int, default=32)
+    args = parser.parse_args()
+
+    if args.backend:
+        os.environ[BACKEND_ENV] = args.backend
+
+    if args.parity:
+        backend = sentiment_backend()
+        with measure('parity', backend=backend):
+            result = parity_check(backend, args.batch_size)
+        print(f"\n📊 {backend} vs fp32 torch labels on {result['reviews']} reviews:")
+        if result['unscored']:
+            print(f"  Not compared:     {result['unscored']} reviews one side could not score")
+        print(f"  Label agreement:  {result['agreement']:.1%}")
+        print(f"  Score drift:      mean {result['mean_score_drift']:.4f}, max {result['max_score_drift']:.4f}")
+        print(f"  Throughput:       {result['rows_per_s']:,.1f} reviews/s")
+        print(f"  Model memory:     {result['model_rss_mb']:,.1f} MB")
+        if 'speedup' in result:
+            print(f"  fp32 torch:       {result['torch']['rows_per_s']:,.1f} reviews/s, "
+                  f"{result['torch']['model_rss_mb']:,.1f} MB ({result['speedup']}x speedup)")
+        for text, reference, label in result['disagreements'][:10]:
+            print(f"  ≠ {reference} -> {label}: {text[:70]}")
+        if result['agreement'] < args.min_agreement:
+            print(f"\n❌ Agreement below {args.min_agreement:.0%}; keep the torch backend")
+            sys.exit(1)
+        print(f"\n✅ {backend} agrees with the fp32 torch labels")
+        return
+
+    if not args.serve:
+        parser.print_help()
+        return
+    try:
+        serve(args.address, preload=('sentiment',) if args.no_keywords else ('sentiment', 'keywords'))
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    except KeyboardInterrupt:
+        print("\nModel worker stopped")
+
+if __name__ == "__main__":
+    main()
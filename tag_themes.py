@@ -0,0 +1,36 @@
+"""
+Theme tagging as its own pipeline stage.
+Tags every cleaned review with both taxonomies from theme_keywords.py:
+the full one (bank_reviews_with_themes.csv) and the report one that
+complete_sentiment.py --assemble joins into the complete dataset.
+"""
+
+import argparse
+from theme_matcher import ThemeMatcher
+from theme_keywords import THEME_KEYWORDS, REPORT_THEME_KEYWORDS
+from pipeline_storage import read_stage, write_stage
+from instrumentation import measure
+
+def main():
+    parser = argparse.ArgumentParser(description="Tag cleaned reviews with the full and report theme taxonomies")
+    parser.add_argument('--top', type=int, default=10, help="Report themes to list at the end")
+    args = parser.parse_args()
+
+    with measure('tag_themes') as step:
+        df = read_stage('clean', columns=['review_id', 'review_text'])
+        step.rows_in = step.rows_out = len(df)
+        print(f"Tagging themes for {len(df)} reviews...")
+
+        df['themes'] = ThemeMatcher(THEME_KEYWORDS).tag(df['review_text'])
+        themes_file = write_stage('themes', df, ['themes'])
+
+        df['themes'] = ThemeMatcher(REPORT_THEME_KEYWORDS).tag(df['review_text'])
+        report_file = write_stage('report_themes', df, ['themes'])
+
+    print(f"✅ Themes saved to: {themes_file}")
+    print(f"✅ Report themes saved to: {report_file}")
+    print(f"\n🎯 TOP REPORT THEMES:")
+    print(df['themes'].value_counts().head(args.top))
+
+if __name__ == "__main__":
+    main()
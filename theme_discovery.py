@@ -0,0 +1,217 @@
+"""
+Corpus-level theme discovery for the reviews the keyword taxonomy misses.
+
+A TF-IDF vectorizer over review_text (unigrams and bigrams, sparse float32)
+learns its vocabulary and IDF weights from a bounded random sample of the
+reviews (--vocab-sample) and is then applied chunk by chunk, so neither
+fitting nor transforming ever builds the full document-term matrix. From
+it we get:
+- distinctive terms per bank and per sentiment: the mean TF-IDF of a term
+  inside the group minus its mean in the other reviews, from sparse group
+  sums accumulated over the chunks
+- clusters of the 'Other' reviews from mini-batch k-means, each named by
+  the top terms of its centroid
+
+The vectorizer and the k-means model are saved to models/theme_discovery.joblib.
+A fresh model is fitted on all 'Other' reviews at once. With --incremental,
+only 'Other' reviews that have not been clustered yet go through partial_fit,
+and the vocabulary stays fixed until --refit.
+
+Outputs: the discovered_themes stage (bank_reviews_discovered_themes.csv),
+theme_distinctive_terms.csv and theme_clusters.csv. Requires scikit-learn.
+"""
+
+import argparse
+import os
+import joblib
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.feature_extraction.text import TfidfVectorizer
+from pipeline_storage import read_stage, write_stage, stage_exists
+from instrumentation import measure, record_rows
+
+MODEL_FILE = os.path.join('models', 'theme_discovery.joblib')
+TERMS_FILE = 'theme_distinctive_terms.csv'
+CLUSTERS_FILE = 'theme_clusters.csv'
+OTHER = 'Other'
+
+def build_vectorizer(max_features=50_000, min_df=2):
+    return TfidfVectorizer(ngram_range=(1, 2), min_df=min_df, max_df=0.9,
+                           max_features=max_features, stop_words='english',
+                           sublinear_tf=True, dtype=np.float32)
+
+def load_model(path=MODEL_FILE):
+    """Saved {'vectorizer', 'kmeans', 'clustered_ids'}, or None"""
+    return joblib.load(path) if os.path.exists(path) else None
+
+def save_model(model, path=MODEL_FILE):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    joblib.dump(model, path)
+
+def group_sums(X, codes, n_groups):
+    """Per-group column sums of a sparse chunk: (n_groups x n_terms), rows with code -1 ignored"""
+    rows = np.flatnonzero(codes >= 0)
+    indicator = sparse.csr_matrix((np.ones(len(rows), dtype=np.float32), (codes[rows], rows)),
+                                  shape=(n_groups, X.shape[0]))
+    return np.asarray((indicator @ X).todense())
+
+def distinctive_terms(sums, counts, groups, terms, group_type, top_n=15):
+    """Top terms per group by mean TF-IDF inside the group minus mean outside it"""
+    total, n = sums.sum(axis=0), counts.sum()
+    inside = sums / np.maximum(counts, 1)[:, None]
+    outside = (total - sums) / np.maximum(n - counts, 1)[:, None]
+    score = inside - outside
+
+    rows = []
+    for g, group in enumerate(groups):
+        top = np.argsort(-score[g])[:top_n]
+        rows.extend({'group_type': group_type, 'group': group, 'reviews': int(counts[g]),
+                     'rank': rank + 1, 'term': terms[t], 'score': round(float(score[g, t]), 5)}
+                    for rank, t in enumerate(top))
+    return pd.DataFrame(rows)
+
+def cluster_labels(kmeans, terms, top_n=3):
+    """Name each cluster by its centroid's highest-weighted terms"""
+    top = np.argsort(-kmeans.cluster_centers_, axis=1)[:, :top_n]
+    return [' / '.join(terms[t] for t in row) for row in top]
+
+def load_reviews():
+    df = read_stage('themes', columns=['review_id', 'review_text', 'bank', 'themes'])
+    if stage_exists('complete'):
+        sentiment = read_stage('complete', columns=['review_id', 'sentiment_label'])
+        df = df.merge(sentiment, on='review_id', how='left')
+    else:
+        df['sentiment_label'] = np.nan
+    df['review_text'] = df['review_text'].fillna('').astype(str)
+    return df.reset_index(drop=True)
+
+def discover(n_clusters=12, chunksize=50_000, incremental=False, refit=False, top_n=15,
+             vocab_sample=200_000):
+    df = load_reviews()
+    record_rows(rows_in=len(df), rows_out=len(df))
+    texts = df['review_text']
+    other = (df['themes'] == OTHER).to_numpy()
+    print(f"Loaded {len(df)} reviews, {other.sum()} tagged '{OTHER}'")
+
+    model = load_model() if incremental and not refit else None
+    if model is None:
+        sample = texts.sample(n=min(vocab_sample, len(texts)), random_state=0)
+        with measure('fit_vocabulary', rows_in=len(sample)):
+            vectorizer = build_vectorizer().fit(sample)
+        model = {'vectorizer': vectorizer, 'kmeans': None, 'clustered_ids': set()}
+        print(f"Fitted vocabulary of {len(vectorizer.vocabulary_)} unigrams and bigrams "
+              f"on {len(sample)} reviews")
+    vectorizer = model['vectorizer']
+    terms = vectorizer.get_feature_names_out()
+    if model['kmeans'] is None:
+        model['kmeans'] = MiniBatchKMeans(n_clusters=n_clusters, random_state=0,
+                                          batch_size=4096, n_init=3)
+    kmeans = model['kmeans']
+
+    bank_codes, banks = pd.factorize(df['bank'])
+    sentiment_codes, sentiments = pd.factorize(df['sentiment_label'])
+    bank_sums = np.zeros((len(banks), len(terms)))
+    sentiment_sums = np.zeros((len(sentiments), len(terms)))
+    new_other = other & ~df['review_id'].isin(model['clustered_ids']).to_numpy()
+
+    # One pass: group sums for every review, and the new 'Other' rows for k-means.
+    # A fresh model is fitted once on all of them after the pass. An existing
+    # one is updated with partial_fit as the rows come in; it needs at least
+    # n_clusters rows per call, so small chunks are pooled and rows left over
+    # at the end are picked up by the next incremental run.
+    review_ids = df['review_id'].to_numpy()
+    pending, pending_ids, fed = [], [], []
+    fitted = hasattr(kmeans, 'cluster_centers_')
+    updating = fitted
+    with measure('tfidf_pass', rows_in=len(df)):
+        for start in range(0, len(df), chunksize):
+            stop = start + chunksize
+            X = vectorizer.transform(texts.iloc[start:stop])
+            bank_sums += group_sums(X, bank_codes[start:stop], len(banks))
+            sentiment_sums += group_sums(X, sentiment_codes[start:stop], len(sentiments))
+
+            rows = new_other[start:stop]
+            if rows.any():
+                pending.append(X[rows])
+                pending_ids.extend(review_ids[start:stop][rows])
+            if updating and len(pending_ids) >= n_clusters:
+                kmeans.partial_fit(sparse.vstack(pending))
+                fed.extend(pending_ids)
+                pending, pending_ids = [], []
+    if not updating and len(pending_ids) >= n_clusters:
+        with measure('fit_clusters', rows_in=len(pending_ids)):
+            kmeans.fit(sparse.vstack(pending))
+        fed.extend(pending_ids)
+        fitted = True
+    print(f"Clustering: {len(fed)} new '{OTHER}' reviews fed to mini-batch k-means")
+
+    terms_df = pd.concat([
+        distinctive_terms(bank_sums, np.bincount(bank_codes[bank_codes >= 0], minlength=len(banks)),
+                          banks, terms, 'bank', top_n),
+        distinctive_terms(sentiment_sums,
+                          np.bincount(sentiment_codes[sentiment_codes >= 0], minlength=len(sentiments)),
+                          sentiments, terms, 'sentiment', top_n),
+    ], ignore_index=True)
+    terms_df.to_csv(TERMS_FILE, index=False)
+
+    df['discovered_cluster'] = -1
+    df['discovered_theme'] = df['themes']
+    clusters = pd.DataFrame(columns=['cluster', 'label', 'reviews', 'example'])
+    if not fitted:
+        print(f"⚠️ Fewer than {n_clusters} '{OTHER}' reviews; skipping clustering")
+    else:
+        labels = cluster_labels(kmeans, terms)
+        other_index = np.flatnonzero(other)
+        assigned = np.empty(len(other_index), dtype=int)
+        with measure('assign_clusters', rows_in=len(other_index)):
+            for start in range(0, len(other_index), chunksize):
+                rows = other_index[start:start + chunksize]
+                assigned[start:start + chunksize] = kmeans.predict(vectorizer.transform(texts.iloc[rows]))
+        df.loc[other_index, 'discovered_cluster'] = assigned
+        df.loc[other_index, 'discovered_theme'] = [f"{OTHER}: {labels[c]}" for c in assigned]
+
+        sizes = np.bincount(assigned, minlength=len(labels))
+        examples = df.loc[other_index].groupby('discovered_cluster')['review_text'].first()
+        clusters = pd.DataFrame({'cluster': range(len(labels)), 'label': labels, 'reviews': sizes,
+                                 'example': [examples.get(c, '') for c in range(len(labels))]})
+        clusters = clusters.sort_values('reviews', ascending=False)
+    clusters.to_csv(CLUSTERS_FILE, index=False)
+
+    model['clustered_ids'].update(fed)
+    save_model(model)
+    output_file = write_stage('discovered_themes', df, ['discovered_cluster', 'discovered_theme'])
+    return output_file, terms_df, clusters
+
+def main():
+    parser = argparse.ArgumentParser(description="TF-IDF theme discovery per bank and sentiment")
+    parser.add_argument('--clusters', type=int, default=12, help="k-means clusters for 'Other' reviews")
+    parser.add_argument('--chunksize', type=int, default=50_000, help="Reviews vectorized at a time")
+    parser.add_argument('--incremental', action='store_true',
+                        help=f"Reuse {MODEL_FILE} and only partial_fit new 'Other' reviews")
+    parser.add_argument('--refit', action='store_true', help="Rebuild the vocabulary and clusters from scratch")
+    parser.add_argument('--top', type=int, default=15, help="Distinctive terms per group")
+    parser.add_argument('--vocab-sample', type=int, default=200_000,
+                        help="Reviews sampled to fit the vocabulary and IDF weights")
+    args = parser.parse_args()
+
+    with measure('discover_themes', clusters=args.clusters, incremental=args.incremental):
+        output_file, terms_df, clusters = discover(args.clusters, args.chunksize, args.incremental,
+                                                   args.refit, args.top, args.vocab_sample)
+
+    print(f"✅ Discovered themes saved to: {output_file}")
+    print(f"✅ Distinctive terms saved to: {TERMS_FILE}")
+    print(f"✅ Clusters saved to: {CLUSTERS_FILE}")
+
+    print("\n🔑 DISTINCTIVE TERMS:")
+    for (group_type, group), group_terms in terms_df.groupby(['group_type', 'group']):
+        print(f"  {group_type} {group}: {', '.join(group_terms['term'].head(8))}")
+
+    if len(clusters):
+        print(f"\n🧩 '{OTHER}' CLUSTERS:")
+        for _, row in clusters.head(10).iterrows():
+            print(f"  {row['reviews']:>5}  {row['label']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+Theme taxonomies used to tag reviews.
+Kept apart from the scoring scripts so that editing keywords only
+invalidates the theme-tagging stage of the pipeline, not sentiment scoring.
+"""
+
+# Full taxonomy behind bank_reviews_with_themes.csv.
+# Keywords match as whole words, so inflections are listed explicitly.
+THEME_KEYWORDS = {
+    'Login Issues': ['login', 'logins', 'password', 'passwords', 'authenticate', 'authenticated',
+                     'authentication', 'access', 'accessed', 'accessing', 'account', 'accounts',
+                     'sign', 'signed', 'signing'],
+    'Transaction Problems': ['transfer', 'transfers', 'transferred', 'transferring', 'transaction',
+                             'transactions', 'payment', 'payments', 'send', 'sends', 'sending',
+                             'sent', 'sender', 'senders', 'money', 'bill', 'bills'],
+    'App Performance': ['slow', 'slower', 'slowly', 'slowing', 'slows', 'crash', 'crashes', 'crashed',
+                        'crashing', 'freeze', 'freezes', 'freezing', 'froze', 'frozen', 'lag', 'lags',
+                        'lagged', 'lagging', 'laggy', 'loading', 'bug', 'bugs', 'bugged', 'buggy',
+                        'error', 'errors'],
+    'User Interface': ['interface', 'interfaces', 'design', 'designs', 'designed', 'layout', 'layouts',
+                       'button', 'buttons', 'navigation', 'ui', 'ux'],
+    'Customer Support': ['support', 'supported', 'supporting', 'supportive', 'help', 'helps', 'helped',
+                         'helping', 'helpful', 'service', 'services', 'contact', 'contacts', 'contacted',
+                         'contacting', 'response', 'responses', 'responsive', 'assistance'],
+    'Security': ['secure', 'secured', 'security', 'safe', 'safety', 'privacy', 'protection', 'protected'],
+    'Features': ['feature', 'features', 'function', 'functions', 'functional', 'functionality',
+                 'functioning', 'option', 'options', 'optional', 'tool', 'tools', 'capability',
+                 'capabilities']
+}
+
+# Smaller set used for the completely analyzed dataset and the database
+REPORT_THEME_KEYWORDS = {
+    'Login Issues': ['login', 'logins', 'password', 'passwords', 'authenticate', 'authenticated',
+                     'authentication', 'access', 'accessed', 'accessing', 'account', 'accounts'],
+    'Transaction Problems': ['transfer', 'transfers', 'transferred', 'transferring', 'transaction',
+                             'transactions', 'payment', 'payments', 'send', 'sends', 'sending',
+                             'sent', 'sender', 'senders', 'money'],
+    'App Performance': ['slow', 'slower', 'slowly', 'slowing', 'slows', 'crash', 'crashes', 'crashed',
+                        'crashing', 'freeze', 'freezes', 'freezing', 'froze', 'frozen', 'lag', 'lags',
+                        'lagged', 'lagging', 'laggy', 'loading'],
+    'User Interface': ['interface', 'interfaces', 'design', 'designs', 'designed', 'layout', 'layouts',
+                       'button', 'buttons', 'navigation'],
+    'Customer Support': ['support', 'supported', 'supporting', 'supportive', 'help', 'helps', 'helped',
+                         'helping', 'helpful', 'service', 'services', 'contact', 'contacts', 'contacted',
+                         'contacting', 'response', 'responses', 'responsive'],
+}
@@ -0,0 +1,84 @@
+"""
+Shared theme-matching engine for the sentiment scripts.
+Compiles a theme -> keywords dictionary once into a single word-boundary
+regex (keywords are merged into a prefix trie so the alternation never
+re-scans shared prefixes) and tags a whole pandas Series in one pass.
+"""
+
+import re
+import pandas as pd
+
+def _trie_pattern(words):
+    """Build a prefix-factored regex alternation matching exactly the given words"""
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node):
+        if list(node) == ['']:
+            return ''
+        branches = []
+        optional = False
+        for char in sorted(node):
+            if char == '':
+                optional = True
+            else:
+                branches.append(re.escape(char) + build(node[char]))
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if optional:
+            body = '(?:' + body + ')?'
+        return body
+
+    return build(trie)
+
+class ThemeMatcher:
+    """Tags text with every theme whose keywords appear as whole words"""
+
+    def __init__(self, theme_keywords, default='Other'):
+        self.themes = list(theme_keywords)
+        self.default = default
+
+        # keyword -> indexes of the themes it belongs to
+        self.keyword_themes = {}
+        for index, (theme, keywords) in enumerate(theme_keywords.items()):
+            for keyword in keywords:
+                self.keyword_themes.setdefault(keyword.lower(), set()).add(index)
+
+        keywords = sorted(self.keyword_themes)
+        self.regex = re.compile(r'\b(' + _trie_pattern(keywords) + r')\b')
+        self._labels = {}
+
+    def themes_for(self, matched_keywords):
+        """Theme names for a collection of matched keywords, in dictionary order"""
+        indexes = set()
+        for keyword in matched_keywords:
+            indexes |= self.keyword_themes[keyword]
+        return [self.themes[i] for i in sorted(indexes)]
+
+    def _label(self, matched_keywords):
+        key = frozenset(matched_keywords)
+        label = self._labels.get(key)
+        if label is None:
+            themes = self.themes_for(key)
+            label = ', '.join(themes) if themes else self.default
+            self._labels[key] = label
+        return label
+
+    def assign(self, text):
+        """Comma-joined themes for a single text"""
+        return self._label(self.regex.findall(str(text).lower()))
+
+    def tag(self, texts):
+        """Comma-joined themes for every text in a Series, in one regex pass"""
+        texts = pd.Series(texts)
+        matches = texts.astype(str).str.lower().str.findall(self.regex)
+        return matches.map(self._label)
+
+    def tag_lists(self, texts):
+        """Theme lists (rather than joined strings) for every text in a Series"""
+        texts = pd.Series(texts)
+        matches = texts.astype(str).str.lower().str.findall(self.regex)
+        return matches.map(self.themes_for)
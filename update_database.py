@@ -1,42 +1,53 @@
-import sqlite3
-import pandas as pd
-
-print("Updating database with complete sentiment analysis...")
-
-# Load completely analyzed data
-df = pd.read_csv('bank_reviews_completely_analyzed.csv')
-print(f"Loaded {len(df)} completely analyzed reviews")
-
-# Connect to database
-conn = sqlite3.connect('bank_reviews_complete.db')
-cursor = conn.cursor()
-
-# Update existing records with sentiment
-bank_id_map = {'CBE': 1, 'BOA': 2, 'DASHEN': 3}
-updated = 0
-
-for _, row in df.iterrows():
-    cursor.execute('''
-    UPDATE reviews 
-    SET sentiment_label = ?, sentiment_score = ?, themes = ?
-    WHERE review_id = ?
-    ''', (row['sentiment_label'], row['sentiment_score'], row['themes'], row['review_id']))
-    updated += 1
-    
-    if updated % 200 == 0:
-        print(f"  Updated {updated}/{len(df)}...")
-
-conn.commit()
-
-# Verify
-cursor.execute("SELECT COUNT(*) FROM reviews WHERE sentiment_label != 'NEUTRAL'")
-analyzed = cursor.fetchone()[0]
-cursor.execute("SELECT COUNT(*) FROM reviews")
-total = cursor.fetchone()[0]
-
-print(f"\n✅ DATABASE UPDATED!")
-print(f"   Total reviews: {total}")
-print(f"   With sentiment: {analyzed}")
-print(f"   Coverage: {analyzed/total*100:.1f}%")
-
-conn.close()
\ No newline at end of file
+import argparse
+from pipeline_storage import read_stage
+from review_repository import get_repository
+from instrumentation import measure
+
+DB_URL = 'sqlite:///bank_reviews_complete.db'
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync the analyzed reviews into the review database")
+    parser.add_argument('--db-url', default=None,
+                        help=f"Database URL (default: $BANK_REVIEWS_DB_URL or {DB_URL})")
+    parser.add_argument('--batch-size', type=int, default=50_000,
+                        help="Rows per executemany batch when staging")
+    parser.add_argument('--skip-archived', action='store_true',
+                        help="Leave out reviews in archived months instead of failing")
+    args = parser.parse_args()
+
+    print("Updating database with complete sentiment analysis...")
+
+    # Load completely analyzed data
+    df = read_stage('complete', columns=['review_id', 'review_text', 'rating', 'date', 'bank',
+                                         'source', 'sentiment_label', 'sentiment_score', 'themes'])
+    print(f"Loaded {len(df)} completely analyzed reviews")
+
+    repo = get_repository(args.db_url, default=DB_URL)
+    with measure('sync_db', rows_in=len(df), backend=repo.backend) as step:
+        counts = repo.write_reviews(df, batch_size=args.batch_size,
+                                    skip_archived=args.skip_archived)
+        step.rows_out = counts['inserted'] + counts['updated'] + counts['unchanged']
+        step.extra.update(counts)
+
+    print(f"  Inserted: {counts['inserted']}, updated: {counts['updated']}, "
+          f"unchanged: {counts['unchanged']}")
+    if counts.get('archived'):
+        print(f"  Skipped (archived months): {counts['archived']}")
+    if 'theme_links' in counts:
+        print(f"  Review themes linked: {counts['theme_links']}")
+
+    # Verify
+    total = repo.count_reviews()
+    # Reviews without a label (or left NEUTRAL) don't count as analyzed
+    analyzed = sum(count for label, count in repo.review_counts_by_sentiment()
+                   if label not in (None, 'NEUTRAL'))
+
+    print(f"\n✅ DATABASE UPDATED!")
+    print(f"   Total reviews: {total}")
+    print(f"   With sentiment: {analyzed}")
+    print(f"   Coverage: {analyzed/total*100:.1f}%")
+
+    repo.close()
+
+if __name__ == "__main__":
+    main()
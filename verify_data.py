@@ -1,5 +1,5 @@
-import pandas as pd
-import sqlite3
+from pipeline_storage import read_stage
+from review_repository import get_repository
 
 print('='*60)
 print('EXACT DATA VERIFICATION')
@@ -7,7 +7,7 @@ print('='*60)
 
 # Check 1: bank_reviews_clean.csv
 try:
-    df_clean = pd.read_csv('bank_reviews_clean.csv')
+    df_clean = read_stage('clean', columns=['bank'])
     clean_count = len(df_clean)
     clean_banks = df_clean['bank'].value_counts()
     print(f'1. bank_reviews_clean.csv: {clean_count} total reviews')
@@ -21,7 +21,7 @@ print()
 
 # Check 2: bank_reviews_analyzed_sample.csv
 try:
-    df_sample = pd.read_csv('bank_reviews_analyzed_sample.csv')
+    df_sample = read_stage('sample', columns=['bank'])
     sample_count = len(df_sample)
     sample_banks = df_sample['bank'].value_counts()
     print(f'2. bank_reviews_analyzed_sample.csv: {sample_count} analyzed reviews')
@@ -35,13 +35,10 @@ print()
 
 # Check 3: Database
 try:
-    conn = sqlite3.connect('bank_reviews_complete.db')
-    cursor = conn.cursor()
-    cursor.execute('SELECT bank_name, COUNT(*) FROM reviews r JOIN banks b ON r.bank_id = b.bank_id GROUP BY bank_name')
-    db_counts = cursor.fetchall()
-    cursor.execute('SELECT COUNT(*) FROM reviews')
-    db_total = cursor.fetchone()[0]
-    conn.close()
+    repo = get_repository(default='sqlite:///bank_reviews_complete.db')
+    db_counts = repo.review_counts_by_bank()
+    db_total = repo.count_reviews()
+    repo.close()
     
     print(f'3. Database: {db_total} total reviews')
     print(f'   Bank distribution:')